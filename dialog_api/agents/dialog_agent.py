@@ -1,5 +1,6 @@
 import logging
-from typing import Any
+from time import perf_counter
+from typing import Any, AsyncIterator
 
 from langchain.chains.llm import LLMChain
 from langchain_community.chat_models import GigaChat
@@ -7,13 +8,15 @@ from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import SystemMessagePromptTemplate, HumanMessagePromptTemplate, ChatPromptTemplate
 from prometheus_async.aio import time
 
-from dialog_api.clients.giga import create_gigachat_client
-from dialog_api.metrics import DIALOG_GIGA_AINVOKE
+from dialog_api.metrics import DIALOG_GIGA_AINVOKE, DIALOG_GIGA_FIRST_CHUNK
 from dialog_api.prompts.dialog import system_prompt, user_prompt
+from dialog_api.services.history import HistoryManager
 from dialog_api.services.rag import RAGService
-from dialog_api.settings import app_settings
-from dialog_api.utils.parser import parse_json
-from dialog_api.utils.token_verification import TokenVerification
+from dialog_api.services.semantic_cache import SemanticAnswerCache
+from dialog_api.utils.hedging import Hedger, hedged
+from dialog_api.utils.limiter import AdaptiveLimiter, CallPriority, limited
+from dialog_api.utils.parser import AnswerStreamParser, JSONParserError, parse_json
+from dialog_api.utils.single_flight import SingleFlight, history_digest, normalize_text
 
 logger = logging.getLogger(__name__)
 
@@ -27,51 +30,161 @@ class DialogAgent:
     chat_template = ChatPromptTemplate.from_messages(messages=[system_message, human_message])
 
     def __init__(
-            self, giga_client: GigaChat, token_verification: TokenVerification,
-            rag_service: RAGService, message_history_number: int
+            self, giga_client: GigaChat, rag_service: RAGService, message_history_number: int,
+            answer_cache: SemanticAnswerCache | None = None, history_manager: HistoryManager | None = None,
+            limiter: AdaptiveLimiter | None = None, hedger: Hedger | None = None,
+            queue_deadline: float | None = None,
     ) -> None:
         self.__llm_chain = LLMChain(llm=giga_client, prompt=self.chat_template)
-        self._token_verification = token_verification
         self._giga_client = giga_client
         self._rag_service = rag_service
+        self._answer_cache = answer_cache
+        self._history_manager = history_manager
+        self._limiter = limiter
+        self._queue_deadline = queue_deadline
+        self._hedger = hedger
+        self._single_flight = SingleFlight(name="dialog")
         self.message_history_number = message_history_number
 
+    async def _cached_answer(
+            self, history: list[str], study_topic: str, current_message: str, user_level: str, use_cache: bool,
+    ) -> str | None:
+        """Ответ из семантического кэша: только для первого вопроса в теме, пока нет истории"""
+        if not use_cache or history or self._answer_cache is None:
+            return None
+        answer = await self._answer_cache.aget(study_topic=study_topic, user_level=user_level, query=current_message)
+        if answer is not None:
+            history.append(HumanMessage(content=current_message).model_dump(mode="json"))
+            history.append(AIMessage(content=answer).model_dump(mode="json"))
+        return answer
+
+    async def _prepare_input(
+            self, history: list[str], study_topic: str, current_message: str, user_level: str, summary: str = "",
+    ) -> dict[str, Any]:
+        if self._history_manager is not None:
+            prompt_history = self._history_manager.render(history=history, summary=summary)
+        else:
+            prompt_history = history[-self.message_history_number:]
+
+        topic_context = await self._rag_service.aget_relevant_context(
+            query=current_message,
+            topic=study_topic,
+            user_level=user_level,
+        )
+        return {
+            "history": prompt_history,
+            "user_level": user_level,
+            "study_topic": study_topic,
+            "current_message": current_message,
+            "topic_context": topic_context,
+        }
 
     @time(DIALOG_GIGA_AINVOKE)
     async def ainvoke(
             self, history: list[str], study_topic: str, current_message: str, user_level: str,
+            use_cache: bool = True, summary: str = "",
     ) -> tuple[str, list[str]]:
         try:
-            if self._token_verification._is_token_expired():
-                access_token = await self._token_verification._ensure_valid_token()
-                self._giga_client = create_gigachat_client(
-                    access_token=access_token,
-                    settings=app_settings.giga,
-                )
-                self.__llm_chain.llm = self._giga_client
-
-            history.append(HumanMessage(content=current_message).model_dump(mode="json"))
-
-            current_history = [self.system_message, self.human_message] + history
+            first_turn = not history
+            cacheable = use_cache and first_turn
+            if (answer := await self._cached_answer(
+                    history=history, study_topic=study_topic, current_message=current_message,
+                    user_level=user_level, use_cache=use_cache,
+            )) is not None:
+                return answer, history
 
-            topic_context = self._rag_service.get_relevant_context(
-                query=current_message,
-                topic=study_topic,
+            flight_key = (
+                study_topic, user_level, normalize_text(current_message), history_digest([summary, *history]),
             )
-
-            output = await self.__llm_chain.ainvoke(
-                input={
-                    "history": current_history[:self.message_history_number],
-                    "user_level": user_level,
-                    "study_topic": study_topic,
-                    "current_message": current_message,
-                    "topic_context": topic_context,
-                }
+            history.append(HumanMessage(content=current_message).model_dump(mode="json"))
+            output = await self._single_flight.do(
+                key=flight_key,
+                fn=lambda: self._agenerate(
+                    history=history, study_topic=study_topic,
+                    current_message=current_message, user_level=user_level, summary=summary, hedge=first_turn,
+                ),
             )
             content: dict[Any, Any] = parse_json(output["text"])
             logger.debug(f"DialogAgent output: {content=}")
             history.append(AIMessage(content=str(content["answer"])).model_dump(mode="json"))
+            if cacheable and self._answer_cache is not None:
+                await self._answer_cache.aput(
+                    study_topic=study_topic, user_level=user_level,
+                    query=current_message, answer=str(content["answer"]),
+                )
             return content["answer"], history
         except DialogAgentError as e:
             logging.exception(f"DialogAgent exception: {e}")
             return "Попробуйте задать вопрос позже. Ошибка на стороне сервера", history
+
+    async def _agenerate(
+            self, history: list[str], study_topic: str, current_message: str, user_level: str, summary: str = "",
+            hedge: bool = False,
+    ) -> dict[str, Any]:
+        inputs = await self._prepare_input(
+            history=history, study_topic=study_topic,
+            current_message=current_message, user_level=user_level, summary=summary,
+        )
+
+        async def invoke() -> dict[str, Any]:
+            async with limited(self._limiter, CallPriority.dialog, deadline=self._queue_deadline):
+                return await self.__llm_chain.ainvoke(input=inputs)
+
+        # Первый ответ в теме не зависит от истории, его можно безопасно дублировать
+        return await hedged(self._hedger if hedge else None, invoke)
+
+    async def astream(
+            self, history: list[str], study_topic: str, current_message: str, user_level: str,
+            use_cache: bool = True, summary: str = "",
+    ) -> AsyncIterator[str]:
+        """
+        Потоковая генерация ответа: поле answer отдается частями по мере генерации.
+        После завершения ответ добавляется в history так же, как в ainvoke
+        :param history: история диалога
+        :param study_topic: тема обучения
+        :param current_message: вопрос пользователя
+        :param user_level: уровень пользователя
+        :param use_cache: разрешить ответ из семантического кэша
+        :param summary: конспект ранних сообщений
+        :return: части текста ответа
+        """
+        cacheable = use_cache and not history
+        if (answer := await self._cached_answer(
+                history=history, study_topic=study_topic, current_message=current_message,
+                user_level=user_level, use_cache=use_cache,
+        )) is not None:
+            yield answer
+            return
+
+        history.append(HumanMessage(content=current_message).model_dump(mode="json"))
+        inputs = await self._prepare_input(
+            history=history, study_topic=study_topic,
+            current_message=current_message, user_level=user_level, summary=summary,
+        )
+        prompt = await self.chat_template.ainvoke(inputs)
+        parser = AnswerStreamParser()
+        raw_chunks = []
+        started = perf_counter()
+
+        async with limited(self._limiter, CallPriority.dialog, deadline=self._queue_deadline, stream=True) as timer:
+            async for chunk in self._giga_client.astream(prompt):
+                timer.first_chunk()
+                raw_chunks.append(chunk.content)
+                if text := parser.feed(chunk.content):
+                    if len(parser.text) == len(text):
+                        DIALOG_GIGA_FIRST_CHUNK.observe(perf_counter() - started)
+                    yield text
+
+        raw_output = "".join(raw_chunks)
+        try:
+            answer = str(parse_json(raw_output)["answer"])
+        except (JSONParserError, KeyError, TypeError):
+            answer = parser.text or raw_output
+        logger.debug(f"DialogAgent stream output: {raw_output=}")
+        if len(answer) > len(parser.text) and answer.startswith(parser.text):
+            yield answer[len(parser.text):]
+        history.append(AIMessage(content=answer).model_dump(mode="json"))
+        if cacheable and parser.done and self._answer_cache is not None:
+            await self._answer_cache.aput(
+                study_topic=study_topic, user_level=user_level, query=current_message, answer=answer,
+            )
@@ -7,13 +7,15 @@ from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import SystemMessagePromptTemplate, HumanMessagePromptTemplate, ChatPromptTemplate
 from prometheus_async.aio import time
 
-from dialog_api.clients.giga import create_gigachat_client
 from dialog_api.metrics import QUIZ_GIGA_AINVOKE
 from dialog_api.prompts.quiz import system_prompt, user_prompt
+from dialog_api.schemas import QuizAction
+from dialog_api.services.history import HistoryManager
 from dialog_api.services.rag import RAGService
-from dialog_api.settings import app_settings
+from dialog_api.utils.hedging import Hedger, hedged
+from dialog_api.utils.limiter import AdaptiveLimiter, CallPriority, limited
 from dialog_api.utils.parser import parse_json
-from dialog_api.utils.token_verification import TokenVerification
+from dialog_api.utils.single_flight import SingleFlight, history_digest, normalize_text
 
 logger = logging.getLogger(__name__)
 
@@ -26,44 +28,45 @@ class QuizAgent:
     human_message = HumanMessagePromptTemplate.from_template(user_prompt)
     chat_template = ChatPromptTemplate.from_messages(messages=[system_message, human_message])
 
-    def __init__(self, giga_client: GigaChat, token_verification: TokenVerification, rag_service: RAGService) -> None:
+    def __init__(
+            self, giga_client: GigaChat, rag_service: RAGService,
+            history_manager: HistoryManager | None = None, limiter: AdaptiveLimiter | None = None,
+            hedger: Hedger | None = None, queue_deadline: float | None = None,
+    ) -> None:
         self.__llm_chain = LLMChain(llm=giga_client, prompt=self.chat_template)
-        self._token_verification = token_verification
         self._giga_client = giga_client
         self._rag_service = rag_service
+        self._history_manager = history_manager
+        self._limiter = limiter
+        self._queue_deadline = queue_deadline
+        self._hedger = hedger
+        self._single_flight = SingleFlight(name="quiz")
 
+    @staticmethod
+    def _flight_key(
+            history: list[str], action: str, current_message: str, study_topic: str, user_level: str, summary: str,
+    ) -> tuple:
+        action = QuizAction(action).value
+        # История попадает в промпт, поэтому объединяются только вызовы с одинаковой историей
+        return action, study_topic, user_level, normalize_text(current_message), history_digest([summary, *history])
 
     @time(QUIZ_GIGA_AINVOKE)
     async def ainvoke(
             self, history: list[str], action: str, current_message: str,
-            study_topic: str, user_level: str,
+            study_topic: str, user_level: str, summary: str = "",
     ) -> tuple[dict[str, str], list[str]]:
         try:
-            if self._token_verification._is_token_expired():
-                access_token = await self._token_verification._ensure_valid_token()
-                self._giga_client = create_gigachat_client(
-                    access_token=access_token,
-                    settings=app_settings.giga,
-                )
-                self.__llm_chain.llm = self._giga_client
-
-            history.append(HumanMessage(content=current_message).model_dump(mode="json"))
-
-            current_history = [self.system_message, self.human_message] + history
-
-            topic_context = self._rag_service.get_relevant_context(
-                query=current_message,
-                topic=study_topic,
+            flight_key = self._flight_key(
+                history=history, action=action, current_message=current_message,
+                study_topic=study_topic, user_level=user_level, summary=summary,
             )
-
-            output = await self.__llm_chain.ainvoke(
-                input={
-                    "history": current_history,
-                    "user_level": user_level,
-                    "action": action,
-                    "topic_context": topic_context,
-                    "study_topic": study_topic,
-                }
+            history.append(HumanMessage(content=current_message).model_dump(mode="json"))
+            output = await self._single_flight.do(
+                key=flight_key,
+                fn=lambda: self._agenerate(
+                    history=history, action=action, current_message=current_message,
+                    study_topic=study_topic, user_level=user_level, summary=summary,
+                ),
             )
             content: dict[Any, Any] = parse_json(output["text"])
             logger.debug(f"QuizAgent output: {content=}")
@@ -72,3 +75,57 @@ class QuizAgent:
         except QuizAgentError as e:
             logging.exception(f"QuizAgentError exception: {e}")
             return "Попробуйте задать вопрос позже. Ошибка на стороне сервера", history
+
+    async def agenerate_question(self, study_topic: str, user_level: str) -> dict[str, Any]:
+        """
+        Генерация вопроса без истории диалога, для пула вопросов
+        :param study_topic: тема обучения
+        :param user_level: уровень пользователя
+        :return: вопрос
+        """
+        output = await self._agenerate(
+            history=[],
+            action=QuizAction.generate_question, current_message="",
+            study_topic=study_topic, user_level=user_level, priority=CallPriority.background,
+        )
+        return parse_json(output["text"])
+
+    @staticmethod
+    def record_turn(history: list[str], current_message: str, content: dict[str, Any]) -> list[str]:
+        history.append(HumanMessage(content=current_message).model_dump(mode="json"))
+        history.append(AIMessage(content=str(content)).model_dump(mode="json"))
+        return history
+
+    async def _agenerate(
+            self, history: list[str], action: str, current_message: str,
+            study_topic: str, user_level: str, summary: str = "", priority: CallPriority = CallPriority.quiz,
+    ) -> dict[str, Any]:
+        if self._history_manager is not None:
+            prompt_history = self._history_manager.render(history=history, summary=summary)
+        else:
+            prompt_history = history
+
+        topic_context = await self._rag_service.aget_relevant_context(
+            query=current_message,
+            topic=study_topic,
+            user_level=user_level,
+        )
+
+        inputs = {
+            "history": prompt_history,
+            "user_level": user_level,
+            "action": action,
+            "topic_context": topic_context,
+            "study_topic": study_topic,
+        }
+
+        # Фоновое пополнение пула может ждать дольше запроса пользователя
+        deadline = self._queue_deadline if priority is CallPriority.quiz else None
+
+        async def invoke() -> dict[str, Any]:
+            async with limited(self._limiter, priority, deadline=deadline):
+                return await self.__llm_chain.ainvoke(input=inputs)
+
+        # Генерация вопроса идемпотентна; пополнение пула в фоне не дублируется
+        hedge = QuizAction(action) is QuizAction.generate_question and priority is not CallPriority.background
+        return await hedged(self._hedger if hedge else None, invoke)
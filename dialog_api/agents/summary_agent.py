@@ -0,0 +1,33 @@
+import logging
+
+from langchain.chains.llm import LLMChain
+from langchain_community.chat_models import GigaChat
+from langchain_core.prompts import SystemMessagePromptTemplate, HumanMessagePromptTemplate, ChatPromptTemplate
+
+from dialog_api.prompts.summary import system_prompt, user_prompt
+from dialog_api.utils.limiter import AdaptiveLimiter, CallPriority, limited
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryAgent:
+    system_message = SystemMessagePromptTemplate.from_template(system_prompt)
+    human_message = HumanMessagePromptTemplate.from_template(user_prompt)
+    chat_template = ChatPromptTemplate.from_messages(messages=[system_message, human_message])
+
+    def __init__(self, giga_client: GigaChat, limiter: AdaptiveLimiter | None = None) -> None:
+        self.__llm_chain = LLMChain(llm=giga_client, prompt=self.chat_template)
+        self._giga_client = giga_client
+        self._limiter = limiter
+
+    async def ainvoke(self, summary: str, messages: str) -> str:
+        """
+        Свертка вытесняемых из окна сообщений в конспект диалога
+        :param summary: предыдущий конспект
+        :param messages: вытесняемые сообщения
+        :return: обновленный конспект
+        """
+        async with limited(self._limiter, CallPriority.summary):
+            output = await self.__llm_chain.ainvoke(input={"summary": summary or "-", "messages": messages})
+        logger.debug(f"SummaryAgent output: {output['text']}")
+        return output["text"].strip()
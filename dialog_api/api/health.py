@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+
+health_router = APIRouter(prefix="/health", tags=["health"])
+
+RETRY_AFTER_SECONDS = "5"
+
+
+def require_ready(request: Request) -> None:
+    """Зависимость обработчиков API: запросы принимаются только после прогрева"""
+    if not request.app.state.warmup.ready:
+        raise HTTPException(
+            status_code=503, detail="Приложение еще не готово", headers={"Retry-After": RETRY_AFTER_SECONDS},
+        )
+
+
+@health_router.get("/live")
+async def live():
+    """Процесс жив, пока обрабатывает запросы: ошибки прогрева и зависимостей видны в /health/ready"""
+    return ORJSONResponse({"status": "alive"})
+
+
+@health_router.get("/ready")
+async def ready(request: Request):
+    warmup = request.app.state.warmup
+    return ORJSONResponse(
+        {
+            "status": "ready" if warmup.ready else "failed" if warmup.failed else "warming_up",
+            "stages": warmup.report(),
+        },
+        status_code=200 if warmup.ready else 503,
+    )
@@ -1,43 +1,111 @@
 import logging
+from typing import Any, AsyncIterator
 
-from fastapi import APIRouter, Request
+import orjson
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
-from dialog_api.api.v1.schemas import ChatRequest, ChatResponse, QuizResponse, QuizRequest, ClientIDModel, HistoryResponse
-from dialog_api.schemas import UserLevel
+from dialog_api.api.health import require_ready
+from dialog_api.api.v1.schemas import ChatResponse, DialogRequest, QuizResponse, QuizRequest, ClientIDModel, HistoryResponse
+from dialog_api.schemas import QuizAction, UserLevel
+from dialog_api.utils.limiter import LimiterOverloaded
 
-app_router = APIRouter(prefix="/api/v1", tags=["v1"])
+app_router = APIRouter(prefix="/api/v1", tags=["v1"], dependencies=[Depends(require_ready)])
 logger = logging.getLogger(__name__)
 
 
+async def _save_topic_session(
+        request: Request, client_id: str, study_topic: str, history: list[Any], user_level: str, summary: str,
+) -> None:
+    await request.app.state.cache.put_topic(
+        client_id=client_id,
+        study_topic=study_topic,
+        value={
+            "history": history,
+            "user_level": user_level,
+            "summary": summary,
+        },
+    )
+    request.app.state.history_compactor.schedule(
+        client_id=client_id, study_topic=study_topic, history=history, summary=summary,
+    )
+
+
 @app_router.post("/dialog", response_model=ChatResponse)
-async def agent_dialog(request: Request, data: ChatRequest):
+async def agent_dialog(request: Request, data: DialogRequest):
     cache = request.app.state.cache
     study_topic = data.study_topic.value
     client_id, message = data.client_id, data.message
     logger.debug(f"[{client_id}] Request with message {message}")
     dialog_agent = request.app.state.dialog_agent
-    user_session = await cache.get(client_id=client_id, default={})
-    history = user_session.get(study_topic, {}).get("history", [])
-    user_level = user_session.get(study_topic, {}).get("user_level", UserLevel.beginner.value)
+    topic_session = await cache.get_topic(client_id=client_id, study_topic=study_topic, default={})
+    history = topic_session.get("history", [])
+    user_level = topic_session.get("user_level", UserLevel.beginner.value)
+    summary = topic_session.get("summary", "")
 
     giga_chat_answer, history = await dialog_agent.ainvoke(
         history=history, study_topic=study_topic,
-        current_message=message, user_level=user_level,
+        current_message=message, user_level=user_level, use_cache=data.use_cache, summary=summary,
     )
-
-    user_session.update(
-        {
-            study_topic: {
-                "history": history,
-                "user_level": user_level,
-            }
-        }
+    await _save_topic_session(
+        request=request, client_id=client_id, study_topic=study_topic,
+        history=history, user_level=user_level, summary=summary,
     )
-    await cache.put(client_id=client_id, value=user_session)
 
     return {"giga_answer": giga_chat_answer, "client_id": client_id}
 
 
+async def overloaded_handler(request: Request, exc: LimiterOverloaded) -> ORJSONResponse:
+    """Быстрый отказ при перегрузке гигачата вместо ожидания до таймаута"""
+    return ORJSONResponse(
+        {"detail": "Сервис перегружен, повторите запрос позже"},
+        status_code=503, headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _sse_event(event: str, data: dict[str, Any]) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+@app_router.post("/dialog/stream")
+async def agent_dialog_stream(request: Request, data: DialogRequest):
+    cache = request.app.state.cache
+    study_topic = data.study_topic.value
+    client_id, message = data.client_id, data.message
+    logger.debug(f"[{client_id}] Stream request with message {message}")
+    dialog_agent = request.app.state.dialog_agent
+    topic_session = await cache.get_topic(client_id=client_id, study_topic=study_topic, default={})
+    history = topic_session.get("history", [])
+    user_level = topic_session.get("user_level", UserLevel.beginner.value)
+    summary = topic_session.get("summary", "")
+
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in dialog_agent.astream(
+                    history=history, study_topic=study_topic,
+                    current_message=message, user_level=user_level, use_cache=data.use_cache, summary=summary,
+            ):
+                yield _sse_event("chunk", {"text": chunk})
+        except LimiterOverloaded as e:
+            yield _sse_event("error", {"text": "Сервис перегружен, повторите запрос позже", "retry_after": e.retry_after})
+            return
+        except Exception as e:
+            logger.exception(f"[{client_id}] Stream error: {e}")
+            yield _sse_event("error", {"text": "Попробуйте задать вопрос позже. Ошибка на стороне сервера"})
+            return
+
+        await _save_topic_session(
+            request=request, client_id=client_id, study_topic=study_topic,
+            history=history, user_level=user_level, summary=summary,
+        )
+        yield _sse_event("done", {"client_id": client_id})
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app_router.post("/quiz", response_model=QuizResponse, response_model_exclude_none=True)
 async def agent_dialog(request: Request, data: QuizRequest):
     study_topic = data.study_topic.value
@@ -45,23 +113,31 @@ async def agent_dialog(request: Request, data: QuizRequest):
     client_id, message = data.client_id, data.message
     logger.debug(f"[{client_id}] Request with message {message}")
     quiz_agent = request.app.state.quiz_agent
-    user_session = await cache.get(client_id=client_id, default={})
-    history = user_session.get(study_topic, {}).get("history", [])
-    user_level = user_session.get(study_topic, {}).get("user_level", UserLevel.beginner.value)
-    giga_chat_answer, history = await quiz_agent.ainvoke(
-        history=history, action=data.action, user_level=user_level,
-        study_topic=study_topic, current_message=message,
-    )
+    topic_session = await cache.get_topic(client_id=client_id, study_topic=study_topic, default={})
+    history = topic_session.get("history", [])
+    user_level = topic_session.get("user_level", UserLevel.beginner.value)
+    summary = topic_session.get("summary", "")
+    question_pool = request.app.state.question_pool
+    is_generate_question = data.action is QuizAction.generate_question
+    pooled_question = question_pool.pop(
+        client_id=client_id, study_topic=study_topic, user_level=user_level,
+    ) if is_generate_question and question_pool is not None else None
+
+    if pooled_question is not None:
+        giga_chat_answer = pooled_question
+        history = quiz_agent.record_turn(history=history, current_message=message, content=pooled_question)
+    else:
+        giga_chat_answer, history = await quiz_agent.ainvoke(
+            history=history, action=data.action, user_level=user_level,
+            study_topic=study_topic, current_message=message, summary=summary,
+        )
+        if is_generate_question and question_pool is not None and isinstance(giga_chat_answer, dict):
+            question_pool.remember(client_id=client_id, study_topic=study_topic, question=giga_chat_answer)
 
-    user_session.update(
-        {
-            study_topic: {
-                "history": history,
-                "user_level": user_level,
-            }
-        }
+    await _save_topic_session(
+        request=request, client_id=client_id, study_topic=study_topic,
+        history=history, user_level=user_level, summary=summary,
     )
-    await cache.put(client_id=client_id, value=user_session)
 
     return {**giga_chat_answer, "client_id": client_id}
 
@@ -69,5 +145,5 @@ async def agent_dialog(request: Request, data: QuizRequest):
 @app_router.post("/history", response_model=HistoryResponse, response_model_exclude_none=True)
 async def agent_dialog(request: Request, data: ClientIDModel):
     cache = request.app.state.cache
-    history = await cache.get(client_id=data.client_id, default={})
+    history = await cache.get_session(client_id=data.client_id)
     return {"history": history, "client_id": data.client_id}
@@ -19,6 +19,10 @@ class ChatRequest(ClientIDModel):
     study_topic: StudyTopic
 
 
+class DialogRequest(ChatRequest):
+    use_cache: bool = Field(default=True, description="Разрешить ответ из семантического кэша")
+
+
 class ChatResponse(ClientIDModel):
     client_id: UUID
     giga_answer: str
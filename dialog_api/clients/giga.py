@@ -1,5 +1,6 @@
 import logging
 
+from gigachat.models import AccessToken
 from langchain_community.chat_models import GigaChat
 
 from dialog_api.settings import GigaSettings
@@ -21,3 +22,23 @@ def create_gigachat_client(
         timeout=settings.timeout,
         verify_ssl_certs=settings.verify_ssl_certs,
     )
+
+
+def set_access_token(giga_client: GigaChat, access_token: str) -> None:
+    """
+    Замена токена в работающем клиенте: пул соединений сохраняется,
+    запросы после замены уходят с новым токеном
+    :param giga_client: клиент GigaChat, общий для всех агентов
+    :param access_token: новый токен доступа
+    """
+    giga_client.access_token = access_token
+    giga_client._client._access_token = AccessToken(access_token=access_token, expires_at=0)
+
+
+async def warm_up(giga_client: GigaChat) -> None:
+    """Установка соединения с GigaChat заранее, чтобы TLS рукопожатие не попадало на запрос пользователя"""
+    await giga_client._client.aget_models()
+
+
+async def aclose_gigachat_client(giga_client: GigaChat) -> None:
+    await giga_client._client.aclose()
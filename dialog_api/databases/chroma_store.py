@@ -0,0 +1,147 @@
+import logging
+from typing import Any, Callable
+
+import chromadb
+import httpx
+from chromadb.config import Settings
+
+from dialog_api.databases.store import SHARD_SEPARATOR, ShardFactory, VectorStore
+from dialog_api.settings import VectorDBSettings
+
+logger = logging.getLogger(__name__)
+
+
+class ChromaStore(VectorStore):
+    def __init__(self, collection, http_client: httpx.AsyncClient):
+        """
+        Хранилище в коллекции ChromaDB: синхронные операции через клиент chromadb,
+        асинхронный поиск через общий пул keep-alive соединений
+
+        :param collection: коллекция ChromaDB
+        :param http_client: HTTP клиент API ChromaDB
+        """
+        self.collection = collection
+        self._http_client = http_client
+
+    def upsert(
+            self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict[str, Any]],
+    ) -> None:
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids: list[str]) -> None:
+        self.collection.delete(ids=ids)
+
+    def manifest(self, page_size: int = 1000) -> dict[str, str | None]:
+        manifest = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                manifest[doc_id] = (metadata or {}).get("content_hash")
+            if len(page["ids"]) < page_size:
+                return manifest
+            offset += page_size
+
+    def query(self, embedding: list[float], where: dict[str, Any] | None, n_results: int) -> list[dict[str, Any]]:
+        return self._format_results(
+            self.collection.query(query_embeddings=[embedding], n_results=n_results, where=where)
+        )
+
+    async def aquery(
+            self, embedding: list[float], where: dict[str, Any] | None, n_results: int,
+    ) -> list[dict[str, Any]]:
+        response = await self._http_client.post(
+            f"/collections/{self.collection.id}/query",
+            json={
+                "query_embeddings": [embedding],
+                "n_results": n_results,
+                "where": where or {},
+                "where_document": {},
+                "include": ["metadatas", "documents", "distances"],
+            },
+        )
+        response.raise_for_status()
+        return self._format_results(response.json())
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    @staticmethod
+    def _format_results(results: dict[str, Any]) -> list[dict[str, Any]]:
+        documents = []
+        if results["documents"] and results["documents"][0]:
+            for doc_id, doc, metadata, distance in zip(
+                    results["ids"][0],
+                    results["documents"][0],
+                    results["metadatas"][0],
+                    results["distances"][0] if results["distances"] else [999] * len(results["documents"][0])
+            ):
+                documents.append({
+                    "id": doc_id,
+                    "content": doc,
+                    "metadata": metadata,
+                    "score": distance
+                })
+        return documents
+
+
+class ChromaShards(ShardFactory):
+    def __init__(self, settings: VectorDBSettings, embedding_function: Callable[[list[str]], list[list[float]]]):
+        """
+        Шарды в ChromaDB: коллекции <VECTOR_DB_COLLECTION_NAME>__<шард> на одном сервере
+        с общими клиентом и пулом соединений
+
+        :param settings: настройки векторной БД
+        :param embedding_function: функция эмбеддингов коллекций
+        """
+        self.settings = settings
+        self.embedding_function = embedding_function
+        self.client = chromadb.HttpClient(
+            host=settings.host,
+            port=str(settings.port),
+            settings=Settings(anonymized_telemetry=False, allow_reset=True),
+            headers={"X_CHROMA_TOKEN": settings.auth_token} if settings.auth_token else {},
+        )
+        logger.info(f"Подключение к ChromaDB серверу: {settings.host}:{settings.port}")
+        self._http_client = httpx.AsyncClient(
+            base_url=settings.api_url,
+            headers=settings.chroma_client_settings["headers"],
+            timeout=httpx.Timeout(settings.request_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.connection_limit,
+                max_keepalive_connections=settings.connection_limit,
+            ),
+        )
+
+    def names(self) -> list[str]:
+        prefix = f"{self.settings.collection_name}{SHARD_SEPARATOR}"
+        return [
+            collection.name[len(prefix):] for collection in self.client.list_collections()
+            if collection.name.startswith(prefix)
+        ]
+
+    def open(self, name: str) -> ChromaStore:
+        collection_name = self.settings.collection_name
+        if name:
+            collection_name = f"{collection_name}{SHARD_SEPARATOR}{name}"
+        return ChromaStore(collection=self._get_or_create_collection(collection_name), http_client=self._http_client)
+
+    def _get_or_create_collection(self, collection_name: str):
+        client_type = self.client.__class__.__name__
+
+        try:
+            if client_type == "HttpClient":
+                return self.client.get_collection(
+                    name=collection_name,
+                    embedding_function=self.embedding_function,
+                )
+            return self.client.get_collection(name=collection_name)
+        except Exception:
+            return self.client.create_collection(
+                name=collection_name,
+                embedding_function=self.embedding_function,
+                metadata={"description": "Learning materials for educational assistant"}
+            )
+
+    async def aclose(self) -> None:
+        await self._http_client.aclose()
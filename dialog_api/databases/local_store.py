@@ -0,0 +1,342 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import hnswlib
+import numpy as np
+import ormsgpack
+
+from dialog_api.databases.store import ShardFactory, VectorStore
+from dialog_api.settings import VectorDBSettings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.msgpack"
+INDEX_FILE = "hnsw.bin"
+# Блок строк float16, который переводится в float32 за один шаг точного поиска
+EXACT_BLOCK_ROWS = 4096
+
+
+def _isin(values: np.ndarray, options: list[Any]) -> np.ndarray:
+    options = set(options)
+    return np.fromiter((value in options for value in values), dtype=bool, count=len(values))
+
+
+OPERATORS: dict[str, Callable[[np.ndarray, Any], np.ndarray]] = {
+    "$eq": lambda values, option: values == option,
+    "$ne": lambda values, option: values != option,
+    "$in": _isin,
+    "$nin": lambda values, options: ~_isin(values, options),
+}
+
+
+def where_mask(where: dict[str, Any] | None, column: Callable[[str], np.ndarray], size: int) -> np.ndarray:
+    """
+    Маска строк, подходящих под фильтр метаданных в синтаксисе ChromaDB:
+    равенство, $eq, $ne, $in, $nin, $and, $or
+    :param where: фильтр
+    :param column: функция получения значений поля метаданных по всем строкам
+    :param size: число строк
+    :return: булева маска строк
+    """
+    mask = np.ones(size, dtype=bool)
+    for key, condition in (where or {}).items():
+        if key == "$and":
+            for clause in condition:
+                mask &= where_mask(clause, column, size)
+        elif key == "$or":
+            mask &= np.logical_or.reduce([where_mask(clause, column, size) for clause in condition])
+        else:
+            values = column(key)
+            for operator, option in (condition if isinstance(condition, dict) else {"$eq": condition}).items():
+                if operator not in OPERATORS:
+                    raise ValueError(f"Неподдерживаемый оператор фильтра: {operator}")
+                mask &= OPERATORS[operator](values, option)
+    return mask
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12, None)
+
+
+class LocalStore(VectorStore):
+    def __init__(
+            self, path: str, dtype: str = "float32", bruteforce_limit: int = 20000,
+            hnsw_m: int = 16, hnsw_ef_construction: int = 200, hnsw_ef_search: int = 64,
+    ) -> None:
+        """
+        Хранилище внутри процесса: матрица нормированных эмбеддингов float32 или float16
+        и индекс HNSW. Пока подходящих под фильтр строк не больше bruteforce_limit,
+        поиск точный перебором матрицы, иначе приближенный по индексу.
+        Матрица сохраняется в .npy и открывается через mmap, поэтому воркеры,
+        открывшие один каталог, делят ее страницы в page cache
+
+        :param path: каталог файлов хранилища
+        :param dtype: тип элементов матрицы, "float32" или "float16"
+        :param bruteforce_limit: максимум строк для точного поиска
+        :param hnsw_m: число связей узла в графе HNSW
+        :param hnsw_ef_construction: ширина поиска при построении HNSW
+        :param hnsw_ef_search: ширина поиска при запросе к HNSW
+        """
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype)
+        self.bruteforce_limit = bruteforce_limit
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+
+        # Запись под блокировкой; поиск берет снимок и перебирает матрицу без нее
+        self._lock = threading.RLock()
+        self._matrix: np.ndarray | None = None
+        self._size = 0
+        self._ids: list[str] = []
+        self._documents: list[str] = []
+        self._metadatas: list[dict[str, Any]] = []
+        self._positions: dict[str, int] = {}
+        self._columns: dict[str, np.ndarray] = {}
+        self._index: hnswlib.Index | None = None
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        embeddings_path, records_path = self.path / EMBEDDINGS_FILE, self.path / RECORDS_FILE
+        if not embeddings_path.exists() or not records_path.exists():
+            logger.info(f"Локальное векторное хранилище {self.path} пусто")
+            return
+
+        records = ormsgpack.unpackb(records_path.read_bytes())
+        matrix = np.load(embeddings_path, mmap_mode="r")
+        if len(matrix) != len(records["ids"]):
+            logger.error(f"Файлы хранилища {self.path} не согласованы, хранилище будет заполнено заново")
+            return
+        if matrix.dtype != self.dtype:
+            logger.warning(f"Матрица {embeddings_path} хранится в {matrix.dtype}, выполняется перевод в {self.dtype}")
+            matrix = matrix.astype(self.dtype)
+            self._dirty = True
+
+        self._matrix = matrix
+        self._size = len(matrix)
+        self._ids, self._documents, self._metadatas = records["ids"], records["documents"], records["metadatas"]
+        self._positions = {doc_id: position for position, doc_id in enumerate(self._ids)}
+        index_path = self.path / INDEX_FILE
+        if records.get("index_size") == self._size and index_path.exists():
+            self._index = hnswlib.Index(space="l2", dim=matrix.shape[1])
+            self._index.load_index(str(index_path), max_elements=self._size)
+        logger.info(
+            f"Загружено локальное векторное хранилище {self.path}: {self._size} документов, "
+            f"{self.dtype}, индекс HNSW: {self._index is not None}"
+        )
+
+    def upsert(
+            self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict[str, Any]],
+    ) -> None:
+        vectors = normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._reserve(len(ids), dim=vectors.shape[1])
+            positions = []
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                position = self._positions.get(doc_id)
+                if position is None:
+                    position = self._positions[doc_id] = self._size
+                    self._ids.append(doc_id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                    self._size += 1
+                else:
+                    self._documents[position] = document
+                    self._metadatas[position] = metadata
+                positions.append(position)
+            self._matrix[positions] = vectors.astype(self.dtype)
+            self._columns = {}
+            if self._index is not None:
+                if self._size > self._index.get_max_elements():
+                    self._index.resize_index(max(self._size, 2 * self._index.get_max_elements()))
+                self._index.add_items(vectors, positions)
+            self._dirty = True
+
+    def _reserve(self, extra: int, dim: int) -> None:
+        """Матрица растет удвоением; открытая через mmap матрица копируется в память при первой записи"""
+        matrix = self._matrix
+        if matrix is not None and matrix.flags.writeable and self._size + extra <= len(matrix):
+            return
+        grown = np.zeros((max(self._size + extra, 2 * self._size, 1024), dim), dtype=self.dtype)
+        if self._size:
+            grown[:self._size] = matrix[:self._size]
+        self._matrix = grown
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock:
+            dropped = {self._positions[doc_id] for doc_id in ids if doc_id in self._positions}
+            if not dropped:
+                return
+            keep = [position for position in range(self._size) if position not in dropped]
+            # Снимки, взятые поиском до удаления, продолжают ссылаться на старые объекты
+            self._matrix = self._matrix[keep]
+            self._ids = [self._ids[position] for position in keep]
+            self._documents = [self._documents[position] for position in keep]
+            self._metadatas = [self._metadatas[position] for position in keep]
+            self._positions = {doc_id: position for position, doc_id in enumerate(self._ids)}
+            self._size = len(keep)
+            self._columns = {}
+            self._index = None
+            self._dirty = True
+
+    def manifest(self) -> dict[str, str | None]:
+        with self._lock:
+            return {
+                doc_id: (metadata or {}).get("content_hash")
+                for doc_id, metadata in zip(self._ids, self._metadatas)
+            }
+
+    def count(self) -> int:
+        return self._size
+
+    def _column(self, key: str) -> np.ndarray:
+        if key not in self._columns:
+            values = np.empty(self._size, dtype=object)
+            values[:] = [(metadata or {}).get(key) for metadata in self._metadatas[:self._size]]
+            self._columns[key] = values
+        return self._columns[key]
+
+    def query(self, embedding: list[float], where: dict[str, Any] | None, n_results: int) -> list[dict[str, Any]]:
+        query = normalize(np.asarray(embedding, dtype=np.float32))
+        with self._lock:
+            size, matrix = self._size, self._matrix
+            records = self._ids, self._documents, self._metadatas
+            if not size:
+                return []
+            candidates = np.flatnonzero(where_mask(where, self._column, size)) if where else None
+            count = size if candidates is None else len(candidates)
+            if not count:
+                return []
+            k = min(n_results, count)
+            if count > self.bruteforce_limit:
+                positions, distances = self._search_index(query, k, candidates, size)
+                return self._format(positions, distances, *records)
+
+        positions, distances = self._search_exact(matrix[:size], query, k, candidates)
+        return self._format(positions, distances, *records)
+
+    @staticmethod
+    def _search_exact(
+            matrix: np.ndarray, query: np.ndarray, k: int, candidates: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        rows = matrix if candidates is None else matrix[candidates]
+        if rows.dtype == np.float32:
+            similarities = rows @ query
+        else:
+            similarities = np.concatenate([
+                rows[start:start + EXACT_BLOCK_ROWS].astype(np.float32) @ query
+                for start in range(0, len(rows), EXACT_BLOCK_ROWS)
+            ])
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        positions = top if candidates is None else candidates[top]
+        # Для нормированных векторов квадрат евклидова расстояния равен 2 - 2 * cos
+        return positions, 2 - 2 * similarities[top]
+
+    def _search_index(
+            self, query: np.ndarray, k: int, candidates: np.ndarray | None, size: int,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        index = self._build_index()
+        index.set_ef(max(self.hnsw_ef_search, k))
+        if candidates is None:
+            labels, distances = index.knn_query(query, k=k)
+        else:
+            allowed = np.zeros(size, dtype=bool)
+            allowed[candidates] = True
+            labels, distances = index.knn_query(query, k=k, filter=lambda label: bool(allowed[label]))
+        return labels[0], distances[0]
+
+    def _build_index(self) -> hnswlib.Index:
+        if self._index is None:
+            index = hnswlib.Index(space="l2", dim=self._matrix.shape[1])
+            index.init_index(
+                max_elements=max(self._size, 1024), ef_construction=self.hnsw_ef_construction, M=self.hnsw_m,
+            )
+            index.add_items(self._matrix[:self._size].astype(np.float32), np.arange(self._size))
+            self._index = index
+            logger.info(f"Построен индекс HNSW по {self._size} документам")
+        return self._index
+
+    @staticmethod
+    def _format(
+            positions: np.ndarray, distances: np.ndarray,
+            ids: list[str], documents: list[str], metadatas: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        return [
+            {
+                "id": ids[position],
+                "content": documents[position],
+                "metadata": metadatas[position],
+                "score": float(distance),
+            }
+            for position, distance in zip(positions.tolist(), distances.tolist())
+        ]
+
+    def persist(self) -> None:
+        """
+        Атомарная запись матрицы, индекса и записей документов.
+        Индекс сохраняется, если поиск по всей коллекции пойдет через HNSW
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.mkdir(parents=True, exist_ok=True)
+            index = self._build_index() if self._size > self.bruteforce_limit else None
+
+            with self._replace(EMBEDDINGS_FILE) as tmp_path:
+                with open(tmp_path, "wb") as file:
+                    np.save(file, np.ascontiguousarray(self._matrix[:self._size]))
+            if index is not None:
+                with self._replace(INDEX_FILE) as tmp_path:
+                    index.save_index(str(tmp_path))
+            with self._replace(RECORDS_FILE) as tmp_path:
+                tmp_path.write_bytes(ormsgpack.packb({
+                    "ids": self._ids,
+                    "documents": self._documents,
+                    "metadatas": self._metadatas,
+                    "index_size": self._size if index is not None else 0,
+                }))
+            self._dirty = False
+        logger.info(f"Локальное векторное хранилище сохранено в {self.path}: {self._size} документов")
+
+    @contextmanager
+    def _replace(self, name: str) -> Iterator[Path]:
+        """Запись во временный файл с заменой целевого после успешного завершения"""
+        path = self.path / name
+        tmp_path = path.with_name(f".{name}.tmp")
+        try:
+            yield tmp_path
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.replace(tmp_path, path)
+
+
+class LocalShards(ShardFactory):
+    def __init__(self, settings: VectorDBSettings) -> None:
+        """
+        Шарды локального хранилища: подкаталоги VECTOR_DB_LOCAL_PATH
+        :param settings: настройки векторной БД
+        """
+        self.settings = settings
+
+    def names(self) -> list[str]:
+        if not os.path.isdir(self.settings.local_path):
+            return []
+        return [entry.name for entry in os.scandir(self.settings.local_path) if entry.is_dir()]
+
+    def open(self, name: str) -> LocalStore:
+        return LocalStore(
+            path=os.path.join(self.settings.local_path, name) if name else self.settings.local_path,
+            dtype=self.settings.local_dtype,
+            bruteforce_limit=self.settings.bruteforce_limit,
+            hnsw_m=self.settings.hnsw_m,
+            hnsw_ef_construction=self.settings.hnsw_ef_construction,
+            hnsw_ef_search=self.settings.hnsw_ef_search,
+        )
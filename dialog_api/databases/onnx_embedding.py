@@ -0,0 +1,235 @@
+import logging
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import orjson
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+logger = logging.getLogger(__name__)
+
+PARITY_SENTENCES = [
+    "Что такое декоратор в Python?",
+    "Как работает замыкание в JavaScript?",
+    "Чем список отличается от кортежа?",
+    "Для чего нужен генератор и ключевое слово yield?",
+    "Как объявить асинхронную функцию с async и await?",
+    "Что такое промис и как обработать его ошибку?",
+    "Как работает сборщик мусора в Python?",
+    "Чем let отличается от var и const?",
+    "Как прочитать файл построчно?",
+    "Что делает контекстный менеджер with?",
+    "Как устроено наследование классов?",
+    "Что такое стрелочная функция?",
+    "Как обработать исключение try except?",
+    "Для чего нужен словарь и как получить значение по ключу?",
+    "Как работает цикл событий в браузере?",
+    "Что такое типизация и аннотации типов?",
+]
+
+
+class OnnxArtifactError(Exception): ...
+
+
+def artifact_paths(onnx_dir: str, model_name: str, quantize: bool) -> dict[str, Path]:
+    root = Path(onnx_dir) / model_name.replace("/", "__")
+    model_file = "model.int8.onnx" if quantize else "model.onnx"
+    return {
+        "root": root,
+        "fp32": root / "model.onnx",
+        "model": root / model_file,
+        "tokenizer": root / "tokenizer.json",
+        "config": root / "config.json",
+        "parity": root / f"{model_file}.parity.json",
+    }
+
+
+def mean_pooling(last_hidden_state: np.ndarray, attention_mask: np.ndarray, normalize: bool) -> np.ndarray:
+    mask = attention_mask[..., np.newaxis].astype(np.float32)
+    embeddings = (last_hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+    return embeddings
+
+
+def parity_report(reference: np.ndarray, candidate: np.ndarray, k: int = 5) -> dict[str, float]:
+    """
+    Сравнение эмбеддингов ONNX с эталонными torch
+    :param reference: эталонные эмбеддинги
+    :param candidate: проверяемые эмбеддинги тех же текстов
+    :param k: глубина сравнения выдачи
+    :return: минимальное и среднее косинусное сходство пар и средняя доля общих соседей в топ-k
+    """
+    def normalized(matrix: np.ndarray) -> np.ndarray:
+        return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+    reference, candidate = normalized(reference), normalized(candidate)
+    cosine = (reference * candidate).sum(axis=1)
+    k = min(k, len(reference) - 1)
+
+    def neighbours(matrix: np.ndarray) -> np.ndarray:
+        similarities = matrix @ matrix.T
+        np.fill_diagonal(similarities, -np.inf)
+        return np.argsort(-similarities, axis=1)[:, :k]
+
+    overlap = [
+        len(set(expected) & set(found)) / k
+        for expected, found in zip(neighbours(reference), neighbours(candidate))
+    ]
+    return {"cosine_min": float(cosine.min()), "cosine_mean": float(cosine.mean()), "overlap_at_k": float(np.mean(overlap))}
+
+
+def verify_artifact(
+        onnx_dir: str, model_name: str, quantize: bool,
+        min_cosine: float | None = None, min_overlap: float | None = None,
+) -> dict[str, Any]:
+    """
+    Проверка экспортированной модели по сохраненному отчету: метрики сравниваются с порогами заново,
+    поэтому ужесточение порогов в настройках отбраковывает ранее принятую модель
+    :param onnx_dir: каталог артефактов
+    :param model_name: имя модели
+    :param quantize: модель, квантованная в int8
+    :param min_cosine: порог косинусного сходства, по умолчанию из отчета
+    :param min_overlap: порог доли общих соседей, по умолчанию из отчета
+    :return: отчет о проверке
+    """
+    paths = artifact_paths(onnx_dir, model_name, quantize)
+    if not paths["model"].exists():
+        raise OnnxArtifactError(f"Нет ONNX модели {paths['model']}")
+    report = orjson.loads(paths["parity"].read_bytes()) if paths["parity"].exists() else {}
+    min_cosine = report.get("min_cosine") if min_cosine is None else min_cosine
+    min_overlap = report.get("min_overlap") if min_overlap is None else min_overlap
+    if (
+            min_cosine is None or min_overlap is None
+            or report.get("cosine_min", -1.0) < min_cosine or report.get("overlap_at_k", -1.0) < min_overlap
+    ):
+        raise OnnxArtifactError(
+            f"ONNX модель {paths['model']} не прошла проверку совпадения с torch "
+            f"(min_cosine={min_cosine}, min_overlap={min_overlap}): {report}"
+        )
+    return report
+
+
+def export_onnx(
+        model_name: str, onnx_dir: str, quantize: bool, min_cosine: float, min_overlap: float,
+) -> dict[str, Any]:
+    """
+    Экспорт модели SentenceTransformer в ONNX, квантование int8 и проверка совпадения с torch.
+    Выполняется один раз, результат сохраняется в onnx_dir
+    :param model_name: имя модели
+    :param onnx_dir: каталог артефактов
+    :param quantize: динамическое квантование весов в int8
+    :param min_cosine: минимальное косинусное сходство с эмбеддингами torch
+    :param min_overlap: минимальная доля общих соседей в топ-k
+    :return: отчет о проверке
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    paths = artifact_paths(onnx_dir, model_name, quantize)
+    paths["root"].mkdir(parents=True, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu").eval()
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    if not pooling.pooling_mode_mean_tokens:
+        raise OnnxArtifactError(f"Для {model_name} поддерживается только mean pooling")
+
+    if not paths["fp32"].exists():
+        sample = model.tokenizer(["пример"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        with torch.no_grad():
+            torch.onnx.export(
+                model[0].auto_model,
+                args=tuple(sample[name] for name in input_names),
+                f=str(paths["fp32"]),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={name: {0: "batch", 1: "sequence"} for name in [*input_names, "last_hidden_state"]},
+                opset_version=14,
+                do_constant_folding=True,
+            )
+        model.tokenizer.save_pretrained(str(paths["root"]))
+        paths["config"].write_bytes(orjson.dumps({
+            "model_name": model_name,
+            "max_seq_length": model.max_seq_length,
+            "normalize": any(isinstance(module, Normalize) for module in model),
+            "input_names": input_names,
+        }))
+        logger.info(f"Модель {model_name} экспортирована в ONNX: {paths['fp32']}")
+
+    if quantize and not paths["model"].exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(paths["fp32"]), str(paths["model"]), weight_type=QuantType.QInt8)
+        logger.info(f"Модель {model_name} квантована в int8: {paths['model']}")
+
+    reference = model.encode(PARITY_SENTENCES, convert_to_numpy=True)
+    candidate = OnnxEmbeddingModel(onnx_dir, model_name, quantize, check_parity=False).encode(PARITY_SENTENCES)
+    report = parity_report(reference, candidate)
+    report.update(min_cosine=min_cosine, min_overlap=min_overlap)
+    report["passed"] = report["cosine_min"] >= min_cosine and report["overlap_at_k"] >= min_overlap
+    paths["parity"].write_bytes(orjson.dumps(report))
+    logger.info(f"Проверка ONNX модели {paths['model'].name} против torch: {report}")
+    return report
+
+
+class OnnxEmbeddingModel:
+    def __init__(
+            self, onnx_dir: str, model_name: str, quantize: bool, num_threads: int = 1, check_parity: bool = True,
+            min_cosine: float | None = None, min_overlap: float | None = None,
+    ) -> None:
+        """
+        Эмбеддинги через ONNX Runtime и токенизатор HuggingFace без загрузки torch
+
+        :param onnx_dir: каталог артефактов
+        :param model_name: имя модели
+        :param quantize: использовать модель, квантованную в int8
+        :param num_threads: потоков ONNX Runtime на один вызов модели
+        :param check_parity: требовать успешную проверку совпадения с torch
+        :param min_cosine: порог косинусного сходства для проверки, по умолчанию из отчета
+        :param min_overlap: порог доли общих соседей для проверки, по умолчанию из отчета
+        """
+        paths = artifact_paths(onnx_dir, model_name, quantize)
+        if not paths["model"].exists():
+            raise OnnxArtifactError(f"Нет ONNX модели {paths['model']}")
+        if check_parity:
+            verify_artifact(onnx_dir, model_name, quantize, min_cosine=min_cosine, min_overlap=min_overlap)
+
+        config = orjson.loads(paths["config"].read_bytes())
+        self.normalize = config["normalize"]
+        self.input_names = config["input_names"]
+        self.tokenizer = Tokenizer.from_file(str(paths["tokenizer"]))
+        self.tokenizer.enable_truncation(max_length=config["max_seq_length"])
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(paths["model"]), options, providers=["CPUExecutionProvider"])
+        logger.info(f"Загружена ONNX модель для эмбеддингов: {paths['model']}")
+
+    def encode(self, sentences: list[str], **kwargs) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(sentences)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        (last_hidden_state,) = self.session.run(
+            ["last_hidden_state"], {name: inputs[name] for name in self.input_names},
+        )
+        return mean_pooling(last_hidden_state, inputs["attention_mask"], normalize=self.normalize)
+
+
+if __name__ == "__main__":
+    from dialog_api.settings import app_settings
+
+    settings = app_settings.vector_db
+    export_onnx(
+        model_name=settings.embedding_model,
+        onnx_dir=settings.onnx_dir,
+        quantize=settings.onnx_quantize,
+        min_cosine=settings.onnx_min_cosine,
+        min_overlap=settings.onnx_min_overlap,
+    )
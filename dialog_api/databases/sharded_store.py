@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Iterator
+
+from dialog_api.databases.store import SHARD_SEPARATOR, ShardFactory, VectorStore
+
+logger = logging.getLogger(__name__)
+
+ShardKey = tuple[str, ...]
+
+
+# Условия на поля шардирования проверяются по ключу шарда и не передаются в хранилище шарда
+SHARD_OPERATORS: dict[str, Callable[[str, Any], bool]] = {
+    "$eq": lambda value, option: value == str(option),
+    "$ne": lambda value, option: value != str(option),
+    "$in": lambda value, options: value in {str(option) for option in options},
+    "$nin": lambda value, options: value not in {str(option) for option in options},
+}
+
+
+def _flatten(where: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    for key, condition in where.items():
+        if key == "$and":
+            for clause in condition:
+                yield from _flatten(clause)
+        else:
+            yield {key: condition}
+
+
+def route_filter(
+        where: dict[str, Any] | None, shard_keys: tuple[str, ...],
+) -> tuple[list[tuple[int, str, Any]], dict[str, Any] | None]:
+    """
+    Разбор фильтра метаданных на условия маршрутизации и остаток для хранилища шарда
+    :param where: фильтр в синтаксисе ChromaDB
+    :param shard_keys: поля метаданных, по которым шардирован корпус
+    :return: условия (позиция в ключе шарда, оператор, значение) и оставшийся фильтр
+    """
+    routed, rest = [], []
+    for clause in _flatten(where or {}):
+        ((key, condition),) = clause.items()
+        condition = condition if isinstance(condition, dict) else {"$eq": condition}
+        if key in shard_keys and set(condition) <= set(SHARD_OPERATORS):
+            routed.extend((shard_keys.index(key), operator, option) for operator, option in condition.items())
+        else:
+            rest.append(clause)
+
+    if not rest:
+        return routed, None
+    return routed, rest[0] if len(rest) == 1 else {"$and": rest}
+
+
+class ShardedStore(VectorStore):
+    def __init__(self, factory: ShardFactory, shard_keys: tuple[str, ...]) -> None:
+        """
+        Маршрутизация по шардам: секции раскладываются по значениям полей метаданных shard_keys
+        (тема или тема и уровень), а запрос с условием равенства по этим полям идет только
+        в свои шарды. Стоимость поиска пропорциональна размеру темы, а не всего корпуса
+
+        :param factory: фабрика шардов бэкенда
+        :param shard_keys: поля шардирования, пустой кортеж - один шард без разбиения
+        """
+        self.factory = factory
+        self.shard_keys = shard_keys
+        self._lock = threading.Lock()
+        self._shards: dict[ShardKey, VectorStore] = {}
+        self._owners: dict[str, ShardKey] = {}
+        self._discover()
+        logger.info(f"Открыто шардов векторной БД: {len(self._shards)}, шардирование по {shard_keys or 'нет'}")
+
+    def _discover(self) -> None:
+        """Открытие шардов, созданных этим или другим процессом"""
+        for name in (self.factory.names() if self.shard_keys else [""]):
+            key = self.shard_key(name)
+            if len(key) == len(self.shard_keys) and key not in self._shards:
+                self._shard(key)
+
+    @staticmethod
+    def shard_key(name: str) -> ShardKey:
+        return tuple(name.split(SHARD_SEPARATOR)) if name else ()
+
+    def _shard(self, key: ShardKey) -> VectorStore:
+        with self._lock:
+            if key not in self._shards:
+                self._shards[key] = self.factory.open(SHARD_SEPARATOR.join(key))
+            return self._shards[key]
+
+    def upsert(
+            self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict[str, Any]],
+    ) -> None:
+        groups: dict[ShardKey, list[int]] = defaultdict(list)
+        moved: dict[ShardKey, list[str]] = defaultdict(list)
+        for position, (doc_id, metadata) in enumerate(zip(ids, metadatas)):
+            key = tuple(str(metadata.get(name)) for name in self.shard_keys)
+            groups[key].append(position)
+            # Секция, у которой сменился уровень или тема, переезжает в другой шард
+            if (owner := self._owners.get(doc_id, key)) != key:
+                moved[owner].append(doc_id)
+
+        for owner, moved_ids in moved.items():
+            self._shards[owner].delete(moved_ids)
+        for key, positions in groups.items():
+            self._shard(key).upsert(
+                ids=[ids[position] for position in positions],
+                embeddings=[embeddings[position] for position in positions],
+                documents=[documents[position] for position in positions],
+                metadatas=[metadatas[position] for position in positions],
+            )
+            self._owners.update((ids[position], key) for position in positions)
+
+    def delete(self, ids: list[str]) -> None:
+        groups: dict[ShardKey, list[str]] = defaultdict(list)
+        for doc_id in ids:
+            owner = self._owners.pop(doc_id, None)
+            for key in ([owner] if owner is not None else list(self._shards)):
+                groups[key].append(doc_id)
+        for key, shard_ids in groups.items():
+            self._shards[key].delete(shard_ids)
+
+    def manifest(self) -> dict[str, str | None]:
+        self._discover()
+        manifest = {}
+        for key, shard in list(self._shards.items()):
+            shard_manifest = shard.manifest()
+            manifest.update(shard_manifest)
+            self._owners.update(dict.fromkeys(shard_manifest, key))
+        return manifest
+
+    def _route(self, where: dict[str, Any] | None) -> tuple[list[VectorStore], dict[str, Any] | None]:
+        routed, rest = route_filter(where, self.shard_keys)
+        shards = [
+            shard for key, shard in list(self._shards.items())
+            if all(SHARD_OPERATORS[operator](key[position], option) for position, operator, option in routed)
+        ]
+        return shards, rest
+
+    @staticmethod
+    def _merge(results: list[list[dict[str, Any]]], n_results: int) -> list[dict[str, Any]]:
+        if len(results) == 1:
+            return results[0]
+        return sorted((document for documents in results for document in documents), key=lambda d: d["score"])[:n_results]
+
+    def query(self, embedding: list[float], where: dict[str, Any] | None, n_results: int) -> list[dict[str, Any]]:
+        shards, rest = self._route(where)
+        return self._merge([shard.query(embedding, rest, n_results) for shard in shards], n_results)
+
+    async def aquery(
+            self, embedding: list[float], where: dict[str, Any] | None, n_results: int,
+    ) -> list[dict[str, Any]]:
+        shards, rest = self._route(where)
+        results = await asyncio.gather(*(shard.aquery(embedding, rest, n_results) for shard in shards))
+        return self._merge(list(results), n_results)
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in list(self._shards.values()))
+
+    def persist(self) -> None:
+        for shard in list(self._shards.values()):
+            shard.persist()
+
+    async def aclose(self) -> None:
+        for shard in list(self._shards.values()):
+            await shard.aclose()
+        await self.factory.aclose()
@@ -0,0 +1,74 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Callable
+
+from dialog_api.settings import VectorDBSettings
+
+SHARD_SEPARATOR = "__"
+SHARD_KEYS = {"none": (), "topic": ("topic",), "topic_level": ("topic", "level")}
+
+
+class VectorStore(ABC):
+    """
+    Хранилище эмбеддингов документов. Оценка "score" в выдаче - квадрат евклидова расстояния
+    между нормированными векторами, как в коллекции ChromaDB по умолчанию: чем меньше, тем ближе
+    """
+
+    @abstractmethod
+    def upsert(
+            self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict[str, Any]],
+    ) -> None: ...
+
+    @abstractmethod
+    def delete(self, ids: list[str]) -> None: ...
+
+    @abstractmethod
+    def manifest(self) -> dict[str, str | None]: ...
+
+    @abstractmethod
+    def query(self, embedding: list[float], where: dict[str, Any] | None, n_results: int) -> list[dict[str, Any]]: ...
+
+    @abstractmethod
+    def count(self) -> int: ...
+
+    async def aquery(
+            self, embedding: list[float], where: dict[str, Any] | None, n_results: int,
+    ) -> list[dict[str, Any]]:
+        return await asyncio.to_thread(self.query, embedding, where, n_results)
+
+    def persist(self) -> None:
+        """Сохранение изменений на диск, если хранилище этого требует"""
+
+    async def aclose(self) -> None: ...
+
+
+class ShardFactory(ABC):
+    """Открытие шардов одного бэкенда по имени; пустое имя - хранилище без шардирования"""
+
+    @abstractmethod
+    def names(self) -> list[str]: ...
+
+    @abstractmethod
+    def open(self, name: str) -> VectorStore: ...
+
+    async def aclose(self) -> None: ...
+
+
+def create_store(settings: VectorDBSettings, embedding_function: Callable[[list[str]], list[list[float]]]) -> VectorStore:
+    """
+    Фабрика хранилища по настройкам
+    :param settings: настройки векторной БД
+    :param embedding_function: функция эмбеддингов, ее использует коллекция ChromaDB
+    :return: хранилище с маршрутизацией по шардам
+    """
+    from dialog_api.databases.sharded_store import ShardedStore
+
+    if settings.backend == "local":
+        from dialog_api.databases.local_store import LocalShards
+
+        factory = LocalShards(settings=settings)
+    else:
+        from dialog_api.databases.chroma_store import ChromaShards
+
+        factory = ChromaShards(settings=settings, embedding_function=embedding_function)
+    return ShardedStore(factory=factory, shard_keys=SHARD_KEYS[settings.sharding])
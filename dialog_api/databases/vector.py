@@ -1,9 +1,12 @@
+import asyncio
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
-from chromadb.config import Settings
-import chromadb
-from sentence_transformers import SentenceTransformer
+from dialog_api.databases.onnx_embedding import OnnxArtifactError, OnnxEmbeddingModel, export_onnx, verify_artifact
+from dialog_api.databases.store import create_store
+from dialog_api.services.embedding_batcher import EmbeddingBatcher
+from dialog_api.services.embedding_cache import EmbeddingCache
 from dialog_api.settings import VectorDBSettings
 
 logger = logging.getLogger(__name__)
@@ -15,10 +18,70 @@ os.environ["CHROMA_EMBEDDING_FUNCTION_PROVIDER"] = "sentence_transformers"
 os.environ["CHROMA_ANONYMIZED_TELEMETRY"] = "FALSE"
 
 
+_models: dict[tuple, Any] = {}
+
+
+def load_embedding_model(settings: VectorDBSettings) -> Any:
+    """
+    Модель загружается один раз на процесс. В многопроцессном режиме ее загружает мастер-процесс
+    до запуска воркеров, и воркеры после fork используют общие страницы памяти с весами
+    :param settings: настройки векторной БД
+    :return: модель с методом encode
+    """
+    key = (settings.embedding_model, settings.embedding_backend, settings.onnx_quantize, settings.inference_threads)
+    if key not in _models:
+        _models[key] = _load_embedding_model(settings)
+    return _models[key]
+
+
+def _onnx_args(settings: VectorDBSettings) -> dict[str, Any]:
+    return dict(
+        onnx_dir=settings.onnx_dir, model_name=settings.embedding_model, quantize=settings.onnx_quantize,
+        min_cosine=settings.onnx_min_cosine, min_overlap=settings.onnx_min_overlap,
+    )
+
+
+def prepare_onnx_model(settings: VectorDBSettings) -> None:
+    """
+    Экспорт модели в ONNX, если готовой проверенной модели нет. Выполняется вне обслуживания запросов:
+    в процессе синхронизации корпуса перед запуском воркеров или командой
+    python -m dialog_api.databases.onnx_embedding
+    :param settings: настройки векторной БД
+    """
+    try:
+        verify_artifact(**_onnx_args(settings))
+        return
+    except OnnxArtifactError as e:
+        logger.warning(f"{e}, выполняется экспорт модели в ONNX")
+    try:
+        export_onnx(**_onnx_args(settings))
+    except Exception as e:
+        logger.error(f"Ошибка экспорта модели в ONNX: {e}")
+
+
+def _load_embedding_model(settings: VectorDBSettings) -> Any:
+    if settings.embedding_backend == "onnx":
+        # Экспорт требует torch и занимает минуты, поэтому здесь не выполняется: без готовой модели работает torch
+        try:
+            return OnnxEmbeddingModel(**_onnx_args(settings), num_threads=settings.inference_threads)
+        except OnnxArtifactError as e:
+            logger.error(
+                f"{e}. Используется torch; для экспорта выполните python -m dialog_api.databases.onnx_embedding"
+            )
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(settings.inference_threads)
+    model = SentenceTransformer(settings.embedding_model, device="cpu")
+    model.eval()
+    logger.info(f"Загружена модель для эмбеддингов: {settings.embedding_model}")
+    return model
+
+
 class CustomEmbeddingFunction:
-    def __init__(self, model_name: str):
-        self.model = SentenceTransformer(model_name, device="cpu")
-        logger.info(f"Загружена модель для эмбеддингов: {model_name}")
+    def __init__(self, settings: VectorDBSettings):
+        self.model = load_embedding_model(settings)
 
     def __call__(self, input: list[str]) -> list[list[float]]:
         try:
@@ -30,41 +93,24 @@ class CustomEmbeddingFunction:
 
 
 class VectorDB:
-    def __init__(self, vector_db_settings: VectorDBSettings):
+    def __init__(self, vector_db_settings: VectorDBSettings, embedding_cache: EmbeddingCache | None = None):
         self.vector_db_settings = vector_db_settings
-        self.embedding_function = CustomEmbeddingFunction(vector_db_settings.embedding_model)
-        auth_token = vector_db_settings.auth_token
-
-        self.client = chromadb.HttpClient(
-            host=vector_db_settings.host,
-            port=str(vector_db_settings.port),
-            settings=Settings(anonymized_telemetry=False, allow_reset=True),
-            headers={"X_CHROMA_TOKEN": auth_token} if auth_token else {},
+        self.embedding_function = CustomEmbeddingFunction(vector_db_settings)
+        self.embedding_cache = embedding_cache
+        self.store = create_store(settings=vector_db_settings, embedding_function=self.embedding_function)
+        self._executor = ThreadPoolExecutor(
+            max_workers=vector_db_settings.embedding_workers, thread_name_prefix="embedding",
         )
-        logger.info(f"Подключение к ChromaDB серверу: {vector_db_settings.host}:{vector_db_settings.port}")
-
-        self.collection = self._get_or_create_collection()
-
-    def _get_or_create_collection(self):
-        client_type = self.client.__class__.__name__
-
-        try:
-            if client_type == "HttpClient":
-                return self.client.get_collection(
-                    name=self.vector_db_settings.collection_name,
-                    embedding_function=self.embedding_function,
-                )
-            return self.client.get_collection(name=self.vector_db_settings.collection_name)
-        except Exception:
-            return self.client.create_collection(
-                name=self.vector_db_settings.collection_name,
-                embedding_function=self.embedding_function,
-                metadata={"description": "Learning materials for educational assistant"}
-            )
+        self._batcher = EmbeddingBatcher(
+            embed=self.embedding_function,
+            executor=self._executor,
+            max_batch_size=vector_db_settings.query_batch_size,
+            max_wait=vector_db_settings.query_batch_wait_ms / 1000,
+        ) if vector_db_settings.query_batch_size > 1 else None
 
     def add_documents(self, documents: list[dict[str, Any]]) -> None:
         """
-        Метод добавления документов в вевторную БД
+        Метод добавления (обновления по id) документов в вевторную БД
         :param documents: cписок документов
         :return:
         """
@@ -75,28 +121,57 @@ class VectorDB:
 
             for i in range(0, len(documents), batch_size):
                 batch = documents[i:i + batch_size]
-
-                ids = [doc["id"] for doc in batch]
-                texts = [doc["content"] for doc in batch]
-                metadatas = [doc["metadata"] for doc in batch]
-
-                self.collection.add(
-                    documents=texts,
-                    metadatas=metadatas,
-                    ids=ids
-                )
+                self.upsert_embedded(batch, self.embedding_function([doc["content"] for doc in batch]))
                 total_added += len(batch)
 
             logger.info(f"Успешно добавлено {total_added} документов")
 
             # Проверяем добавление
-            count = self.collection.count()
+            count = self.store.count()
             logger.info(f"Теперь в коллекции: {count} документов")
 
         except Exception as e:
             logger.error(f"Ошибка добавления документов: {e}")
             raise
 
+    def upsert_embedded(self, documents: list[dict[str, Any]], embeddings: list[list[float]]) -> None:
+        """
+        Метод записи документов с заранее посчитанными эмбеддингами
+        :param documents: cписок документов
+        :param embeddings: эмбеддинги документов
+        :return:
+        """
+        self.store.upsert(
+            ids=[doc["id"] for doc in documents],
+            embeddings=embeddings,
+            documents=[doc["content"] for doc in documents],
+            metadatas=[doc["metadata"] for doc in documents],
+        )
+
+    def delete_documents(self, ids: list[str]) -> None:
+        """
+        Метод удаления документов из векторной БД
+        :param ids: идентификаторы документов
+        :return:
+        """
+        try:
+            self.store.delete(ids=ids)
+            logger.info(f"Удалено {len(ids)} документов")
+        except Exception as e:
+            logger.error(f"Ошибка удаления документов: {e}")
+            raise
+
+    def get_manifest(self) -> dict[str, str | None]:
+        """
+        Метод получения хэшей содержимого уже сохраненных документов
+        :return: отображение id документа -> content_hash
+        """
+        return self.store.manifest()
+
+    def persist(self) -> None:
+        """Метод сохранения хранилища на диск после синхронизации корпуса"""
+        self.store.persist()
+
     def search(self, query: str, where_filter: dict[str, str], n_results: int = 5) -> list[dict[str, Any]]:
         """
         Метод семантического поиска учебных материалов по запросу пользователя
@@ -106,35 +181,81 @@ class VectorDB:
         :return: n_results наиболее релевантных документов
         """
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                where=where_filter,
-            )
+            documents = self.store.query(self.embed_query(query), where=where_filter, n_results=n_results)
+            logger.debug(f"Найдено {len(documents)} релевантных документов для запроса: {query}")
+            return documents
+
+        except Exception as e:
+            logger.error(f"Ошибка поиска в векторной БД: {e}")
+            return []
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Метод вычисления эмбеддингов в отдельном пуле потоков, не блокируя event loop
+        :param texts: тексты для векторизации
+        :return: эмбеддинги
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embedding_function, texts)
 
-            documents = []
-            if results["documents"] and results["documents"][0]:
-                for i, (doc, metadata, distance) in enumerate(zip(
-                        results["documents"][0],
-                        results["metadatas"][0],
-                        results["distances"][0] if results["distances"] else [999] * len(results["documents"][0])
-                )):
-                    documents.append({
-                        "content": doc,
-                        "metadata": metadata,
-                        "score": distance
-                    })
+    def embed_query(self, query: str) -> list[float]:
+        if self.embedding_cache is None:
+            return self.embedding_function([query])[0]
 
+        key = self.embedding_cache.key(query)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            embedding = self.embedding_function([self.embedding_cache.normalize(query)])[0]
+            self.embedding_cache.put(key, embedding)
+        return embedding
+
+    async def aembed_query(self, query: str) -> list[float]:
+        """
+        Метод получения эмбеддинга запроса с учетом кэша
+        :param query: запрос пользователя
+        :return: эмбеддинг запроса
+        """
+        if self.embedding_cache is None:
+            return await self._aembed_one(query)
+
+        key = self.embedding_cache.key(query)
+        embedding = await self.embedding_cache.aget(key)
+        if embedding is None:
+            embedding = await self._aembed_one(self.embedding_cache.normalize(query))
+            await self.embedding_cache.aput(key, embedding)
+        return embedding
+
+    async def _aembed_one(self, text: str) -> list[float]:
+        if self._batcher is None:
+            return (await self.aembed([text]))[0]
+        return await self._batcher.embed(text)
+
+    async def asearch(self, query: str, where_filter: dict[str, str], n_results: int = 5) -> list[dict[str, Any]]:
+        """
+        Асинхронный семантический поиск: эмбеддинг считается в пуле потоков,
+        поиск выполняет хранилище, не блокируя event loop
+        :param query: запрос пользователя
+        :param where_filter: фильтрация по метаданным
+        :param n_results: количество документов
+        :return: n_results наиболее релевантных документов
+        """
+        try:
+            query_embedding = await self.aembed_query(query)
+            documents = await self.store.aquery(query_embedding, where=where_filter, n_results=n_results)
             logger.debug(f"Найдено {len(documents)} релевантных документов для запроса: {query}")
             return documents
 
         except Exception as e:
-            logger.error(f"Ошибка поиска в векторной БД: {e}")
+            logger.error(f"Ошибка асинхронного поиска в векторной БД: {e}")
             return []
 
+    async def aclose(self) -> None:
+        await self.store.aclose()
+        self._executor.shutdown(wait=False)
+
     def get_collection_stats(self) -> dict[str, Any]:
         try:
-            count = self.collection.count()
+            count = self.store.count()
             return {"document_count": count}
         except Exception as e:
             logger.error(f"Ошибка получения статистики: {e}")
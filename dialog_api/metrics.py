@@ -1,10 +1,168 @@
-from prometheus_client import Summary
+from prometheus_client import Counter, Gauge, Histogram, Summary
 
 DIALOG_GIGA_AINVOKE = Summary(
     "dialog_giga_ainvoke",
     "Время работы гигачата в режиме диалога"
 )
+DIALOG_GIGA_FIRST_CHUNK = Summary(
+    "dialog_giga_first_chunk",
+    "Время до первой части ответа гигачата в потоковом режиме диалога"
+)
 QUIZ_GIGA_AINVOKE= Summary(
     "quiz_giga_ainvoke",
     "Время работы гигачата в режиме квиза"
-)
\ No newline at end of file
+)
+GIGA_LIMITER_LIMIT = Gauge(
+    "giga_limiter_limit",
+    "Текущий адаптивный лимит одновременных вызовов гигачата",
+)
+GIGA_LIMITER_IN_FLIGHT = Gauge(
+    "giga_limiter_in_flight",
+    "Выполняющиеся вызовы гигачата",
+)
+GIGA_LIMITER_QUEUE = Gauge(
+    "giga_limiter_queue",
+    "Вызовы гигачата, ожидающие в очереди",
+)
+GIGA_LIMITER_SHED = Counter(
+    "giga_limiter_shed",
+    "Вызовы гигачата, отклоненные при перегрузке",
+    ["priority", "reason"],
+)
+GIGA_HEDGE_CALLS = Counter(
+    "giga_hedge_calls",
+    "Вызовы гигачата, для которых разрешено дублирование",
+    ["agent"],
+)
+GIGA_HEDGES = Counter(
+    "giga_hedges",
+    "Продублированные вызовы гигачата по победившему вызову",
+    ["agent", "winner"],
+)
+GIGA_HEDGE_LATENCY = Histogram(
+    "giga_hedge_latency",
+    "Время продублированного вызова гигачата до первого ответа по победившему вызову, секунды",
+    ["agent", "winner"],
+    buckets=(0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0),
+)
+GIGA_HEDGE_DELAY = Gauge(
+    "giga_hedge_delay",
+    "Текущая задержка перед дублем вызова гигачата (квантиль недавних задержек), секунды",
+    ["agent"],
+)
+GIGA_TOKEN_REFRESHES = Counter(
+    "giga_token_refreshes",
+    "Фоновые обновления токена гигачата",
+    ["result"],
+)
+EMBEDDING_CACHE_HITS = Counter(
+    "embedding_cache_hits",
+    "Попадания в кэш эмбеддингов запросов",
+    ["tier"],
+)
+EMBEDDING_CACHE_MISSES = Counter(
+    "embedding_cache_misses",
+    "Промахи кэша эмбеддингов запросов",
+)
+EMBEDDING_CACHE_EVICTIONS = Counter(
+    "embedding_cache_evictions",
+    "Вытеснения из локального кэша эмбеддингов",
+    ["reason"],
+)
+SEMANTIC_CACHE_REQUESTS = Counter(
+    "semantic_cache_requests",
+    "Обращения к семантическому кэшу ответов диалога",
+    ["result"],
+)
+COALESCED_CALLS = Counter(
+    "coalesced_calls",
+    "Вызовы гигачата, объединенные с уже выполняющимся идентичным вызовом",
+    ["agent"],
+)
+QUESTION_POOL_DEPTH = Gauge(
+    "question_pool_depth",
+    "Количество готовых вопросов квиза в пуле",
+    ["topic", "level"],
+)
+QUESTION_POOL_REFILL = Summary(
+    "question_pool_refill",
+    "Время генерации вопроса для пула квиза"
+)
+QUESTION_POOL_REQUESTS = Counter(
+    "question_pool_requests",
+    "Запросы вопроса из пула квиза",
+    ["result"],
+)
+HISTORY_WINDOW_TOKENS = Histogram(
+    "history_window_tokens",
+    "Размер истории диалога в промпте, токены",
+    buckets=(50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000),
+)
+HISTORY_SUMMARIZATIONS = Counter(
+    "history_summarizations",
+    "Свертки старых сообщений истории в конспект",
+)
+HISTORY_WRITE_BEHIND_DEPTH = Gauge(
+    "history_write_behind_depth",
+    "Количество сессий, ожидающих записи в Ignite",
+)
+HISTORY_WRITE_BEHIND_FLUSH = Histogram(
+    "history_write_behind_flush",
+    "Время записи пачки сессий в Ignite",
+)
+HISTORY_WRITE_BEHIND_DROPPED = Counter(
+    "history_write_behind_dropped",
+    "Сессии, вытесненные из переполненной очереди отложенной записи",
+)
+HISTORY_NEAR_CACHE_REQUESTS = Counter(
+    "history_near_cache_requests",
+    "Чтения сессий через локальный кэш: hit - версия совпала, stale - версия устарела, miss - записи нет",
+    ["result"],
+)
+IGNITE_NODE_UP = Gauge(
+    "ignite_node_up",
+    "Состояние соединения с узлом Ignite: 1 - подключен, 0 - нет",
+    ["node"],
+)
+IGNITE_QUERY_DURATION = Histogram(
+    "ignite_query_duration",
+    "Время выполнения запроса к узлу Ignite",
+    ["node", "op"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+IGNITE_QUERY_ERRORS = Counter(
+    "ignite_query_errors",
+    "Ошибки запросов и подключений к узлу Ignite",
+    ["node", "op"],
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size",
+    "Количество запросов в одной пачке векторизации",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+EMBEDDING_QUEUE_WAIT = Histogram(
+    "embedding_queue_wait",
+    "Время ожидания запроса в очереди векторизации до отправки пачки в модель",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+WARMUP_STAGE_SECONDS = Gauge(
+    "warmup_stage_seconds",
+    "Длительность стадии прогрева приложения",
+    ["stage"],
+)
+RAG_RETRIEVAL_DURATION = Histogram(
+    "rag_retrieval_duration",
+    "Время получения секций для контекста: lexical - только BM25, vector - только векторный поиск, hybrid - оба со слиянием",
+    ["path"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+RAG_CONTEXT_TOKENS = Histogram(
+    "rag_context_tokens",
+    "Размер контекста RAG в промпте, токены: raw - первые секции выдачи целиком, built - после сборки контекста",
+    ["stage"],
+    buckets=(0, 50, 100, 200, 400, 600, 800, 1000, 1500, 2000, 3000, 5000),
+)
+RAG_CONTEXT_SKIPPED = Counter(
+    "rag_context_skipped",
+    "Запросы без контекста RAG: лучшая найденная секция дальше порога болтовни",
+)
@@ -0,0 +1,90 @@
+import asyncio
+import gc
+import importlib
+import logging
+import multiprocessing
+import os
+import sys
+from pathlib import Path
+
+from dialog_api.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+CORPUS_READY_ENV = "DIALOG_API_CORPUS_READY"
+# Файлы значений метрик prometheus_client в многопроцессном режиме
+METRIC_FILE_KINDS = ("counter", "gauge", "histogram", "summary")
+
+
+def initialize_corpus() -> None:
+    """Синхронизация корпуса документов с векторной базой, выполняется в отдельном процессе"""
+    from dialog_api.databases.vector import VectorDB, prepare_onnx_model
+    from dialog_api.services.document_loader import DocumentLoader
+    from dialog_api.services.rag import RAGService
+    from dialog_api.settings import app_settings
+
+    if app_settings.vector_db.embedding_backend == "onnx":
+        prepare_onnx_model(app_settings.vector_db)
+    vector_db = VectorDB(vector_db_settings=app_settings.vector_db)
+    rag_service = RAGService(
+        vector_db=vector_db,
+        documents_number=app_settings.vector_db.documents_number,
+        document_loader=DocumentLoader(
+            documents_path=app_settings.vector_db.documents_path,
+            parse_workers=app_settings.vector_db.parse_workers,
+            inline_bytes=app_settings.vector_db.parse_inline_bytes,
+        ),
+        embedding_batch_size=app_settings.vector_db.embedding_batch_size,
+        retrieval_settings=app_settings.retrieval,
+    )
+    rag_service.initialize_with_documents()
+    asyncio.run(vector_db.aclose())
+
+
+def setup_multiprocess_metrics(settings: Settings) -> None:
+    """
+    Метрики нескольких воркеров: каждый процесс пишет значения в файлы каталога
+    PROMETHEUS_MULTIPROC_DIR, а /prometheus собирает их всех через MultiProcessCollector.
+    Вызывается до импорта prometheus_client, иначе метрики останутся однопроцессными
+    :param settings: настройки приложения
+    """
+    if "prometheus_client" in sys.modules:
+        raise RuntimeError("prometheus_client импортирован до настройки метрик нескольких воркеров")
+    metrics_dir = Path(settings.metrics_dir)
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    # Файлы прошлого запуска иначе попадут в сумму метрик
+    for kind in METRIC_FILE_KINDS:
+        for stale in metrics_dir.glob(f"{kind}_*.db"):
+            stale.unlink()
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(metrics_dir)
+    logger.info(f"Метрики воркеров собираются через каталог {metrics_dir}")
+
+
+def prefork(settings: Settings) -> None:
+    """
+    Подготовка мастер-процесса к запуску воркеров granian через fork:
+    корпус синхронизируется один раз, а модель эмбеддингов и приложение загружаются
+    до fork, чтобы воркеры разделяли эти страницы памяти, а не держали по своей копии
+    :param settings: настройки приложения
+    """
+    # Инференс в отдельном процессе: после работы пулов потоков torch в мастере fork небезопасен
+    process = multiprocessing.get_context("spawn").Process(target=initialize_corpus, name="corpus-init")
+    process.start()
+    process.join()
+    if process.exitcode == 0:
+        os.environ[CORPUS_READY_ENV] = "1"
+    else:
+        logger.error(f"Синхронизация корпуса завершилась с кодом {process.exitcode}, ее выполнят воркеры")
+
+    from dialog_api.databases.vector import load_embedding_model
+    from dialog_api.server import WARMUP_MODULES
+
+    for module in WARMUP_MODULES:
+        importlib.import_module(module)
+
+    # Пул потоков ONNX Runtime создается вместе с сессией и не переживает fork
+    if settings.vector_db.embedding_backend == "torch" or settings.vector_db.inference_threads == 1:
+        load_embedding_model(settings.vector_db)
+    # Объекты мастера не попадают в сборку мусора воркеров, и их страницы не копируются при записи
+    gc.freeze()
+    logger.info(f"Мастер-процесс готов к запуску {settings.workers} воркеров")
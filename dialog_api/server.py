@@ -1,23 +1,34 @@
+import asyncio
 import logging
+import os
 import ssl
+from contextlib import suppress
+from typing import Any
 
 import aiohttp
 from fastapi import FastAPI
+from filelock import FileLock
+from starlette.datastructures import State
 from starlette_exporter import PrometheusMiddleware, handle_metrics
 
-from dialog_api.agents.dialog_agent import DialogAgent
-from dialog_api.agents.quiz_agent import QuizAgent
-from dialog_api.api.v1.handlers import app_router
-from dialog_api.clients.giga import create_gigachat_client
-from dialog_api.databases.vector import VectorDB
-from dialog_api.services.document_loader import DocumentLoader
-from dialog_api.services.ignite import caches_context
-from dialog_api.services.rag import RAGService
+from dialog_api.api.health import health_router
+from dialog_api.api.v1.handlers import app_router, overloaded_handler
+from dialog_api.prefork import CORPUS_READY_ENV
+from dialog_api.services.warmup import Warmup
 from dialog_api.settings import app_settings
+from dialog_api.utils.limiter import AdaptiveLimiter, LimiterOverloaded
 from dialog_api.utils.token_verification import TokenVerification
 
 logger = logging.getLogger(__name__)
 
+# Тяжелые модули импортируются при прогреве, а не при импорте приложения
+WARMUP_MODULES = (
+    "dialog_api.databases.vector",
+    "dialog_api.agents.dialog_agent",
+    "dialog_api.agents.quiz_agent",
+    "dialog_api.agents.summary_agent",
+)
+
 
 def make_httpsession(connection_pool_limit: int):
     ssl_context = ssl.create_default_context()
@@ -26,43 +37,256 @@ def make_httpsession(connection_pool_limit: int):
     return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connection_pool_limit, ssl=ssl_context))
 
 
+def _retry_args() -> dict[str, Any]:
+    settings = app_settings.warmup
+    return dict(retries=settings.retries, backoff=settings.retry_backoff, backoff_max=settings.retry_backoff_max)
+
+
+async def _fetch_token(state: State, warmup: Warmup) -> None:
+    async def fetch() -> None:
+        state.access_token = await state.token_verification.refresh_token()
+
+    await warmup.retry("token", fetch, **_retry_args())
+
+
+async def _connect_ignite(state: State, warmup: Warmup) -> None:
+    from dialog_api.services.ignite import caches_context
+
+    async def connect() -> None:
+        state.cache_client, state.cache = await caches_context.configure(
+            settings=app_settings.ignite, embeddings=app_settings.vector_db.embedding_cache_ignite,
+        )
+
+    await warmup.retry("ignite", connect, **_retry_args())
+    state.ignite_health_task = asyncio.create_task(state.cache_client.run_health_check())
+
+
+async def _load_model(state: State, warmup: Warmup) -> None:
+    async with warmup.stage("model"):
+        from dialog_api.databases.vector import load_embedding_model
+
+        state.embedding_model = await asyncio.to_thread(load_embedding_model, app_settings.vector_db)
+
+
+async def _first_encode(state: State, warmup: Warmup) -> None:
+    async with warmup.stage("first_encode"):
+        await asyncio.to_thread(state.embedding_model.encode, ["Прогрев модели эмбеддингов"])
+
+
+async def _open_vector_db(state: State, warmup: Warmup) -> None:
+    async with warmup.stage("vector_db"):
+        from dialog_api.databases.vector import VectorDB
+        from dialog_api.services.document_loader import DocumentLoader
+        from dialog_api.services.embedding_cache import EmbeddingCache
+        from dialog_api.services.ignite import caches_context
+        from dialog_api.services.context_builder import ContextBuilder
+        from dialog_api.services.rag import RAGService
+        from dialog_api.utils.tokens import TokenCounter
+
+        retrieval = app_settings.retrieval
+        state.token_counter = await asyncio.to_thread(TokenCounter, tokenizer_name=app_settings.history.tokenizer)
+        embedding_cache = EmbeddingCache(
+            model_name=app_settings.vector_db.embedding_model,
+            maxsize=app_settings.vector_db.embedding_cache_size,
+            ttl=app_settings.vector_db.embedding_cache_ttl,
+            remote=caches_context.embeddings,
+        )
+        state.vector_db = await asyncio.to_thread(
+            VectorDB, vector_db_settings=app_settings.vector_db, embedding_cache=embedding_cache,
+        )
+        state.rag_service = RAGService(
+            vector_db=state.vector_db,
+            documents_number=app_settings.vector_db.documents_number,
+            document_loader=DocumentLoader(
+                documents_path=app_settings.vector_db.documents_path,
+                parse_workers=app_settings.vector_db.parse_workers,
+                inline_bytes=app_settings.vector_db.parse_inline_bytes,
+            ),
+            embedding_batch_size=app_settings.vector_db.embedding_batch_size,
+            level_mismatch_penalty=app_settings.vector_db.level_mismatch_penalty,
+            retrieval_settings=retrieval,
+            context_builder=ContextBuilder(
+                token_counter=state.token_counter,
+                budget_tokens=retrieval.context_token_budget,
+                max_sections=app_settings.vector_db.documents_number,
+                mmr_lambda=retrieval.mmr_lambda,
+                duplicate_threshold=retrieval.duplicate_threshold,
+                distance_gap=retrieval.distance_gap,
+                chitchat_distance=retrieval.chitchat_distance,
+            ) if retrieval.context_builder else None,
+        )
+        await asyncio.to_thread(state.rag_service.load_lexical_index)
+
+
+def _initialize_corpus(state: State) -> None:
+    # Несколько процессов, запущенных без мастера, синхронизируют корпус по очереди
+    with FileLock(app_settings.vector_db.init_lock_path):
+        state.rag_service.initialize_with_documents()
+
+
+async def _sync_corpus(state: State, warmup: Warmup) -> None:
+    async with warmup.stage("corpus"):
+        if os.environ.get(CORPUS_READY_ENV):
+            logger.info("Корпус документов синхронизирован мастер-процессом")
+            return
+        await asyncio.to_thread(_initialize_corpus, state)
+
+
+async def _create_agents(state: State, warmup: Warmup) -> None:
+    async with warmup.stage("agents"):
+        from dialog_api.agents.dialog_agent import DialogAgent
+        from dialog_api.agents.quiz_agent import QuizAgent
+        from dialog_api.agents.summary_agent import SummaryAgent
+        from dialog_api.clients.giga import create_gigachat_client
+        from dialog_api.services.history import HistoryCompactor, HistoryManager
+        from dialog_api.services.question_pool import QuestionPool
+        from dialog_api.services.semantic_cache import SemanticAnswerCache
+        from dialog_api.services.token_refresher import TokenRefresher
+        from dialog_api.utils.hedging import Hedger
+
+        # Один клиент на все агенты: токен обновляется в нем на месте, пул соединений не пересоздается
+        state.giga_client = giga_client = create_gigachat_client(
+            settings=app_settings.giga, access_token=state.access_token,
+        )
+        token_refresher = TokenRefresher(
+            token_verification=state.token_verification,
+            giga_client=giga_client,
+            refresh_margin=app_settings.giga.token_refresh_margin,
+            retry_interval=app_settings.giga.token_retry_interval,
+        )
+        await token_refresher.warm_up()
+        state.token_refresh_task = asyncio.create_task(token_refresher.run())
+        limiter = AdaptiveLimiter(
+            initial_limit=app_settings.limiter.initial_limit,
+            min_limit=app_settings.limiter.min_limit,
+            max_limit=app_settings.giga.limit,
+            queue_size=app_settings.limiter.queue_size,
+            queue_deadline=app_settings.limiter.queue_deadline,
+            latency_tolerance=app_settings.limiter.latency_tolerance,
+            backoff=app_settings.limiter.backoff,
+        ) if app_settings.limiter.enabled else None
+        hedging = app_settings.hedging
+        answer_cache = SemanticAnswerCache(
+            embed=state.vector_db.aembed_query,
+            threshold=app_settings.semantic_cache.threshold,
+            maxsize=app_settings.semantic_cache.maxsize,
+            ttl=app_settings.semantic_cache.ttl,
+        ) if app_settings.semantic_cache.enabled else None
+        summary_agent = SummaryAgent(giga_client=giga_client, limiter=limiter)
+        state.history_manager = HistoryManager(
+            token_counter=state.token_counter,
+            budget_tokens=app_settings.history.token_budget,
+            max_messages=app_settings.giga.message_history_number,
+            summary_agent=summary_agent,
+            keep_ratio=app_settings.history.keep_ratio,
+        )
+        state.history_compactor = HistoryCompactor(history_manager=state.history_manager, cache=state.cache)
+        state.dialog_agent = DialogAgent(
+            giga_client=giga_client,
+            message_history_number=app_settings.giga.message_history_number,
+            rag_service=state.rag_service,
+            answer_cache=answer_cache,
+            history_manager=state.history_manager,
+            limiter=limiter,
+            queue_deadline=app_settings.limiter.dialog_deadline,
+            hedger=Hedger(
+                name="dialog", quantile=hedging.quantile, window=hedging.window,
+                min_samples=hedging.min_samples, budget=hedging.budget,
+            ) if hedging.enabled else None,
+        )
+        state.quiz_agent = QuizAgent(
+            giga_client=giga_client,
+            rag_service=state.rag_service,
+            history_manager=state.history_manager,
+            limiter=limiter,
+            queue_deadline=app_settings.limiter.quiz_deadline,
+            hedger=Hedger(
+                name="quiz", quantile=hedging.quantile, window=hedging.window,
+                min_samples=hedging.min_samples, budget=hedging.budget,
+            ) if hedging.enabled else None,
+        )
+        state.question_pool = QuestionPool(
+            quiz_agent=state.quiz_agent,
+            watermark=app_settings.quiz_pool.watermark,
+            refill_interval=app_settings.quiz_pool.refill_interval,
+            refill_concurrency=app_settings.quiz_pool.refill_concurrency,
+            seen_ttl=app_settings.quiz_pool.seen_ttl,
+            max_backoff=app_settings.quiz_pool.max_backoff,
+        ) if app_settings.quiz_pool.enabled else None
+        if state.question_pool:
+            state.question_pool_task = asyncio.create_task(state.question_pool.run())
+
+
+async def warmup_app(state: State, warmup: Warmup) -> None:
+    """
+    Фоновый прогрев: независимые стадии выполняются одновременно,
+    синхронизация корпуса идет после готовности приложения и не задерживает прием запросов
+    """
+    try:
+        await asyncio.gather(_fetch_token(state, warmup), _connect_ignite(state, warmup), _load_model(state, warmup))
+        await asyncio.gather(_first_encode(state, warmup), _open_vector_db(state, warmup))
+        # С пустой векторной БД ответы были бы без учебных материалов: корпус загружается до готовности
+        corpus_required = await asyncio.to_thread(state.vector_db.store.count) == 0
+        if corpus_required:
+            warmup.require("corpus")
+            await _sync_corpus(state, warmup)
+        await _create_agents(state, warmup)
+    except Exception:
+        logger.error(f"Прогрев приложения не завершен: {warmup.report()}")
+        return
+    logger.info("Приложение готово принимать запросы")
+    if not corpus_required:
+        with suppress(Exception):
+            await _sync_corpus(state, warmup)
+
+
+async def _cancel(task: asyncio.Task | None) -> None:
+    if task is None:
+        return
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
 async def lifespan(app: FastAPI):
-    giga_session = make_httpsession(connection_pool_limit=app_settings.giga.limit)
-    token_verification = TokenVerification(
-        session=giga_session,
+    state = app.state
+    state.giga_session = make_httpsession(connection_pool_limit=app_settings.giga.limit)
+    state.token_verification = TokenVerification(
+        session=state.giga_session,
         access_key=app_settings.giga.access_key,
         scope=app_settings.giga.scope,
         access_token_url=app_settings.giga.access_token_url,
     )
-    access_token = await token_verification.refresh_token()
-    document_loader = DocumentLoader(documents_path=app_settings.vector_db.documents_path)
-    rag_service = RAGService(
-        vector_db=VectorDB(vector_db_settings=app_settings.vector_db),
-        documents_number=app_settings.vector_db.documents_number,
-        document_loader=document_loader,
-    )
-    rag_service.initialize_with_documents()
-    giga_client = create_gigachat_client(settings=app_settings.giga, access_token=access_token)
-    dialog_agent = DialogAgent(
-        giga_client=giga_client,
-        token_verification=token_verification,
-        message_history_number=app_settings.giga.message_history_number,
-        rag_service=rag_service,
+    state.warmup = Warmup(
+        required=["token", "ignite", "model", "first_encode", "vector_db", "agents"], optional=["corpus"],
     )
-    quiz_agent = QuizAgent(giga_client=giga_client, token_verification=token_verification, rag_service=rag_service)
-    cache_client, cache = await caches_context.configure(settings=app_settings.ignite)
-    app.state.dialog_agent = dialog_agent
-    app.state.quiz_agent = quiz_agent
-    app.state.cache = cache
+    warmup_task = asyncio.create_task(warmup_app(state, state.warmup))
     logger.info(f"Запуск приложения с уровнем логирования: {app_settings.logger.level}")
     yield
     logger.info("Завершение сессий...")
-    await giga_session.close()
-    await cache_client.shutdown()
+    await _cancel(warmup_task)
+    await _cancel(getattr(state, "question_pool_task", None))
+    await _cancel(getattr(state, "token_refresh_task", None))
+    await state.giga_session.close()
+    if giga_client := getattr(state, "giga_client", None):
+        from dialog_api.clients.giga import aclose_gigachat_client
+
+        await aclose_gigachat_client(giga_client)
+    if vector_db := getattr(state, "vector_db", None):
+        await vector_db.aclose()
+    if history_compactor := getattr(state, "history_compactor", None):
+        await history_compactor.aclose()
+    if cache := getattr(state, "cache", None):
+        await cache.aclose()
+    await _cancel(getattr(state, "ignite_health_task", None))
+    if cache_client := getattr(state, "cache_client", None):
+        await cache_client.shutdown()
     logger.info("Завершение сессий выполнено")
 
 app = FastAPI(lifespan=lifespan, docs_url="/")
 
+app.include_router(router=health_router)
 app.include_router(router=app_router)
+app.add_exception_handler(LimiterOverloaded, overloaded_handler)
 app.add_middleware(PrometheusMiddleware, app_name=app_settings.app_name, group_paths=True)
 app.add_route("/prometheus", handle_metrics)
@@ -0,0 +1,138 @@
+import logging
+from typing import Any, Iterable
+
+import orjson
+import ormsgpack
+import zstandard as zstd
+
+logger = logging.getLogger(__name__)
+
+# Первый байт записи определяет формат. Старые записи в orjson начинаются с символа JSON
+MSGPACK_VERSION = 1
+ZSTD_VERSION = 2
+ZSTD_DICT_VERSION = 3
+
+MESSAGE_FIELDS = ("type", "content")
+
+
+class CodecError(Exception): ...
+
+
+class JsonCodec:
+    """Исходный формат хранения: orjson без сжатия"""
+
+    def encode(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def decode(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class SessionCodec:
+    def __init__(self, compression: str = "zstd", level: int = 3, dictionary: bytes | None = None) -> None:
+        """
+        Компактное хранение сессий: сообщения без пустых служебных полей LangChain,
+        сериализация в msgpack и сжатие zstd, в том числе с обученным словарем.
+        Записи в старом формате orjson читаются без изменений
+
+        :param compression: "zstd" или "none"
+        :param level: уровень сжатия zstd
+        :param dictionary: словарь zstd, обученный на сессиях методом train_dictionary
+        """
+        if compression not in ("zstd", "none"):
+            raise CodecError(f"Неизвестный тип сжатия: {compression}")
+        self.compression = compression
+        self._dictionary = zstd.ZstdCompressionDict(dictionary) if dictionary else None
+        self._compressor = zstd.ZstdCompressor(level=level, dict_data=self._dictionary)
+        self._decompressor = zstd.ZstdDecompressor()
+        self._dict_decompressor = zstd.ZstdDecompressor(dict_data=self._dictionary) if self._dictionary else None
+
+    def encode(self, value: Any) -> bytes:
+        packed = ormsgpack.packb(self.compact(value))
+        if self.compression == "none":
+            return bytes((MSGPACK_VERSION,)) + packed
+        version = ZSTD_DICT_VERSION if self._dictionary else ZSTD_VERSION
+        return bytes((version,)) + self._compressor.compress(packed)
+
+    def decode(self, data: bytes) -> Any:
+        version, payload = data[0], data[1:]
+        if version == MSGPACK_VERSION:
+            return self.expand(ormsgpack.unpackb(payload))
+        if version == ZSTD_VERSION:
+            return self.expand(ormsgpack.unpackb(self._decompressor.decompress(payload)))
+        if version == ZSTD_DICT_VERSION:
+            if self._dict_decompressor is None:
+                raise CodecError("Запись сжата со словарем, но словарь не задан")
+            return self.expand(ormsgpack.unpackb(self._dict_decompressor.decompress(payload)))
+        return orjson.loads(data)
+
+    @classmethod
+    def compact(cls, value: Any) -> Any:
+        if isinstance(value, dict) and isinstance(value.get("history"), list):
+            return {**value, "history": [cls.compact_message(message) for message in value["history"]]}
+        return value
+
+    @classmethod
+    def expand(cls, value: Any) -> Any:
+        if isinstance(value, dict) and isinstance(value.get("history"), list):
+            return {**value, "history": [cls.expand_message(message) for message in value["history"]]}
+        return value
+
+    @staticmethod
+    def compact_message(message: Any) -> Any:
+        """
+        Метод сжатия сообщения LangChain до [type, content] и непустых дополнительных полей
+        :param message: сообщение в виде model_dump(mode="json")
+        :return: компактное сообщение
+        """
+        if not isinstance(message, dict) or "type" not in message:
+            return message
+        extra = {
+            key: value for key, value in message.items()
+            if key not in MESSAGE_FIELDS and not SessionCodec._is_empty(value)
+        }
+        compacted = [message["type"], message.get("content", "")]
+        return compacted + [extra] if extra else compacted
+
+    @staticmethod
+    def _is_empty(value: Any) -> bool:
+        # Сравнение через is: 0 == False, и нулевые числовые поля иначе терялись бы
+        return value is None or value is False or (isinstance(value, (str, dict, list)) and not value)
+
+    @staticmethod
+    def expand_message(message: Any) -> Any:
+        if not isinstance(message, list):
+            return message
+        expanded = {"type": message[0], "content": message[1]}
+        if len(message) > 2:
+            expanded.update(message[2])
+        return expanded
+
+    @classmethod
+    def train_dictionary(cls, samples: Iterable[Any], dict_size: int = 16 * 1024) -> bytes:
+        """
+        Метод обучения словаря zstd на примерах сессий
+        :param samples: сессии в том виде, в котором они сохраняются в кэш
+        :param dict_size: размер словаря в байтах
+        :return: словарь для параметра dictionary
+        """
+        packed = [ormsgpack.packb(cls.compact(sample)) for sample in samples]
+        return zstd.train_dictionary(dict_size, packed).as_bytes()
+
+
+def create_codec(compression: str, level: int, dictionary_path: str = "") -> JsonCodec | SessionCodec:
+    """
+    Фабрика кодека по настройкам
+    :param compression: "json", "none" (msgpack без сжатия) или "zstd"
+    :param level: уровень сжатия zstd
+    :param dictionary_path: путь до словаря zstd
+    :return: кодек
+    """
+    if compression == "json":
+        return JsonCodec()
+    dictionary = None
+    if dictionary_path:
+        with open(dictionary_path, "rb") as file:
+            dictionary = file.read()
+        logger.info(f"Загружен словарь zstd для сессий: {dictionary_path}")
+    return SessionCodec(compression=compression, level=level, dictionary=dictionary)
@@ -0,0 +1,114 @@
+import logging
+import math
+from typing import Any
+
+from dialog_api.metrics import RAG_CONTEXT_SKIPPED, RAG_CONTEXT_TOKENS
+from dialog_api.services.lexical import analyze
+from dialog_api.utils.tokens import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+
+def jaccard(first: set[str], second: set[str]) -> float:
+    return len(first & second) / len(first | second) if first or second else 0.0
+
+
+class ContextBuilder:
+    def __init__(
+            self, token_counter: TokenCounter, budget_tokens: int, max_sections: int, mmr_lambda: float = 0.7,
+            duplicate_threshold: float = 0.8, distance_gap: float = 0.25, chitchat_distance: float = 1.5,
+    ) -> None:
+        """
+        Сборка контекста для промпта из найденных секций: отсечение по разрыву расстояний,
+        отбор MMR без почти одинаковых секций и укладка в бюджет токенов.
+        Расстояния - поле "score" векторной выдачи; секции, найденные только BM25, его не имеют
+
+        :param token_counter: счетчик токенов
+        :param budget_tokens: бюджет токенов на контекст
+        :param max_sections: максимум секций в контексте
+        :param mmr_lambda: вес релевантности против новизны при отборе MMR
+        :param duplicate_threshold: сходство Жаккара по основам слов, начиная с которого секция считается дублем
+        :param distance_gap: разрыв между соседними расстояниями, после которого секции отбрасываются
+        :param chitchat_distance: если даже лучшая секция дальше, запрос считается болтовней и контекст не нужен
+        """
+        self.token_counter = token_counter
+        self.budget_tokens = budget_tokens
+        self.max_sections = max_sections
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.distance_gap = distance_gap
+        self.chitchat_distance = chitchat_distance
+
+    def is_chitchat(self, documents: list[dict[str, Any]]) -> bool:
+        distances = [doc["score"] for doc in documents if "score" in doc]
+        return bool(distances) and min(distances) > self.chitchat_distance
+
+    def adaptive_k(self, documents: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Метод отсечения секций после первого большого разрыва в расстояниях
+        :param documents: секции в порядке выдачи
+        :return: секции не дальше последней до разрыва
+        """
+        distances = sorted(doc["score"] for doc in documents if "score" in doc)
+        cutoff = distances[-1] if distances else math.inf
+        for previous, current in zip(distances, distances[1:]):
+            if current - previous > self.distance_gap:
+                cutoff = previous
+                break
+        return [doc for doc in documents if doc.get("score", cutoff) <= cutoff]
+
+    def select(self, documents: list[dict[str, Any]], tokens: list[int]) -> tuple[list[dict[str, Any]], int]:
+        """
+        Метод отбора MMR: релевантность по месту в выдаче, штраф за сходство с уже отобранными.
+        Дубли отбрасываются, секции сверх бюджета пропускаются, первая секция обрезается по бюджету
+        :param documents: секции в порядке выдачи
+        :param tokens: число токенов каждой секции
+        :return: отобранные секции и число их токенов
+        """
+        terms = [set(analyze(doc["content"])) for doc in documents]
+        relevance = [1 - rank / len(documents) for rank in range(len(documents))]
+
+        def similarity(index: int) -> float:
+            return max((jaccard(terms[index], terms[other]) for other in selected), default=0.0)
+
+        remaining = list(range(len(documents)))
+        selected: list[int] = []
+        sections: list[dict[str, Any]] = []
+        used = 0
+        while remaining and len(selected) < self.max_sections:
+            best = max(
+                remaining,
+                key=lambda index: self.mmr_lambda * relevance[index] - (1 - self.mmr_lambda) * similarity(index),
+            )
+            remaining.remove(best)
+            if selected and similarity(best) >= self.duplicate_threshold:
+                continue
+            document = documents[best]
+            if used + tokens[best] > self.budget_tokens:
+                if selected:
+                    continue
+                content = document["content"]
+                document = {**document, "content": content[:len(content) * self.budget_tokens // tokens[best]]}
+            selected.append(best)
+            sections.append(document)
+            used += min(tokens[best], self.budget_tokens)
+        return sections, used
+
+    def build(self, documents: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Метод сборки контекста
+        :param documents: найденные секции в порядке выдачи
+        :return: секции для промпта; пустой список, если запрос - болтовня
+        """
+        tokens = {id(doc): self.token_counter.count(doc["content"]) for doc in documents}
+        RAG_CONTEXT_TOKENS.labels(stage="raw").observe(sum(tokens[id(doc)] for doc in documents[:self.max_sections]))
+        if self.is_chitchat(documents):
+            RAG_CONTEXT_SKIPPED.inc()
+            RAG_CONTEXT_TOKENS.labels(stage="built").observe(0)
+            logger.debug("Лучшая секция слишком далека от запроса, контекст не добавляется")
+            return []
+
+        kept = self.adaptive_k(documents)
+        sections, used = self.select(kept, [tokens[id(doc)] for doc in kept])
+        RAG_CONTEXT_TOKENS.labels(stage="built").observe(used)
+        return sections
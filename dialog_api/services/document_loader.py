@@ -1,91 +1,180 @@
+import multiprocessing
 import os
 import logging
-from typing import Any
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterator
 
-from dialog_api.schemas import StudyTopic, UserLevel
+import orjson
+import xxhash
+
+from dialog_api.schemas import UserLevel
 
 logger = logging.getLogger(__name__)
 
 
+def section_hash(content: str, metadata: dict[str, Any]) -> str:
+    """Хэш содержимого секции вместе с метаданными, по нему определяются изменившиеся секции"""
+    payload = orjson.dumps(
+        {"content": content, "metadata": {k: v for k, v in metadata.items() if k != "content_hash"}},
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return xxhash.xxh3_128_hexdigest(payload)
+
+
+def section_source(topic: str, filename: str) -> str:
+    """Префикс id секций одного файла"""
+    return f"{topic}_{filename[:-4]}"
+
+
+def source_of(doc_id: str) -> str:
+    """Файл, из которого получена секция, по ее id"""
+    return doc_id.rpartition("_")[0]
+
+
+def section_id(source: str, content: str, occurrence: int) -> str:
+    """
+    Id секции по файлу и содержимому, а не по позиции: вставка секции в начало файла
+    не меняет id остальных секций
+    :param source: префикс файла из section_source
+    :param content: текст секции
+    :param occurrence: номер повтора одинакового текста в файле, начиная с 1
+    :return: id секции
+    """
+    digest = xxhash.xxh3_64_hexdigest(content)
+    return f"{source}_{digest}" if occurrence == 1 else f"{source}_{digest}-{occurrence}"
+
+
+def detect_level(content: str) -> str:
+    content_lower = content.lower()
+    professional_keywords = ["decorator", "async", "await", "promise", "class", "inheritance", "prototype"]
+    advanced_keywords = ["function", "object", "array", "method", "loop", "conditional"]
+
+    if any(keyword in content_lower for keyword in professional_keywords):
+        return UserLevel.professional.value
+    elif any(keyword in content_lower for keyword in advanced_keywords):
+        return UserLevel.advanced.value
+    return UserLevel.beginner.value
+
+
+def parse_text_file(file_path: str, topic: str, filename: str) -> list[dict[str, Any]]:
+    """
+    Метод разбора файла учебных материалов на секции.
+    Функция модульного уровня, чтобы ее можно было выполнять в пуле процессов.
+    Ошибка чтения файла пробрасывается, ее обрабатывает DocumentLoader
+    :param file_path: путь до файла
+    :param topic: топик
+    :param filename: имя файла
+    :return: секции файла
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        content = file.read()
+    source = section_source(topic, filename)
+    occurrences = Counter()
+    documents = []
+
+    for section in content.split("\n\n"):
+        section = section.strip()
+        if not section:  # Пропуск пустых секциий
+            continue
+        occurrences[section] += 1
+        metadata = {
+            "topic": topic,
+            "subtopic": filename[:-4],
+            "level": detect_level(section),
+            "source": filename
+        }
+        metadata["content_hash"] = section_hash(section, metadata)
+
+        documents.append({
+            "id": section_id(source, section, occurrences[section]),
+            "content": section,
+            "metadata": metadata,
+        })
+
+    logger.debug(f"Loaded {len(documents)} sections from {filename}")
+    return documents
+
+
 class DocumentLoader:
-    def __init__(self, documents_path: str):
+    def __init__(self, documents_path: str, parse_workers: int = 1, inline_bytes: int = 0):
+        """
+        Загрузчик учебных материалов
+
+        :param documents_path: папка с документами, поддиректории - темы
+        :param parse_workers: число процессов для разбора файлов
+        :param inline_bytes: корпус меньше этого размера разбирается в текущем процессе без пула
+        """
         self.documents_path = documents_path
+        self.parse_workers = parse_workers
+        self.inline_bytes = inline_bytes
+        # Папка с документами найдена при последнем проходе, иначе отсутствие секций не значит пустой корпус
+        self.corpus_found = False
+        # Файлы последнего прохода, которые не удалось разобрать: их секции нельзя считать удаленными
+        self.failed_sources: set[str] = set()
 
     def load_documents(self) -> list[dict[str, Any]]:
         """Загрузка документов из папки"""
-        documents = []
+        documents = list(self.iter_documents())
+        logger.info(f"Loaded {len(documents)} documents")
+        return documents
 
-        if not os.path.exists(self.documents_path):
+    def iter_documents(self) -> Iterator[dict[str, Any]]:
+        """Потоковая загрузка документов: секции отдаются по мере разбора файлов"""
+        self.corpus_found = os.path.exists(self.documents_path)
+        if not self.corpus_found:
             logger.warning(f"Documents path {self.documents_path} does not exist")
-            return documents
-
-        python_docs = self._load_topic_documents(StudyTopic.python.value)
-        documents.extend(python_docs)
-
-        js_docs = self._load_topic_documents(StudyTopic.javascript.value)
-        documents.extend(js_docs)
+            return
+        self.failed_sources = set()
+
+        files = [
+            (file_path, topic, filename)
+            for topic in self.discover_topics()
+            for file_path, filename in self._iter_topic_files(topic)
+        ]
+        # Запуск пула spawn-процессов дороже разбора небольшого корпуса
+        if self.parse_workers <= 1 or sum(os.path.getsize(file[0]) for file in files) < self.inline_bytes:
+            for file in files:
+                yield from self._parsed(file, partial(parse_text_file, *file))
+            return
+
+        with ProcessPoolExecutor(
+                max_workers=self.parse_workers, mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            # Ограничиваем число файлов в работе, чтобы не держать весь корпус в памяти
+            window = deque()
+            for file in files:
+                window.append((file, pool.submit(parse_text_file, *file).result))
+                if len(window) >= self.parse_workers * 2:
+                    yield from self._parsed(*window.popleft())
+            while window:
+                yield from self._parsed(*window.popleft())
+
+    def _parsed(self, file: tuple[str, str, str], result: Callable[[], list[dict[str, Any]]]) -> list[dict[str, Any]]:
+        """Секции разобранного файла или пустой список, если файл прочитать не удалось"""
+        try:
+            return result()
+        except Exception as e:
+            file_path, topic, filename = file
+            logger.error(f"Error parsing file {file_path}: {e}")
+            self.failed_sources.add(section_source(topic, filename))
+            return []
 
-        logger.info(f"Loaded {len(documents)} documents")
-        return documents
+    def discover_topics(self) -> list[str]:
+        """Темы обучения - поддиректории папки с документами"""
+        return sorted(
+            entry.name for entry in os.scandir(self.documents_path)
+            if entry.is_dir() and not entry.name.startswith(".")
+        )
 
-    def _load_topic_documents(self, topic: str) -> list[dict[str, Any]]:
+    def _iter_topic_files(self, topic: str) -> Iterator[tuple[str, str]]:
         topic_path = os.path.join(self.documents_path, topic)
-        documents = []
 
         if not os.path.exists(topic_path):
             logger.warning(f"Topic path {topic_path} does not exist")
-            return documents
+            return
 
-        for filename in os.listdir(topic_path):
+        for filename in sorted(os.listdir(topic_path)):
             if filename.endswith(".txt"):
-                file_path = os.path.join(topic_path, filename)
-                documents.extend(self._parse_text_file(file_path, topic, filename))
-
-        return documents
-
-    def _parse_text_file(self, file_path: str, topic: str, filename: str) -> list[dict[str, Any]]:
-        """
-        Метод загрузки учебных материалов в векторную базу
-        :param file_path: путь до директории
-        :param topic: топик
-        :param filename: имя файла
-        :return:
-        """
-        try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                content = file.read()
-            sections = content.split("\n\n")
-            documents = []
-
-            for i, section in enumerate(sections):
-                if section.strip():  # Пропуск пустых секциий
-                    doc_id = f"{topic}_{filename[:-4]}_{i + 1}"
-
-                    documents.append({
-                        "id": doc_id,
-                        "content": section.strip(),
-                        "metadata": {
-                            "topic": topic,
-                            "subtopic": filename[:-4],
-                            "level": self._detect_level(section),
-                            "source": filename
-                        }
-                    })
-
-            logger.debug(f"Loaded {len(documents)} sections from {filename}")
-            return documents
-
-        except Exception as e:
-            logger.error(f"Error parsing file {file_path}: {e}")
-            return []
-
-    def _detect_level(self, content: str) -> str:
-        content_lower = content.lower()
-        professional_keywords = ["decorator", "async", "await", "promise", "class", "inheritance", "prototype"]
-        advanced_keywords = ["function", "object", "array", "method", "loop", "conditional"]
-
-        if any(keyword in content_lower for keyword in professional_keywords):
-            return UserLevel.professional.value
-        elif any(keyword in content_lower for keyword in advanced_keywords):
-            return UserLevel.advanced.value
-        return UserLevel.beginner.value
+                yield os.path.join(topic_path, filename), filename
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from time import perf_counter
+from typing import Callable
+
+from dialog_api.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    def __init__(
+            self, embed: Callable[[list[str]], list[list[float]]], executor: Executor,
+            max_batch_size: int, max_wait: float,
+    ) -> None:
+        """
+        Объединение одновременных запросов эмбеддингов в пачки: запросы копятся не дольше max_wait
+        или до max_batch_size, пачка считается моделью за один вызов в пуле инференса
+
+        :param embed: функция векторизации списка текстов
+        :param executor: пул инференса
+        :param max_batch_size: максимальный размер пачки
+        :param max_wait: максимальное время ожидания пачки, секунды
+        """
+        self._embed = embed
+        self._executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: list[tuple[str, asyncio.Future, float]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future, float]]) -> None:
+        dispatched = perf_counter()
+        for _, _, enqueued in batch:
+            EMBEDDING_QUEUE_WAIT.observe(dispatched - enqueued)
+        # Одинаковые тексты в пачке считаются один раз
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        try:
+            embeddings = await asyncio.get_running_loop().run_in_executor(self._executor, self._embed, texts)
+        except Exception as e:
+            logger.error(f"Ошибка векторизации пачки из {len(texts)} запросов: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, embeddings))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(by_text[text])
@@ -0,0 +1,90 @@
+import logging
+from threading import Lock
+
+import xxhash
+from cachetools import TTLCache
+
+from dialog_api.metrics import EMBEDDING_CACHE_EVICTIONS, EMBEDDING_CACHE_HITS, EMBEDDING_CACHE_MISSES
+from dialog_api.services.ignite import EmbeddingsCache
+
+logger = logging.getLogger(__name__)
+
+
+class _InstrumentedTTLCache(TTLCache):
+    def popitem(self):
+        item = super().popitem()
+        EMBEDDING_CACHE_EVICTIONS.labels(reason="size").inc()
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        if expired:
+            EMBEDDING_CACHE_EVICTIONS.labels(reason="ttl").inc(len(expired))
+        return expired
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, maxsize: int, ttl: int, remote: EmbeddingsCache | None = None) -> None:
+        """
+        Двухуровневый кэш эмбеддингов запросов: локальный LRU+TTL и общий кэш в Ignite
+
+        :param model_name: модель эмбеддингов, входит в ключ кэша
+        :param maxsize: максимальное количество записей в локальном кэше
+        :param ttl: время жизни записи в локальном кэше, секунды
+        :param remote: кэш эмбеддингов в Ignite (опционально)
+        """
+        self.model_name = model_name
+        self._local = _InstrumentedTTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = Lock()
+        self._remote = remote
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split()).casefold()
+
+    def key(self, text: str) -> str:
+        return xxhash.xxh3_128_hexdigest(f"{self.model_name}\0{self.normalize(text)}")
+
+    def _get_local(self, key: str) -> list[float] | None:
+        with self._lock:
+            embedding = self._local.get(key)
+        if embedding is not None:
+            EMBEDDING_CACHE_HITS.labels(tier="local").inc()
+        return embedding
+
+    def get(self, key: str) -> list[float] | None:
+        embedding = self._get_local(key)
+        if embedding is None:
+            EMBEDDING_CACHE_MISSES.inc()
+        return embedding
+
+    def put(self, key: str, embedding: list[float]) -> None:
+        with self._lock:
+            self._local[key] = embedding
+
+    async def aget(self, key: str) -> list[float] | None:
+        embedding = self._get_local(key)
+        if embedding is not None:
+            return embedding
+
+        if self._remote is not None:
+            try:
+                embedding = await self._remote.get(key, None)
+            except Exception as e:
+                logger.error(f"Ошибка чтения эмбеддинга из Ignite: {e}")
+                embedding = None
+            if embedding is not None:
+                EMBEDDING_CACHE_HITS.labels(tier="ignite").inc()
+                self.put(key, embedding)
+                return embedding
+
+        EMBEDDING_CACHE_MISSES.inc()
+        return None
+
+    async def aput(self, key: str, embedding: list[float]) -> None:
+        self.put(key, embedding)
+        if self._remote is not None:
+            try:
+                await self._remote.put(key, embedding)
+            except Exception as e:
+                logger.error(f"Ошибка записи эмбеддинга в Ignite: {e}")
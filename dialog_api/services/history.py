@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Any
+
+from dialog_api.metrics import HISTORY_SUMMARIZATIONS, HISTORY_WINDOW_TOKENS
+from dialog_api.utils.tokens import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+ROLE_NAMES = {"human": "Пользователь", "ai": "Ассистент", "system": "Система"}
+
+
+class HistoryManager:
+    def __init__(
+            self, token_counter: TokenCounter, budget_tokens: int, max_messages: int,
+            summary_agent=None, keep_ratio: float = 0.5,
+    ) -> None:
+        """
+        Окно истории диалога в пределах бюджета токенов со сверткой старых сообщений в конспект.
+        Конспект расходует тот же бюджет, что и сообщения
+
+        :param token_counter: счетчик токенов
+        :param budget_tokens: бюджет токенов на историю в промпте
+        :param max_messages: максимум сообщений в окне
+        :param summary_agent: агент свертки старых сообщений в конспект
+        :param keep_ratio: доля бюджета, которая остается в истории после свертки
+        """
+        self.token_counter = token_counter
+        self.budget_tokens = budget_tokens
+        self.max_messages = max_messages
+        self.keep_ratio = keep_ratio
+        self._summary_agent = summary_agent
+
+    def window(self, history: list[Any], budget_tokens: int | None = None, max_messages: int | None = None) -> list[Any]:
+        """
+        Метод выбора последних сообщений в пределах бюджета токенов.
+        Последнее сообщение попадает в окно всегда
+        :param history: история диалога
+        :param budget_tokens: бюджет токенов, по умолчанию из настроек
+        :param max_messages: максимум сообщений, по умолчанию из настроек
+        :return: последние сообщения истории
+        """
+        budget_tokens = self.budget_tokens if budget_tokens is None else budget_tokens
+        max_messages = self.max_messages if max_messages is None else max_messages
+        total = 0
+        start = len(history)
+        for message in reversed(history):
+            tokens = self.token_counter.count_message(message)
+            if start < len(history) and (total + tokens > budget_tokens or len(history) - start >= max_messages):
+                break
+            total += tokens
+            start -= 1
+        return history[start:]
+
+    def render(self, history: list[Any], summary: str = "") -> str:
+        """
+        Метод формирования истории для промпта: конспект и окно последних сообщений
+        :param history: история диалога
+        :param summary: конспект ранних сообщений
+        :return: история в текстовом виде
+        """
+        window = self.window(history, budget_tokens=max(self.budget_tokens - self.token_counter.count(summary), 0))
+        rendered = self.format_messages(window)
+        if summary:
+            rendered = f"Конспект предыдущего диалога: {summary}\n{rendered}"
+        HISTORY_WINDOW_TOKENS.observe(self.token_counter.count(rendered))
+        return rendered
+
+    @staticmethod
+    def format_messages(messages: list[Any]) -> str:
+        lines = []
+        for message in messages:
+            if isinstance(message, dict):
+                role = ROLE_NAMES.get(message.get("type"), message.get("type", ""))
+                lines.append(f"{role}: {message.get('content', '')}")
+            else:
+                lines.append(str(message))
+        return "\n".join(lines)
+
+    def needs_compaction(self, history: list[Any], summary: str = "") -> bool:
+        """Признак выхода истории вместе с конспектом за бюджет токенов или лимит сообщений"""
+        if len(history) > self.max_messages:
+            return True
+        total = self.token_counter.count(summary)
+        total += sum(self.token_counter.count_message(message) for message in history)
+        return total > self.budget_tokens
+
+    async def acompact(self, history: list[Any], summary: str = "") -> tuple[list[Any], str]:
+        """
+        Метод свертки вышедших за бюджет сообщений в конспект
+        :param history: история диалога
+        :param summary: текущий конспект
+        :return: укороченная история и обновленный конспект
+        """
+        if not self.needs_compaction(history, summary):
+            return history, summary
+
+        # Оставляем запас, чтобы сворачивать историю не на каждом ходе
+        recent = self.window(
+            history,
+            budget_tokens=int(self.budget_tokens * self.keep_ratio),
+            max_messages=max(int(self.max_messages * self.keep_ratio), 1),
+        )
+        overflow = history[:len(history) - len(recent)]
+        if self._summary_agent is None:
+            return recent, summary
+
+        try:
+            summary = await self._summary_agent.ainvoke(summary=summary, messages=self.format_messages(overflow))
+        except Exception as e:
+            logger.error(f"Ошибка свертки истории в конспект: {e}")
+            return history, summary
+        HISTORY_SUMMARIZATIONS.inc()
+        return recent, summary
+
+
+class HistoryCompactor:
+    def __init__(self, history_manager: HistoryManager, cache) -> None:
+        """
+        Свертка истории в фоне, вне пути ответа: для пары клиент-тема одновременно идет
+        не больше одной свертки, результат записывается в сессию, если за время свертки
+        в нее добавились только новые сообщения
+
+        :param history_manager: менеджер истории
+        :param cache: кэш сессий с get_topic/put_topic
+        """
+        self._history_manager = history_manager
+        self._cache = cache
+        self._tasks: dict[tuple[str, str], asyncio.Task] = {}
+
+    def schedule(self, client_id: str, study_topic: str, history: list[Any], summary: str) -> None:
+        """
+        Метод запуска свертки сохраненной сессии
+        :param client_id: идентификатор клиента
+        :param study_topic: тема обучения
+        :param history: история, записанная в сессию
+        :param summary: конспект, записанный в сессию
+        """
+        key = (client_id, study_topic)
+        if key in self._tasks:
+            return
+        task = asyncio.create_task(self._compact(client_id, study_topic, list(history), summary))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+
+    async def _compact(self, client_id: str, study_topic: str, history: list[Any], summary: str) -> None:
+        try:
+            if not self._history_manager.needs_compaction(history, summary):
+                return
+            compacted, new_summary = await self._history_manager.acompact(history=history, summary=summary)
+            if compacted == history and new_summary == summary:
+                return
+            session = await self._cache.get_topic(client_id=client_id, study_topic=study_topic, default={})
+            current = session.get("history", [])
+            if current[:len(history)] != history or session.get("summary", "") != summary:
+                logger.info(f"[{client_id}] Сессия изменилась во время свертки истории, свертка отложена")
+                return
+            session["history"] = compacted + current[len(history):]
+            session["summary"] = new_summary
+            await self._cache.put_topic(client_id=client_id, study_topic=study_topic, value=session)
+        except Exception as e:
+            logger.error(f"[{client_id}] Ошибка фоновой свертки истории: {e}")
+
+    async def aclose(self) -> None:
+        """Отмена незавершенных сверток, история будет свернута после следующего хода"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,21 +1,78 @@
+import asyncio
+import logging
 from datetime import timedelta
 from typing import Any
 
-import orjson
+import numpy as np
 from pydantic import BaseModel
 from pyignite import AioClient
 from pyignite.aio_cache import AioCache
+from pyignite.exceptions import ReconnectError, connection_errors
 from pyignite.datatypes import ExpiryPolicy
 from pyignite.datatypes.prop_codes import PROP_EXPIRY_POLICY, PROP_NAME
+from pyignite.monitoring import (
+    ConnectionClosedEvent, ConnectionEventListener, ConnectionLostEvent, HandshakeFailedEvent,
+    HandshakeSuccessEvent, QueryEventListener, QueryFailEvent, QuerySuccessEvent,
+)
 
+from dialog_api.metrics import (
+    HISTORY_NEAR_CACHE_REQUESTS, IGNITE_NODE_UP, IGNITE_QUERY_DURATION, IGNITE_QUERY_ERRORS,
+)
+from dialog_api.schemas import StudyTopic
+from dialog_api.services.codec import JsonCodec, SessionCodec, create_codec
+from dialog_api.services.near_cache import NearCache
+from dialog_api.services.write_behind import WriteBehindBuffer
 from dialog_api.settings import Ignite
 
+logger = logging.getLogger(__name__)
+
+Codec = JsonCodec | SessionCodec
+
+
+class IgniteMetricsListener(QueryEventListener, ConnectionEventListener):
+    """Метрики задержек, ошибок и состояния соединений по узлам Ignite"""
+
+    @staticmethod
+    def _node(event) -> str:
+        return f"{event.host}:{event.port}"
+
+    def on_query_success(self, event: QuerySuccessEvent) -> None:
+        IGNITE_QUERY_DURATION.labels(node=self._node(event), op=event.op_name).observe(event.duration / 1000)
+
+    def on_query_fail(self, event: QueryFailEvent) -> None:
+        IGNITE_QUERY_ERRORS.labels(node=self._node(event), op=event.op_name).inc()
+
+    def on_handshake_success(self, event: HandshakeSuccessEvent) -> None:
+        IGNITE_NODE_UP.labels(node=self._node(event)).set(1)
+
+    def on_handshake_fail(self, event: HandshakeFailedEvent) -> None:
+        IGNITE_NODE_UP.labels(node=self._node(event)).set(0)
+        IGNITE_QUERY_ERRORS.labels(node=self._node(event), op="handshake").inc()
+
+    def on_connection_closed(self, event: ConnectionClosedEvent) -> None:
+        IGNITE_NODE_UP.labels(node=self._node(event)).set(0)
+
+    def on_connection_lost(self, event: ConnectionLostEvent) -> None:
+        IGNITE_NODE_UP.labels(node=self._node(event)).set(0)
+        logger.warning(f"Потеряно соединение с узлом Ignite {self._node(event)}: {event.error_msg}")
+
 
 class AioIgniteClient:
     def __init__(self, settings: Ignite) -> None:
-        self.client = AioClient(username=settings.username, password=settings.password)
-        self.max_time_duration = settings.max_time_duration
         self.settings = settings
+        self.max_time_duration = settings.max_time_duration
+        self.client = self._create_client()
+
+    def _create_client(self) -> AioClient:
+        # С partition_aware клиент держит соединение с каждым узлом и отправляет
+        # операцию по ключу сразу на основной узел его партиции
+        return AioClient(
+            username=self.settings.username or None,
+            password=self.settings.password or None,
+            partition_aware=self.settings.partition_aware,
+            handshake_timeout=self.settings.handshake_timeout,
+            event_listeners=[IgniteMetricsListener()],
+        )
 
     def create_settings(self, fields: dict | None = None) -> dict:
         if not fields:
@@ -29,10 +86,63 @@ class AioIgniteClient:
             **fields,
         }
 
+    @staticmethod
+    def parse_addresses(addresses: str) -> list[tuple[str, int]]:
+        nodes = [address.strip().rsplit(":", 1) for address in addresses.split(",") if address.strip()]
+        return [(host, int(port)) for host, port in nodes]
+
     async def connect(self, addresses: str) -> None:
-        addresses: list[list[str, str]] = [address.split(':') for address in addresses.split(',')]
-        addresses: list[tuple[str, int]] = [(address[0], int(address[1])) for address in addresses]
-        await self.client._connect(addresses)
+        """
+        Метод подключения ко всем узлам кластера с повторными попытками
+        :param addresses: адреса узлов через запятую в виде host:port
+        """
+        nodes = self.parse_addresses(addresses)
+        delay = self.settings.retry_backoff
+        for attempt in range(1, self.settings.connect_retries + 1):
+            try:
+                await self.client.connect(nodes)
+                logger.info(f"Подключение к Ignite: {len(nodes)} узлов, partition_aware={self.client.partition_aware}")
+                return
+            except (ReconnectError, *connection_errors) as e:
+                if attempt == self.settings.connect_retries:
+                    raise
+                logger.warning(f"Ignite недоступен (попытка {attempt}), повтор через {delay:.1f} с: {e}")
+                await self.client.close()
+                self.client = self._create_client()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.settings.retry_backoff_max)
+
+    def _dead_nodes(self) -> list:
+        """
+        Отключившиеся узлы кластера. Публичного API для этого нет, поэтому читается приватный
+        список узлов AioClient._nodes: поле проверено для закрепленной версии pyignite 0.6.1,
+        при обновлении pyignite проверку нужно повторить
+        """
+        return [node for node in getattr(self.client, "_nodes", None) or [] if not node.alive]
+
+    async def run_health_check(self) -> None:
+        """Фоновая проверка кластера и переподключение к отвалившимся узлам с экспоненциальной паузой"""
+        failures = 0
+        while True:
+            if failures:
+                await asyncio.sleep(min(self.settings.retry_backoff * 2 ** failures, self.settings.retry_backoff_max))
+            else:
+                await asyncio.sleep(self.settings.health_check_interval)
+            # Без переподключения узел возвращается в работу только при следующем обновлении карты партиций
+            dead_nodes = self._dead_nodes()
+            if dead_nodes:
+                await asyncio.gather(*(node.reconnect() for node in dead_nodes), return_exceptions=True)
+            try:
+                await asyncio.wait_for(
+                    self.client.get_cluster().get_state(), timeout=self.settings.handshake_timeout,
+                )
+            except Exception as e:
+                failures += 1
+                logger.error(f"Проверка кластера Ignite не прошла ({failures} раз подряд): {e}")
+                continue
+            if dead_nodes:
+                logger.info(f"Переподключение к узлам Ignite: {[(node.host, node.port) for node in dead_nodes]}")
+            failures = 0
 
     async def shutdown(self) -> None:
         await self.client.close()
@@ -43,32 +153,179 @@ class AioIgniteClient:
 
 
 class BaseCache:
-    def __init__(self, cache: AioCache) -> None:
+    def __init__(self, cache: AioCache, codec: Codec | None = None) -> None:
         self.cache = cache
+        self.codec = codec or JsonCodec()
 
     async def get(self, client_id: str, default: Any) -> str | None:
         data = await self.cache.get(client_id)
-        return orjson.loads(data) if data else default
+        return self.codec.decode(data) if data else default
 
     async def put(self, client_id: str, value: Any) -> None:
-        await self.cache.put(key=client_id, value=orjson.dumps(value))
+        await self.cache.put(key=client_id, value=self.codec.encode(value))
+
+
+class HistoryCache(BaseCache):
+    """
+    История диалогов хранится отдельной записью на пару (клиент, тема), чтобы запрос
+    в одной теме не читал и не перезаписывал историю остальных тем.
+    Старые записи со всей сессией клиента под ключом client_id переносятся при первом чтении.
+    С write_behind запись в Ignite выполняется в фоне пачками.
+    С near_cache сессии хранятся и в памяти процесса, а из Ignite при чтении берется только версия записи
+    """
 
+    def __init__(
+            self, cache: AioCache, codec: Codec | None = None,
+            write_behind: WriteBehindBuffer | None = None, near_cache: NearCache | None = None,
+    ) -> None:
+        super().__init__(cache=cache, codec=codec)
+        self.write_behind = write_behind
+        self.near_cache = near_cache
 
-class HistoryCache(BaseCache): ...
+    @staticmethod
+    def topic_key(client_id: str, study_topic: str) -> str:
+        return f"{client_id}:{study_topic}"
+
+    async def get_topic(self, client_id: str, study_topic: str, default: Any) -> dict[str, Any]:
+        key = self.topic_key(client_id, study_topic)
+        data = self.write_behind.get(key) if self.write_behind else None
+        if data is None:
+            data = await self._read(key)
+        if data:
+            return self.codec.decode(data)
+        legacy_session = await self._migrate(client_id)
+        return legacy_session.get(study_topic, default)
+
+    async def put_topic(self, client_id: str, study_topic: str, value: dict[str, Any]) -> None:
+        key, data = self.topic_key(client_id, study_topic), self.codec.encode(value)
+        entries = {key: data}
+        if self.near_cache:
+            version = self.near_cache.new_version()
+            self.near_cache.put(key, version=version, data=data)
+            entries[NearCache.version_key(key)] = version
+
+        if self.write_behind:
+            for entry_key, entry_value in entries.items():
+                self.write_behind.put(entry_key, entry_value)
+        elif len(entries) == 1:
+            await self.cache.put(key=key, value=data)
+        else:
+            await self.cache.put_all(entries)
+
+    async def _read(self, key: str) -> bytes | None:
+        """
+        Метод чтения сессии через локальный кэш: при совпадении версии полная запись из Ignite не читается
+        :param key: ключ сессии
+        :return: закодированная сессия
+        """
+        if self.near_cache is None:
+            return await self.cache.get(key)
+
+        version_key = NearCache.version_key(key)
+        entry = self.near_cache.get(key)
+        if entry is None:
+            HISTORY_NEAR_CACHE_REQUESTS.labels(result="miss").inc()
+            found = await self.cache.get_all([key, version_key])
+            data, version = found.get(key), found.get(version_key)
+        else:
+            version = await self.cache.get(version_key)
+            if version is not None and bytes(version) == entry.version:
+                HISTORY_NEAR_CACHE_REQUESTS.labels(result="hit").inc()
+                return entry.data
+            HISTORY_NEAR_CACHE_REQUESTS.labels(result="stale").inc()
+            data = await self.cache.get(key)
+
+        # Записи без версии (старый формат) не кэшируем, их нельзя проверить на актуальность
+        if data and version is not None:
+            self.near_cache.put(key, version=bytes(version), data=bytes(data))
+        return data
+
+    async def get_session(self, client_id: str) -> dict[str, Any]:
+        """
+        Метод чтения истории клиента по всем темам одним запросом
+        :param client_id: идентификатор клиента
+        :return: история по темам
+        """
+        keys = {self.topic_key(client_id, topic.value): topic.value for topic in StudyTopic}
+        data = await self.cache.get_all(list(keys))
+        if self.write_behind:
+            data.update({key: value for key in keys if (value := self.write_behind.get(key)) is not None})
+        session = await self._migrate(client_id)
+        session.update({keys[key]: self.codec.decode(value) for key, value in data.items() if value})
+        return session
+
+    async def _migrate(self, client_id: str) -> dict[str, Any]:
+        data = await self.cache.get(client_id)
+        if not data:
+            return {}
+        legacy_session: dict[str, Any] = self.codec.decode(data)
+        existing = await self.cache.get_all([self.topic_key(client_id, topic) for topic in legacy_session])
+        # Записи в новом формате новее старой сессии, их не перезаписываем
+        migrated = {
+            self.topic_key(client_id, topic): self.codec.encode(value)
+            for topic, value in legacy_session.items()
+            if self.topic_key(client_id, topic) not in existing
+        }
+        if migrated:
+            await self.cache.put_all(migrated)
+        await self.cache.remove_key(client_id)
+        logger.info(f"[{client_id}] Сессия перенесена в формат с отдельными записями по темам")
+        return legacy_session
+
+    async def aclose(self) -> None:
+        if self.write_behind:
+            await self.write_behind.aclose()
+
+
+class EmbeddingsCache(BaseCache):
+    async def get(self, key: str, default: Any) -> list[float] | None:
+        data = await self.cache.get(key)
+        return np.frombuffer(data, dtype=np.float32).tolist() if data else default
+
+    async def put(self, key: str, value: list[float]) -> None:
+        await self.cache.put(key=key, value=np.asarray(value, dtype=np.float32).tobytes())
 
 
 class CachesContext(BaseModel):
     client: AioIgniteClient | None = None
     history: HistoryCache | None = None
+    embeddings: EmbeddingsCache | None = None
 
-    async def configure(self, settings: Ignite) -> None:
+    async def configure(self, settings: Ignite, embeddings: bool = False) -> None:
+        """
+        Подключение к Ignite и создание кэшей
+        :param settings: настройки Ignite
+        :param embeddings: создать кэш эмбеддингов запросов (VECTOR_DB_EMBEDDING_CACHE_IGNITE)
+        """
         self.client = AioIgniteClient(settings)
         await self.client.connect(addresses=settings.addresses)
         self.history = HistoryCache(
             cache=await self.client.get_cache(
                 client_settings=self.client.create_settings(), name="HISTORY"
-            )
+            ),
+            codec=create_codec(
+                compression=settings.codec,
+                level=settings.compression_level,
+                dictionary_path=settings.dictionary_path,
+            ),
         )
+        if settings.near_cache_size:
+            self.history.near_cache = NearCache(maxsize=settings.near_cache_size)
+        if settings.write_behind:
+            self.history.write_behind = WriteBehindBuffer(
+                cache=self.history.cache,
+                max_batch=settings.write_behind_max_batch,
+                flush_interval=settings.write_behind_interval,
+                max_pending=settings.write_behind_max_pending,
+                max_backoff=settings.write_behind_max_backoff,
+            )
+            self.history.write_behind.start()
+        if embeddings:
+            self.embeddings = EmbeddingsCache(
+                cache=await self.client.get_cache(
+                    client_settings=self.client.create_settings(), name="EMBEDDINGS"
+                )
+            )
         return self.client, self.history
 
     class Config:
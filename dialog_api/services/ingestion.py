@@ -0,0 +1,70 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from time import perf_counter
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestionReport:
+    sections: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def sections_per_second(self) -> float:
+        return self.sections / self.seconds if self.seconds else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes / 1024 / 1024 / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.sections} секций, {self.bytes / 1024 / 1024:.2f} MB за {self.seconds:.2f} с "
+            f"({self.sections_per_second:.1f} секций/с, {self.megabytes_per_second:.3f} MB/с)"
+        )
+
+
+def batched(iterable: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class IngestionPipeline:
+    def __init__(self, vector_db, batch_size: int) -> None:
+        """
+        Потоковая загрузка секций в векторную БД: эмбеддинг пачки N+1 считается,
+        пока пачка N записывается в БД
+
+        :param vector_db: векторная БД
+        :param batch_size: размер пачки для эмбеддинга и записи
+        """
+        self.vector_db = vector_db
+        self.batch_size = batch_size
+
+    def run(self, documents: Iterable[dict[str, Any]]) -> IngestionReport:
+        report = IngestionReport()
+        started = perf_counter()
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingestion-upload") as uploader:
+            pending: Future | None = None
+            for batch in batched(documents, self.batch_size):
+                texts = [doc["content"] for doc in batch]
+                embeddings = self.vector_db.embedding_function(texts)
+                if pending is not None:
+                    pending.result()
+                pending = uploader.submit(self.vector_db.upsert_embedded, batch, embeddings)
+
+                report.sections += len(batch)
+                report.bytes += sum(len(text.encode("utf-8")) for text in texts)
+            if pending is not None:
+                pending.result()
+
+        report.seconds = perf_counter() - started
+        logger.info(f"Загрузка корпуса: {report}")
+        return report
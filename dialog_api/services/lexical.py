@@ -0,0 +1,163 @@
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator
+
+import ormsgpack
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOP_WORDS = frozenset(
+    "а в во и или к ко как ли на не но о об от по при про с со то что это такое такой такая такие чем для из "
+    "за у же бы был была было быть есть мне меня мой ты вы он она оно они мы я где когда какой какая какие "
+    "зачем почему нужен нужна нужно можно расскажи объясни покажи подробнее пожалуйста привет "
+    "the a an is are of to in and or what how why".split()
+)
+# Окончания русских словоформ, от длинных к коротким
+RU_ENDINGS = tuple(sorted(
+    "иями ями ами иях иям ией ого его ому ему ыми ими ии ий ия ию ов ев ей ой ый ая яя ое ее ие ые ам ям ах ях "
+    "ом ем ью ья ых их ую юю а я о е и ы у ю ь й".split(),
+    key=len, reverse=True,
+))
+
+
+def stem(token: str) -> str:
+    """
+    Легкий стеммер: отбрасывание окончания, чтобы словоформы одного слова совпадали
+    :param token: слово в нижнем регистре
+    :return: основа слова
+    """
+    if token.isascii():
+        for ending in ("es", "s", "e"):
+            if token.endswith(ending) and not token.endswith("ss") and len(token) - len(ending) >= 3:
+                return token[:-len(ending)]
+        return token
+    for ending in RU_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= 3:
+            return token[:-len(ending)]
+    return token
+
+
+def analyze(text: str) -> list[str]:
+    """Разбиение текста на основы слов без стоп-слов"""
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+@dataclass
+class _Partition:
+    postings: dict[str, dict[str, int]] = field(default_factory=lambda: defaultdict(dict))
+    lengths: dict[str, int] = field(default_factory=dict)
+    total_length: int = 0
+
+
+class LexicalIndex:
+    def __init__(self, partition_key: str = "topic", k1: float = 1.2, b: float = 0.75) -> None:
+        """
+        Инвертированный индекс BM25 по секциям корпуса, отдельный по каждой теме.
+        Строится целиком при синхронизации корпуса и после этого не изменяется,
+        поэтому поиск не требует блокировок
+
+        :param partition_key: поле метаданных, по которому разбит индекс
+        :param k1: насыщение частоты термина
+        :param b: нормировка по длине секции
+        """
+        self.partition_key = partition_key
+        self.k1 = k1
+        self.b = b
+        self._documents: dict[str, tuple[str, dict[str, Any]]] = {}
+        self._partitions: dict[str, _Partition] = defaultdict(_Partition)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, document: dict[str, Any]) -> None:
+        doc_id, metadata = document["id"], document["metadata"]
+        self._documents[doc_id] = (document["content"], metadata)
+        partition = self._partitions[str(metadata.get(self.partition_key))]
+        terms = Counter(analyze(document["content"]))
+        for term, frequency in terms.items():
+            partition.postings[term][doc_id] = frequency
+        partition.lengths[doc_id] = sum(terms.values())
+        partition.total_length += partition.lengths[doc_id]
+
+    def collect(self, documents: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """Добавление секций в индекс по ходу потоковой загрузки корпуса"""
+        for document in documents:
+            self.add(document)
+            yield document
+
+    def search(self, query: str, partition: str, n_results: int) -> list[dict[str, Any]]:
+        """
+        Метод поиска BM25 внутри темы
+        :param query: запрос пользователя
+        :param partition: значение поля разбиения, например тема
+        :param n_results: количество секций
+        :return: секции по убыванию "bm25" с числом совпавших терминов запроса "matched"
+        """
+        index = self._partitions.get(partition)
+        terms = set(analyze(query))
+        if index is None or not index.lengths or not terms:
+            return []
+
+        count, average_length = len(index.lengths), index.total_length / len(index.lengths)
+        scores: dict[str, float] = defaultdict(float)
+        matched: Counter[str] = Counter()
+        for term in terms:
+            postings = index.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * index.lengths[doc_id] / average_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                matched[doc_id] += 1
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:n_results]
+        return [
+            {
+                "id": doc_id,
+                "content": self._documents[doc_id][0],
+                "metadata": self._documents[doc_id][1],
+                "bm25": scores[doc_id],
+                "matched": matched[doc_id],
+            }
+            for doc_id in ranked
+        ]
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as file:
+            file.write(ormsgpack.packb({
+                "partition_key": self.partition_key,
+                "documents": [[doc_id, content, metadata] for doc_id, (content, metadata) in self._documents.items()],
+            }))
+        logger.info(f"Лексический индекс сохранен в {path}: {len(self)} секций")
+
+    @classmethod
+    def load(cls, path: str, k1: float = 1.2, b: float = 0.75) -> "LexicalIndex":
+        with open(path, "rb") as file:
+            data = ormsgpack.unpackb(file.read())
+        index = cls(partition_key=data["partition_key"], k1=k1, b=b)
+        for doc_id, content, metadata in data["documents"]:
+            index.add({"id": doc_id, "content": content, "metadata": metadata})
+        logger.info(f"Лексический индекс загружен из {path}: {len(index)} секций")
+        return index
+
+
+def reciprocal_rank_fusion(rankings: list[list[dict[str, Any]]], k: int = 60) -> list[dict[str, Any]]:
+    """
+    Слияние выдач по обратному рангу: секция получает сумму 1 / (k + ранг) по всем выдачам
+    :param rankings: выдачи, каждая упорядочена от лучшей секции
+    :param k: сглаживание вклада первых мест
+    :return: объединенная выдача; для секции, найденной несколькими способами, берется ее первое вхождение
+    """
+    scores: dict[str, float] = defaultdict(float)
+    documents: dict[str, dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, 1):
+            key = document.get("id") or document["content"]
+            scores[key] += 1 / (k + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
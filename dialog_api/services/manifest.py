@@ -0,0 +1,43 @@
+import logging
+from typing import Any, Iterable, Iterator
+
+from dialog_api.services.document_loader import source_of
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusManifest:
+    def __init__(self, stored: dict[str, str | None]) -> None:
+        """
+        Манифест корпуса: хэши содержимого секций, уже сохраненных в векторной БД
+
+        :param stored: отображение id секции -> content_hash из метаданных коллекции
+        """
+        self.stored = stored
+        self.seen: set[str] = set()
+        self.unchanged = 0
+
+    def changed(self, documents: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """
+        Пропускает только новые и изменившиеся секции, неизмененные остаются в БД вместе с эмбеддингами
+        :param documents: секции корпуса
+        :return: секции, которые нужно векторизовать и записать
+        """
+        for document in documents:
+            self.seen.add(document["id"])
+            if self.stored.get(document["id"]) == document["metadata"].get("content_hash"):
+                self.unchanged += 1
+                continue
+            yield document
+
+    def removed(self, failed_sources: Iterable[str] = ()) -> list[str]:
+        """
+        Секции, которых больше нет в корпусе. Корректно только после полного прохода changed()
+        :param failed_sources: файлы, которые не удалось разобрать, их секции остаются в БД
+        :return: id секций для удаления
+        """
+        failed_sources = set(failed_sources)
+        return [
+            doc_id for doc_id in self.stored
+            if doc_id not in self.seen and source_of(doc_id) not in failed_sources
+        ]
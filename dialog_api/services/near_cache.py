@@ -0,0 +1,34 @@
+import os
+from typing import NamedTuple
+
+from cachetools import LRUCache
+
+
+class NearEntry(NamedTuple):
+    version: bytes
+    data: bytes
+
+
+class NearCache:
+    def __init__(self, maxsize: int) -> None:
+        """
+        Локальная копия недавно прочитанных и записанных сессий.
+        Запись считается актуальной, пока ее версия совпадает с версией в Ignite
+
+        :param maxsize: максимальное количество сессий в памяти процесса
+        """
+        self._entries: LRUCache[str, NearEntry] = LRUCache(maxsize=maxsize)
+
+    @staticmethod
+    def new_version() -> bytes:
+        return os.urandom(8)
+
+    @staticmethod
+    def version_key(key: str) -> str:
+        return f"{key}:version"
+
+    def get(self, key: str) -> NearEntry | None:
+        return self._entries.get(key)
+
+    def put(self, key: str, version: bytes, data: bytes) -> None:
+        self._entries[key] = NearEntry(version=version, data=data)
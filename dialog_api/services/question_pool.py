@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from collections import defaultdict, deque
+from itertools import product
+from time import perf_counter
+from typing import Any
+
+import xxhash
+from cachetools import TTLCache
+
+from dialog_api.metrics import QUESTION_POOL_DEPTH, QUESTION_POOL_REFILL, QUESTION_POOL_REQUESTS
+from dialog_api.schemas import StudyTopic, UserLevel
+from dialog_api.utils.single_flight import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionPool:
+    def __init__(
+            self, quiz_agent, watermark: int, refill_interval: float,
+            refill_concurrency: int, seen_ttl: int, seen_maxsize: int = 100_000, max_backoff: float = 300.0,
+    ) -> None:
+        """
+        Пул заранее сгенерированных вопросов квиза для каждой пары (тема, уровень)
+
+        :param quiz_agent: агент квиза для генерации вопросов
+        :param watermark: сколько вопросов держать в пуле для каждой пары
+        :param refill_interval: пауза между проверками пула, секунды
+        :param refill_concurrency: максимум одновременных генераций
+        :param seen_ttl: сколько помнить выданные клиенту вопросы, секунды
+        :param seen_maxsize: максимум клиентов, для которых помним выданные вопросы
+        :param max_backoff: максимальная пауза, до которой растет интервал при неудачных пополнениях
+        """
+        self._quiz_agent = quiz_agent
+        self.watermark = watermark
+        self.refill_interval = refill_interval
+        self.max_backoff = max_backoff
+        self._semaphore = asyncio.Semaphore(refill_concurrency)
+        self._pools: dict[tuple[str, str], deque[dict[str, Any]]] = defaultdict(deque)
+        self._seen: TTLCache[tuple[str, str], set[str]] = TTLCache(maxsize=seen_maxsize, ttl=seen_ttl)
+
+    @staticmethod
+    def _question_key(question: dict[str, Any]) -> str:
+        return xxhash.xxh3_64_hexdigest(normalize_text(str(question.get("question", ""))))
+
+    def pop(self, client_id: str, study_topic: str, user_level: str) -> dict[str, Any] | None:
+        """
+        Метод выдачи вопроса из пула, клиент не получает один и тот же вопрос дважды
+        :param client_id: идентификатор клиента
+        :param study_topic: тема обучения
+        :param user_level: уровень пользователя
+        :return: вопрос или None, если подходящих вопросов в пуле нет
+        """
+        pool = self._pools[(study_topic, user_level)]
+        seen = self._seen.get((client_id, study_topic), set())
+        for _ in range(len(pool)):
+            question = pool.popleft()
+            if self._question_key(question) in seen:
+                pool.append(question)
+                continue
+            self.remember(client_id=client_id, study_topic=study_topic, question=question)
+            QUESTION_POOL_DEPTH.labels(topic=study_topic, level=user_level).set(len(pool))
+            QUESTION_POOL_REQUESTS.labels(result="hit").inc()
+            return question
+
+        QUESTION_POOL_REQUESTS.labels(result="miss").inc()
+        return None
+
+    def remember(self, client_id: str, study_topic: str, question: dict[str, Any]) -> None:
+        seen = self._seen.get((client_id, study_topic), set())
+        seen.add(self._question_key(question))
+        self._seen[(client_id, study_topic)] = seen
+
+    def backoff(self, failures: int) -> float:
+        """Пауза до следующей проверки пула: удваивается после каждого полностью неудачного пополнения"""
+        return min(self.refill_interval * 2 ** failures, self.max_backoff)
+
+    async def run(self) -> None:
+        """Фоновое пополнение пула до заданного уровня"""
+        failures = 0
+        while True:
+            refills = [
+                self._refill(study_topic=topic.value, user_level=level.value)
+                for topic, level in product(StudyTopic, UserLevel)
+                for _ in range(self.watermark - len(self._pools[(topic.value, level.value)]))
+            ]
+            if refills:
+                failures = 0 if any(await asyncio.gather(*refills)) else failures + 1
+                if failures:
+                    logger.warning(f"Пул вопросов не пополнен, следующая попытка через {self.backoff(failures):.0f} с")
+            await asyncio.sleep(self.backoff(failures))
+
+    async def _refill(self, study_topic: str, user_level: str) -> bool:
+        async with self._semaphore:
+            started = perf_counter()
+            try:
+                question = await self._quiz_agent.agenerate_question(study_topic=study_topic, user_level=user_level)
+            except Exception as e:
+                logger.error(f"Ошибка пополнения пула вопросов {study_topic}/{user_level}: {e}")
+                return False
+            QUESTION_POOL_REFILL.observe(perf_counter() - started)
+
+        if not isinstance(question, dict) or not question.get("question"):
+            logger.warning(f"Некорректный вопрос для пула {study_topic}/{user_level}: {question}")
+            return False
+        pool = self._pools[(study_topic, user_level)]
+        pool.append(question)
+        QUESTION_POOL_DEPTH.labels(topic=study_topic, level=user_level).set(len(pool))
+        return True
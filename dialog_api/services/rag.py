@@ -1,52 +1,252 @@
+import asyncio
 import logging
+import os
+from time import perf_counter
+from typing import Any
 
+from dialog_api.metrics import RAG_RETRIEVAL_DURATION
+from dialog_api.services.context_builder import ContextBuilder
 from dialog_api.services.document_loader import DocumentLoader
+from dialog_api.services.ingestion import IngestionPipeline
+from dialog_api.services.lexical import LexicalIndex, analyze, reciprocal_rank_fusion
+from dialog_api.services.manifest import CorpusManifest
+from dialog_api.settings import RetrievalSettings
 
 logger = logging.getLogger(__name__)
 
 
 class RAGService:
-    def __init__(self, vector_db, documents_number: int, document_loader: DocumentLoader):
+    def __init__(
+            self, vector_db, documents_number: int, document_loader: DocumentLoader, embedding_batch_size: int = 64,
+            level_mismatch_penalty: float = 0.0, retrieval_settings: RetrievalSettings | None = None,
+            context_builder: ContextBuilder | None = None,
+    ):
         self.vector_db = vector_db
         self.document_loader = document_loader
         self.n_results = documents_number
+        self.level_mismatch_penalty = level_mismatch_penalty
+        self.retrieval_settings = retrieval_settings or RetrievalSettings()
+        self.ingestion = IngestionPipeline(vector_db=vector_db, batch_size=embedding_batch_size)
+        self.lexical_index: LexicalIndex | None = None
+        self.context_builder = context_builder
+
+    def load_lexical_index(self) -> None:
+        """Загрузка лексического индекса, построенного при последней синхронизации корпуса"""
+        path = self.retrieval_settings.lexical_index_path
+        if not path or not os.path.exists(path):
+            logger.warning("Лексический индекс не найден, он будет построен при синхронизации корпуса")
+            return
+        try:
+            self.lexical_index = LexicalIndex.load(path)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки лексического индекса {path}: {e}")
 
     def initialize_with_documents(self):
         try:
-            documents = self.document_loader.load_documents()
-            if documents:
-                self.vector_db.add_documents(documents)
-            else:
+            manifest = CorpusManifest(stored=self.vector_db.get_manifest())
+            # Лексический индекс строится заново по всем секциям, включая не изменившиеся
+            lexical_index = LexicalIndex()
+            report = self.ingestion.run(manifest.changed(lexical_index.collect(self.document_loader.iter_documents())))
+            if not self.document_loader.corpus_found:
+                logger.warning("Корпус документов не найден, синхронизация пропущена")
+                return
+            if not manifest.seen:
                 logger.warning("Нет документов для загрузки")
 
+            if removed := manifest.removed(self.document_loader.failed_sources):
+                self.vector_db.delete_documents(removed)
+            self.vector_db.persist()
+            self.lexical_index = lexical_index
+            if self.retrieval_settings.lexical_index_path:
+                lexical_index.save(self.retrieval_settings.lexical_index_path)
+            logger.info(
+                f"Синхронизация корпуса: обновлено {report.sections}, удалено {len(removed)}, "
+                f"без изменений {manifest.unchanged}"
+            )
+
         except Exception as e:
             logger.error(f"Ошибка инициализации RAG service: {e}")
 
-    def get_relevant_context(self, query: str, topic: str) -> str:
+    def _level_filters(self, topic: str, user_level: str | None) -> list[dict[str, Any]]:
+        """
+        Фильтры поиска: вся тема или, если задан уровень, отдельно секции своего и других уровней
+        """
+        if not user_level or not self.level_mismatch_penalty:
+            return [{"topic": topic}]
+        return [
+            {"$and": [{"topic": topic}, {"level": user_level}]},
+            {"$and": [{"topic": topic}, {"level": {"$ne": user_level}}]},
+        ]
+
+    def _prefer_level(self, n_results: int, matching: list[dict], other: list[dict] | None = None) -> list[dict]:
+        """
+        Метод слияния выдачи с предпочтением уровня пользователя: к расстоянию секций
+        другого уровня добавляется level_mismatch_penalty
+        :param n_results: количество секций
+        :param matching: секции уровня пользователя
+        :param other: секции других уровней
+        :return: n_results ближайших секций с учетом надбавки
+        """
+        if other is None:
+            return matching
+        ranked = [(doc["score"], doc) for doc in matching]
+        ranked += [(doc["score"] + self.level_mismatch_penalty, doc) for doc in other]
+        ranked.sort(key=lambda item: item[0])
+        return [doc for _, doc in ranked[:n_results]]
+
+    def _prefer_level_lexical(self, hits: list[dict[str, Any]], user_level: str | None) -> list[dict[str, Any]]:
+        """
+        Предпочтение уровня пользователя в лексической выдаче: BM25 секций другого уровня
+        уменьшается на долю lexical_level_discount. level_mismatch_penalty - надбавка к расстоянию
+        и к оценке BM25 не применима
+        :param hits: лексическая выдача
+        :param user_level: уровень пользователя
+        :return: выдача, упорядоченная с учетом уровня
+        """
+        if not user_level or not self.retrieval_settings.lexical_level_discount:
+            return hits
+        discount = 1 - self.retrieval_settings.lexical_level_discount
+        return sorted(hits, key=lambda doc: -doc["bm25"] * (
+            1.0 if doc["metadata"].get("level") == user_level else discount
+        ))
+
+    def _lexical_search(self, query: str, topic: str) -> list[dict[str, Any]]:
+        if self.lexical_index is None:
+            return []
+        return self.lexical_index.search(query, partition=topic, n_results=self.retrieval_settings.fusion_candidates)
+
+    def _is_decisive(self, query: str, hits: list[dict[str, Any]]) -> bool:
+        """
+        Лексическое совпадение решающее, если запрос из нескольких ключевых слов, лучшая секция
+        содержит их все и заметно опережает первую секцию, не попавшую в выдачу
+        """
+        settings = self.retrieval_settings
+        if not settings.lexical_fast_path or not hits:
+            return False
+        terms = set(analyze(query))
+        if len(terms) > settings.fast_path_max_terms or hits[0]["matched"] < len(terms):
+            return False
+        if len(hits) <= self.n_results:
+            return True
+        return hits[0]["bm25"] >= settings.fast_path_margin * hits[self.n_results]["bm25"]
+
+    def _vector_limit(self, lexical: list[dict[str, Any]], n_results: int) -> int:
+        return max(self.retrieval_settings.fusion_candidates, n_results) if lexical else n_results
+
+    def _fuse(
+            self, vector: list[dict[str, Any]], lexical: list[dict[str, Any]], n_results: int,
+    ) -> tuple[str, list[dict[str, Any]]]:
+        if not lexical:
+            return "vector", vector[:n_results]
+        fused = reciprocal_rank_fusion([vector, lexical], k=self.retrieval_settings.rrf_k)
+        return "hybrid", fused[:n_results]
+
+    def _pool_size(self) -> int:
+        """Сборщику контекста нужен запас кандидатов, чтобы было из чего выбирать вместо дублей"""
+        return self.n_results * 2 if self.context_builder is not None else self.n_results
+
+    def retrieve(
+            self, query: str, topic: str, user_level: str | None = None, n_results: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Метод поиска секций: решающее лексическое совпадение возвращается без эмбеддинга,
+        иначе выдачи BM25 и векторного поиска сливаются по обратному рангу
+        :param query: запрос пользователя
+        :param topic: тема обучения
+        :param user_level: уровень пользователя, секции этого уровня в приоритете
+        :param n_results: количество секций, по умолчанию documents_number
+        :return: секции
+        """
+        n_results = n_results or self.n_results
+        started = perf_counter()
+        lexical = self._lexical_search(query, topic)
+        if self._is_decisive(query, lexical):
+            path, documents = "lexical", self._prefer_level_lexical(lexical, user_level)[:n_results]
+        else:
+            limit = self._vector_limit(lexical, n_results)
+            path, documents = self._fuse(self._prefer_level(limit, *(
+                self.vector_db.search(query=query, where_filter=where_filter, n_results=limit)
+                for where_filter in self._level_filters(topic, user_level)
+            )), lexical, n_results)
+        RAG_RETRIEVAL_DURATION.labels(path=path).observe(perf_counter() - started)
+        return documents
+
+    async def aretrieve(
+            self, query: str, topic: str, user_level: str | None = None, n_results: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Асинхронный поиск секций, см. retrieve. Поиски по уровням идут одновременно,
+        эмбеддинг запроса считается один раз благодаря кэшу и объединению запросов в пачки
+        :param query: запрос пользователя
+        :param topic: тема обучения
+        :param user_level: уровень пользователя, секции этого уровня в приоритете
+        :param n_results: количество секций, по умолчанию documents_number
+        :return: секции
+        """
+        n_results = n_results or self.n_results
+        started = perf_counter()
+        lexical = self._lexical_search(query, topic)
+        if self._is_decisive(query, lexical):
+            path, documents = "lexical", self._prefer_level_lexical(lexical, user_level)[:n_results]
+        else:
+            limit = self._vector_limit(lexical, n_results)
+            path, documents = self._fuse(self._prefer_level(limit, *await asyncio.gather(*(
+                self.vector_db.asearch(query=query, where_filter=where_filter, n_results=limit)
+                for where_filter in self._level_filters(topic, user_level)
+            ))), lexical, n_results)
+        RAG_RETRIEVAL_DURATION.labels(path=path).observe(perf_counter() - started)
+        return documents
+
+    def get_relevant_context(self, query: str, topic: str, user_level: str | None = None) -> str:
         """
         Метод получения релевантного контекста из документов
         :param query: запрос пользователя
         :param topic: тема обучения
+        :param user_level: уровень пользователя, секции этого уровня в приоритете
         :return: контекст
         """
         try:
-            documents = self.vector_db.search(
-                query=query,
-                where_filter={"topic": topic},
-                n_results=self.n_results,
+            documents = self.retrieve(query=query, topic=topic, user_level=user_level, n_results=self._pool_size())
+            return self._build_context(documents, query=query, topic=topic)
+
+        except Exception as e:
+            logger.error(f"Error getting relevant context: {e}")
+            return ""
+
+    async def aget_relevant_context(self, query: str, topic: str, user_level: str | None = None) -> str:
+        """
+        Асинхронный метод получения релевантного контекста, не блокирующий event loop
+        :param query: запрос пользователя
+        :param topic: тема обучения
+        :param user_level: уровень пользователя, секции этого уровня в приоритете
+        :return: контекст
+        """
+        try:
+            documents = await self.aretrieve(
+                query=query, topic=topic, user_level=user_level, n_results=self._pool_size(),
             )
+            return self._build_context(documents, query=query, topic=topic)
+
+        except Exception as e:
+            logger.error(f"Error getting relevant context: {e}")
+            return ""
 
+    def _build_context(self, documents: list[dict], query: str, topic: str) -> str:
+        if self.context_builder is not None and documents:
+            documents = self.context_builder.build(documents)
             if not documents:
-                logger.warning(f"Не найдено документов для темы: {topic}, запроса: {query}")
                 return ""
+        return self._format_context(documents, query=query, topic=topic)
 
-            context_parts = []
-            for i, doc in enumerate(documents, 1):
-                doc_level = doc.get("metadata", {}).get("level", "unknown")
-                context_parts.append(f"{i}. [{doc_level}] {doc['content']}")
+    @staticmethod
+    def _format_context(documents: list[dict], query: str, topic: str) -> str:
+        if not documents:
+            logger.warning(f"Не найдено документов для темы: {topic}, запроса: {query}")
+            return ""
 
-            return "\n".join(context_parts)
+        context_parts = []
+        for i, doc in enumerate(documents, 1):
+            doc_level = doc.get("metadata", {}).get("level", "unknown")
+            context_parts.append(f"{i}. [{doc_level}] {doc['content']}")
 
-        except Exception as e:
-            logger.error(f"Error getting relevant context: {e}")
-            return ""
+        return "\n".join(context_parts)
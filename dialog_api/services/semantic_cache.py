@@ -0,0 +1,94 @@
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from dialog_api.metrics import SEMANTIC_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    embedding: np.ndarray
+    answer: str
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    def __init__(
+            self, embed: Callable[[str], Awaitable[list[float]]], threshold: float, maxsize: int, ttl: int,
+    ) -> None:
+        """
+        Кэш ответов на близкие по смыслу вопросы в рамках темы и уровня пользователя
+
+        :param embed: функция получения эмбеддинга запроса
+        :param threshold: минимальное косинусное сходство для выдачи сохраненного ответа
+        :param maxsize: максимальное количество ответов в кэше
+        :param ttl: время жизни ответа, секунды
+        """
+        self._embed = embed
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str, str], _Entry] = OrderedDict()
+
+    async def aget(self, study_topic: str, user_level: str, query: str) -> str | None:
+        """
+        Метод поиска сохраненного ответа на близкий вопрос
+        :param study_topic: тема обучения
+        :param user_level: уровень пользователя
+        :param query: вопрос пользователя
+        :return: ответ или None
+        """
+        try:
+            embedding = await self._embedding(query)
+        except Exception as e:
+            logger.error(f"Ошибка получения эмбеддинга для кэша ответов: {e}")
+            return None
+
+        self._expire()
+        keys = [key for key in self._entries if key[:2] == (study_topic, user_level)]
+        if keys:
+            similarities = np.stack([self._entries[key].embedding for key in keys]) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                SEMANTIC_CACHE_REQUESTS.labels(result="hit").inc()
+                self._entries.move_to_end(keys[best])
+                return self._entries[keys[best]].answer
+
+        SEMANTIC_CACHE_REQUESTS.labels(result="miss").inc()
+        return None
+
+    async def aput(self, study_topic: str, user_level: str, query: str, answer: str) -> None:
+        """
+        Метод сохранения ответа
+        :param study_topic: тема обучения
+        :param user_level: уровень пользователя
+        :param query: вопрос пользователя
+        :param answer: ответ гигачата
+        """
+        try:
+            embedding = await self._embedding(query)
+        except Exception as e:
+            logger.error(f"Ошибка получения эмбеддинга для кэша ответов: {e}")
+            return
+
+        key = (study_topic, user_level, " ".join(query.split()).casefold())
+        self._entries[key] = _Entry(embedding=embedding, answer=answer, expires_at=monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def _embedding(self, query: str) -> np.ndarray:
+        embedding = np.asarray(await self._embed(query), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _expire(self) -> None:
+        now = monotonic()
+        for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+            del self._entries[key]
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+from langchain_community.chat_models import GigaChat
+
+from dialog_api.clients.giga import set_access_token, warm_up
+from dialog_api.metrics import GIGA_TOKEN_REFRESHES
+from dialog_api.utils.token_verification import TokenVerification
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRefresher:
+    def __init__(
+            self, token_verification: TokenVerification, giga_client: GigaChat,
+            refresh_margin: float, retry_interval: float,
+    ) -> None:
+        """
+        Фоновое обновление токена GigaChat: новый токен выпускается заранее и подменяется
+        в общем клиенте агентов, поэтому запросы пользователей не ждут ни выпуска токена,
+        ни нового соединения
+
+        :param token_verification: выпуск токенов
+        :param giga_client: клиент GigaChat, общий для всех агентов
+        :param refresh_margin: за сколько секунд до истечения обновлять токен
+        :param retry_interval: пауза перед повтором после ошибки обновления
+        """
+        self._token_verification = token_verification
+        self._giga_client = giga_client
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+
+    async def refresh(self) -> None:
+        access_token = await self._token_verification.refresh_token()
+        set_access_token(self._giga_client, access_token)
+        GIGA_TOKEN_REFRESHES.labels(result="ok").inc()
+        logger.info("Токен GigaChat обновлен")
+
+    async def warm_up(self) -> None:
+        try:
+            await warm_up(self._giga_client)
+        except Exception as e:
+            logger.warning(f"Не удалось прогреть соединение с GigaChat: {e}")
+
+    def _delay(self) -> float:
+        return max(self._token_verification.expires_in() - self.refresh_margin, 0.0)
+
+    async def run(self) -> None:
+        """Обновление токена до его истечения; при ошибке повтор, пока действует старый токен"""
+        while True:
+            await asyncio.sleep(self._delay())
+            try:
+                await self.refresh()
+            except Exception as e:
+                GIGA_TOKEN_REFRESHES.labels(result="error").inc()
+                logger.error(f"Ошибка обновления токена GigaChat: {e}")
+                await asyncio.sleep(self.retry_interval)
+                continue
+            await self.warm_up()
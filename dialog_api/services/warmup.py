@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from time import perf_counter
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from dialog_api.metrics import WARMUP_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageStatus:
+    required: bool
+    state: str = "pending"
+    seconds: float | None = None
+    error: str | None = None
+
+
+class Warmup:
+    def __init__(self, required: list[str], optional: list[str] | None = None) -> None:
+        """
+        Состояние фонового прогрева приложения по стадиям
+
+        :param required: стадии, без которых приложение не принимает запросы
+        :param optional: стадии, которые выполняются после готовности приложения
+        """
+        self.stages = {name: StageStatus(required=True) for name in required}
+        self.stages.update({name: StageStatus(required=False) for name in optional or []})
+
+    @asynccontextmanager
+    async def stage(self, name: str) -> AsyncIterator[None]:
+        status = self.stages[name]
+        status.state = "running"
+        started = perf_counter()
+        try:
+            yield
+        except Exception as e:
+            status.state, status.error = "failed", str(e) or repr(e)
+            logger.exception(f"Стадия прогрева {name} завершилась с ошибкой: {e}")
+            raise
+        else:
+            status.state = "ready"
+            logger.info(f"Стадия прогрева {name} выполнена за {perf_counter() - started:.2f} с")
+        finally:
+            status.seconds = round(perf_counter() - started, 3)
+            WARMUP_STAGE_SECONDS.labels(stage=name).set(status.seconds)
+
+    async def retry(
+            self, name: str, fn: Callable[[], Awaitable[None]], retries: int, backoff: float, backoff_max: float,
+    ) -> None:
+        """
+        Стадия с повторными попытками: между попытками стадия в состоянии retrying,
+        failed выставляется только после последней
+        :param name: стадия
+        :param fn: тело стадии
+        :param retries: число повторов после первой попытки
+        :param backoff: начальная пауза, секунды
+        :param backoff_max: максимальная пауза, секунды
+        """
+        delay = backoff
+        for attempt in range(retries + 1):
+            try:
+                async with self.stage(name):
+                    await fn()
+                return
+            except Exception:
+                if attempt == retries:
+                    raise
+                self.stages[name].state = "retrying"
+                logger.warning(f"Повтор стадии прогрева {name} через {delay:.1f} с (попытка {attempt + 2})")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, backoff_max)
+
+    def require(self, name: str) -> None:
+        """Перевод стадии в обязательные: приложение не будет готово, пока она не выполнится"""
+        self.stages[name].required = True
+
+    @property
+    def ready(self) -> bool:
+        return all(status.state == "ready" for status in self.stages.values() if status.required)
+
+    @property
+    def failed(self) -> bool:
+        return any(status.state == "failed" for status in self.stages.values() if status.required)
+
+    def report(self) -> dict[str, Any]:
+        return {name: asdict(status) for name, status in self.stages.items()}
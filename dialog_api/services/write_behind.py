@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from contextlib import suppress
+from time import perf_counter
+
+from pyignite.aio_cache import AioCache
+
+from dialog_api.metrics import HISTORY_WRITE_BEHIND_DEPTH, HISTORY_WRITE_BEHIND_DROPPED, HISTORY_WRITE_BEHIND_FLUSH
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    def __init__(
+            self, cache: AioCache, max_batch: int, flush_interval: float,
+            max_pending: int = 10000, max_backoff: float = 5.0,
+    ) -> None:
+        """
+        Отложенная запись в Ignite: записи копятся в памяти процесса, для каждого ключа
+        остается только последнее значение, и пачка пишется одним put_all по размеру или по времени.
+        Пока Ignite недоступен, пауза между попытками удваивается, а очередь ограничена max_pending:
+        при переполнении вытесняются самые старые записи
+
+        :param cache: кэш Ignite
+        :param max_batch: количество ключей, при котором запись начинается без ожидания таймера
+        :param flush_interval: максимальное время ожидания записи, секунды
+        :param max_pending: максимум ключей в очереди
+        :param max_backoff: максимальная пауза между неудачными попытками записи, секунды
+        """
+        self._cache = cache
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self._failures = 0
+        self._pending: dict[str, bytes] = {}
+        self._inflight: dict[str, bytes] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def get(self, key: str) -> bytes | None:
+        """Значение, еще не записанное в Ignite, чтобы процесс читал свои же записи"""
+        value = self._pending.get(key)
+        return value if value is not None else self._inflight.get(key)
+
+    def put(self, key: str, value: bytes) -> None:
+        # Повторная запись ключа переносит его в конец очереди
+        self._pending.pop(key, None)
+        self._pending[key] = value
+        self._trim()
+        HISTORY_WRITE_BEHIND_DEPTH.set(len(self._pending))
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def _trim(self) -> None:
+        """Вытеснение самых старых записей сверх max_pending"""
+        overflow = len(self._pending) - self.max_pending
+        if overflow <= 0:
+            return
+        for key in list(self._pending)[:overflow]:
+            del self._pending[key]
+        HISTORY_WRITE_BEHIND_DROPPED.inc(overflow)
+        logger.error(f"Очередь записи в Ignite переполнена, вытеснено сессий: {overflow}")
+
+    def backoff(self) -> float:
+        """Пауза перед следующей попыткой записи после неудачных подряд"""
+        return min(self.flush_interval * 2 ** self._failures, self.max_backoff)
+
+    async def _run(self) -> None:
+        while True:
+            if self._failures:
+                # Во время недоступности Ignite заполнение очереди не ускоряет повторную попытку
+                await asyncio.sleep(self.backoff())
+            else:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._inflight = batch
+        flushed = False
+        started = perf_counter()
+        try:
+            await self._cache.put_all(batch)
+            flushed = True
+            self._failures = 0
+            HISTORY_WRITE_BEHIND_FLUSH.observe(perf_counter() - started)
+        except Exception as e:
+            self._failures += 1
+            logger.error(f"Ошибка записи {len(batch)} сессий в Ignite: {e}")
+        finally:
+            self._inflight = {}
+            if not flushed:
+                # Неудачная пачка старше записей, пришедших во время записи, и более новые значения не перетирает
+                self._pending = {
+                    **{key: value for key, value in batch.items() if key not in self._pending}, **self._pending,
+                }
+                self._trim()
+            HISTORY_WRITE_BEHIND_DEPTH.set(len(self._pending))
+
+    async def aclose(self) -> None:
+        """Остановка фоновой записи и запись всего, что осталось в очереди"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"Не записаны в Ignite при завершении: {len(self._pending)} сессий")
@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
 from dotenv import load_dotenv
 from pydantic import Field, AfterValidator
@@ -29,6 +29,14 @@ class GigaSettings(BaseSettings):
     access_key: Annotated[str, Field(alias="GIGA_ACCESS_KEY")] = ""
     verify_ssl_certs: Annotated[bool, Field(alias="GIGA_VERIFY_SSL_CERTS")] = False
     message_history_number: Annotated[int, Field(alias="GIGA_MESSAGE_HISTORY_NUMBER")] = 10
+    token_refresh_margin: Annotated[float, Field(alias="GIGA_TOKEN_REFRESH_MARGIN")] = 300.0
+    token_retry_interval: Annotated[float, Field(alias="GIGA_TOKEN_RETRY_INTERVAL")] = 10.0
+
+
+class HistorySettings(BaseSettings):
+    token_budget: Annotated[int, Field(alias="HISTORY_TOKEN_BUDGET")] = 1500
+    tokenizer: Annotated[str, Field(alias="HISTORY_TOKENIZER")] = "google-bert/bert-base-multilingual-cased"
+    keep_ratio: Annotated[float, Field(alias="HISTORY_KEEP_RATIO")] = 0.5
 
 
 class Ignite(BaseSettings):
@@ -37,6 +45,21 @@ class Ignite(BaseSettings):
     username: Annotated[str, Field(alias="IGNITE_USERNAME")] = ""
     password: Annotated[str, Field(alias="IGNITE_PASSWORD")] = ""
     max_time_duration: Annotated[int, Field(alias="IGNITE_MAX_TIME_DURATION")] = 1 * 60 * 60
+    partition_aware: Annotated[bool, Field(alias="IGNITE_PARTITION_AWARE")] = True
+    handshake_timeout: Annotated[float, Field(alias="IGNITE_HANDSHAKE_TIMEOUT")] = 10.0
+    connect_retries: Annotated[int, Field(alias="IGNITE_CONNECT_RETRIES")] = 5
+    retry_backoff: Annotated[float, Field(alias="IGNITE_RETRY_BACKOFF")] = 0.5
+    retry_backoff_max: Annotated[float, Field(alias="IGNITE_RETRY_BACKOFF_MAX")] = 30.0
+    health_check_interval: Annotated[float, Field(alias="IGNITE_HEALTH_CHECK_INTERVAL")] = 10.0
+    codec: Annotated[Literal["json", "none", "zstd"], Field(alias="IGNITE_CODEC")] = "zstd"
+    compression_level: Annotated[int, Field(alias="IGNITE_COMPRESSION_LEVEL")] = 3
+    dictionary_path: Annotated[str, Field(alias="IGNITE_DICTIONARY_PATH")] = ""
+    write_behind: Annotated[bool, Field(alias="IGNITE_WRITE_BEHIND")] = False
+    write_behind_max_batch: Annotated[int, Field(alias="IGNITE_WRITE_BEHIND_MAX_BATCH")] = 100
+    write_behind_interval: Annotated[float, Field(alias="IGNITE_WRITE_BEHIND_INTERVAL")] = 0.05
+    write_behind_max_pending: Annotated[int, Field(alias="IGNITE_WRITE_BEHIND_MAX_PENDING")] = 10000
+    write_behind_max_backoff: Annotated[float, Field(alias="IGNITE_WRITE_BEHIND_MAX_BACKOFF")] = 5.0
+    near_cache_size: Annotated[int, Field(alias="IGNITE_NEAR_CACHE_SIZE")] = 10000
 
 
 class VectorDBSettings(BaseSettings):
@@ -48,6 +71,37 @@ class VectorDBSettings(BaseSettings):
     documents_number: Annotated[int, Field(alias="VECTOR_DB_DOCUMENTS_NUMBER")] = 4
     documents_path: Annotated[str, Field(alias="VECTOR_DB_DOCUMENTS_PATH")] = ""
     auth_token: Annotated[str, Field(alias="VECTOR_DB_AUTH_TOKEN")] = ""
+    embedding_workers: Annotated[int, Field(alias="VECTOR_DB_EMBEDDING_WORKERS")] = 2
+    request_timeout: Annotated[float, Field(alias="VECTOR_DB_REQUEST_TIMEOUT")] = 5.0
+    connection_limit: Annotated[int, Field(alias="VECTOR_DB_CONNECTION_LIMIT")] = 20
+    embedding_cache_size: Annotated[int, Field(alias="VECTOR_DB_EMBEDDING_CACHE_SIZE")] = 10000
+    embedding_cache_ttl: Annotated[int, Field(alias="VECTOR_DB_EMBEDDING_CACHE_TTL")] = 24 * 60 * 60
+    embedding_cache_ignite: Annotated[bool, Field(alias="VECTOR_DB_EMBEDDING_CACHE_IGNITE")] = False
+    embedding_batch_size: Annotated[int, Field(alias="VECTOR_DB_EMBEDDING_BATCH_SIZE")] = 64
+    parse_workers: Annotated[int, Field(alias="VECTOR_DB_PARSE_WORKERS")] = 2
+    parse_inline_bytes: Annotated[int, Field(alias="VECTOR_DB_PARSE_INLINE_BYTES")] = 4 * 1024 * 1024
+    init_lock_path: Annotated[str, Field(alias="VECTOR_DB_INIT_LOCK_PATH")] = "/tmp/dialog_api_corpus.lock"
+    inference_threads: Annotated[int, Field(alias="VECTOR_DB_INFERENCE_THREADS")] = 1
+    embedding_backend: Annotated[Literal["torch", "onnx"], Field(alias="VECTOR_DB_EMBEDDING_BACKEND")] = "torch"
+    onnx_dir: Annotated[str, Field(alias="VECTOR_DB_ONNX_DIR")] = "onnx_models"
+    onnx_quantize: Annotated[bool, Field(alias="VECTOR_DB_ONNX_QUANTIZE")] = True
+    onnx_min_cosine: Annotated[float, Field(alias="VECTOR_DB_ONNX_MIN_COSINE")] = 0.98
+    onnx_min_overlap: Annotated[float, Field(alias="VECTOR_DB_ONNX_MIN_OVERLAP")] = 0.8
+    query_batch_size: Annotated[int, Field(alias="VECTOR_DB_QUERY_BATCH_SIZE")] = 32
+    query_batch_wait_ms: Annotated[float, Field(alias="VECTOR_DB_QUERY_BATCH_WAIT_MS")] = 5.0
+    backend: Annotated[Literal["chroma", "local"], Field(alias="VECTOR_DB_BACKEND")] = "chroma"
+    local_path: Annotated[str, Field(alias="VECTOR_DB_LOCAL_PATH")] = "vector_store"
+    local_dtype: Annotated[Literal["float32", "float16"], Field(alias="VECTOR_DB_LOCAL_DTYPE")] = "float32"
+    bruteforce_limit: Annotated[int, Field(alias="VECTOR_DB_BRUTEFORCE_LIMIT")] = 20000
+    hnsw_m: Annotated[int, Field(alias="VECTOR_DB_HNSW_M")] = 16
+    hnsw_ef_construction: Annotated[int, Field(alias="VECTOR_DB_HNSW_EF_CONSTRUCTION")] = 200
+    hnsw_ef_search: Annotated[int, Field(alias="VECTOR_DB_HNSW_EF_SEARCH")] = 64
+    sharding: Annotated[Literal["none", "topic", "topic_level"], Field(alias="VECTOR_DB_SHARDING")] = "none"
+    level_mismatch_penalty: Annotated[float, Field(alias="VECTOR_DB_LEVEL_MISMATCH_PENALTY")] = 0.1
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/v1"
 
     @property
     def chroma_client_settings(self) -> dict:
@@ -60,6 +114,64 @@ class VectorDBSettings(BaseSettings):
         }
 
 
+class RetrievalSettings(BaseSettings):
+    lexical_index_path: Annotated[str, Field(alias="RETRIEVAL_LEXICAL_INDEX_PATH")] = "lexical_index.msgpack"
+    lexical_fast_path: Annotated[bool, Field(alias="RETRIEVAL_LEXICAL_FAST_PATH")] = True
+    fast_path_max_terms: Annotated[int, Field(alias="RETRIEVAL_FAST_PATH_MAX_TERMS")] = 2
+    fast_path_margin: Annotated[float, Field(alias="RETRIEVAL_FAST_PATH_MARGIN")] = 1.5
+    fusion_candidates: Annotated[int, Field(alias="RETRIEVAL_FUSION_CANDIDATES")] = 10
+    rrf_k: Annotated[int, Field(alias="RETRIEVAL_RRF_K")] = 60
+    lexical_level_discount: Annotated[float, Field(alias="RETRIEVAL_LEXICAL_LEVEL_DISCOUNT", ge=0.0, lt=1.0)] = 0.1
+    context_builder: Annotated[bool, Field(alias="RETRIEVAL_CONTEXT_BUILDER")] = True
+    context_token_budget: Annotated[int, Field(alias="RETRIEVAL_CONTEXT_TOKEN_BUDGET")] = 800
+    mmr_lambda: Annotated[float, Field(alias="RETRIEVAL_MMR_LAMBDA")] = 0.7
+    duplicate_threshold: Annotated[float, Field(alias="RETRIEVAL_DUPLICATE_THRESHOLD")] = 0.8
+    distance_gap: Annotated[float, Field(alias="RETRIEVAL_DISTANCE_GAP")] = 0.25
+    chitchat_distance: Annotated[float, Field(alias="RETRIEVAL_CHITCHAT_DISTANCE")] = 1.5
+
+
+class SemanticCacheSettings(BaseSettings):
+    enabled: Annotated[bool, Field(alias="SEMANTIC_CACHE_ENABLED")] = False
+    threshold: Annotated[float, Field(alias="SEMANTIC_CACHE_THRESHOLD")] = 0.92
+    maxsize: Annotated[int, Field(alias="SEMANTIC_CACHE_SIZE")] = 1000
+    ttl: Annotated[int, Field(alias="SEMANTIC_CACHE_TTL")] = 60 * 60
+
+
+class QuizPoolSettings(BaseSettings):
+    enabled: Annotated[bool, Field(alias="QUIZ_POOL_ENABLED")] = False
+    watermark: Annotated[int, Field(alias="QUIZ_POOL_WATERMARK")] = 5
+    refill_interval: Annotated[float, Field(alias="QUIZ_POOL_REFILL_INTERVAL")] = 5.0
+    refill_concurrency: Annotated[int, Field(alias="QUIZ_POOL_REFILL_CONCURRENCY")] = 2
+    seen_ttl: Annotated[int, Field(alias="QUIZ_POOL_SEEN_TTL")] = 24 * 60 * 60
+    max_backoff: Annotated[float, Field(alias="QUIZ_POOL_MAX_BACKOFF")] = 300.0
+
+
+class LimiterSettings(BaseSettings):
+    enabled: Annotated[bool, Field(alias="LIMITER_ENABLED")] = True
+    initial_limit: Annotated[int, Field(alias="LIMITER_INITIAL_LIMIT")] = 10
+    min_limit: Annotated[int, Field(alias="LIMITER_MIN_LIMIT")] = 1
+    queue_size: Annotated[int, Field(alias="LIMITER_QUEUE_SIZE")] = 100
+    queue_deadline: Annotated[float, Field(alias="LIMITER_QUEUE_DEADLINE")] = 10.0
+    dialog_deadline: Annotated[float, Field(alias="LIMITER_DIALOG_DEADLINE")] = 3.0
+    quiz_deadline: Annotated[float, Field(alias="LIMITER_QUIZ_DEADLINE")] = 5.0
+    latency_tolerance: Annotated[float, Field(alias="LIMITER_LATENCY_TOLERANCE")] = 2.0
+    backoff: Annotated[float, Field(alias="LIMITER_BACKOFF")] = 0.7
+
+
+class HedgingSettings(BaseSettings):
+    enabled: Annotated[bool, Field(alias="HEDGING_ENABLED")] = False
+    quantile: Annotated[float, Field(alias="HEDGING_QUANTILE")] = 0.9
+    window: Annotated[int, Field(alias="HEDGING_WINDOW")] = 200
+    min_samples: Annotated[int, Field(alias="HEDGING_MIN_SAMPLES")] = 20
+    budget: Annotated[float, Field(alias="HEDGING_BUDGET")] = 0.05
+
+
+class WarmupSettings(BaseSettings):
+    retries: Annotated[int, Field(alias="WARMUP_RETRIES")] = 5
+    retry_backoff: Annotated[float, Field(alias="WARMUP_RETRY_BACKOFF")] = 1.0
+    retry_backoff_max: Annotated[float, Field(alias="WARMUP_RETRY_BACKOFF_MAX")] = 30.0
+
+
 class LoggingSettings(BaseSettings):
     level: Annotated[str, Field(alias="LOGGING_APP_LOGLEVEL"), AfterValidator(str.upper)] = "INFO"
 
@@ -72,9 +184,18 @@ class Settings(BaseSettings):
     app_name: Annotated[str, Field(alias="APP_NAME")] = "gigachat-agent"
     host: Annotated[str, Field(alias="APP_HOST")] = "0.0.0.0"
     port: Annotated[int, Field(alias="APP_PORT")] = 8082
+    workers: Annotated[int, Field(alias="APP_WORKERS")] = 1
+    metrics_dir: Annotated[str, Field(alias="PROMETHEUS_MULTIPROC_DIR")] = "/tmp/dialog_api_metrics"
     giga: GigaSettings = GigaSettings()
+    history: HistorySettings = HistorySettings()
     ignite: Ignite = Ignite()
     vector_db: VectorDBSettings = VectorDBSettings()
+    retrieval: RetrievalSettings = RetrievalSettings()
+    semantic_cache: SemanticCacheSettings = SemanticCacheSettings()
+    quiz_pool: QuizPoolSettings = QuizPoolSettings()
+    limiter: LimiterSettings = LimiterSettings()
+    hedging: HedgingSettings = HedgingSettings()
+    warmup: WarmupSettings = WarmupSettings()
     logger: LoggingSettings = LoggingSettings()
 
 
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from collections import deque
+from time import perf_counter
+from typing import Awaitable, Callable, TypeVar
+
+from dialog_api.metrics import GIGA_HEDGE_CALLS, GIGA_HEDGE_DELAY, GIGA_HEDGE_LATENCY, GIGA_HEDGES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _consume(task: asyncio.Task) -> None:
+    """Проигравший вызов отменяется без ожидания, его ошибка не должна попадать в лог asyncio"""
+    if not task.cancelled():
+        task.exception()
+
+
+class Hedger:
+    def __init__(
+            self, name: str, quantile: float = 0.9, window: int = 200, min_samples: int = 20,
+            budget: float = 0.05, max_tokens: float = 10.0,
+    ) -> None:
+        """
+        Дублирование медленных вызовов: если ответа нет дольше квантиля quantile
+        последних задержек, отправляется второй такой же вызов, побеждает первый ответ,
+        проигравший отменяется. Дублировать можно только идемпотентные вызовы
+
+        :param name: имя для метрик
+        :param quantile: квантиль недавних задержек, после которого отправляется дубль
+        :param window: сколько последних задержек учитывать
+        :param min_samples: до стольких замеров дубли не отправляются
+        :param budget: доля вызовов, которую разрешено дублировать
+        :param max_tokens: сколько неизрасходованных дублей можно накопить
+        """
+        self.name = name
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.budget = budget
+        self.max_tokens = max_tokens
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._tokens = 0.0
+
+    def delay(self) -> float | None:
+        """Задержка перед дублем или None, пока замеров мало"""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(int(len(ordered) * self.quantile), len(ordered) - 1)]
+
+    def _take_token(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def _timed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        # Отмененный проигравший в окно не попадает: его время обрезано отменой и занизило бы квантиль
+        started = perf_counter()
+        result = await fn()
+        self._latencies.append(perf_counter() - started)
+        return result
+
+    async def run(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Метод вызова с дублированием
+        :param fn: фабрика вызова, каждый вызов fn() - отдельный запрос
+        :return: результат первого успешного вызова
+        """
+        GIGA_HEDGE_CALLS.labels(agent=self.name).inc()
+        self._tokens = min(self._tokens + self.budget, self.max_tokens)
+        delay = self.delay()
+        if delay is None:
+            return await self._timed(fn)
+        GIGA_HEDGE_DELAY.labels(agent=self.name).set(delay)
+
+        started = perf_counter()
+        tasks = {asyncio.ensure_future(self._timed(fn)): "primary"}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._take_token():
+                tasks[asyncio.ensure_future(self._timed(fn))] = "hedge"
+                logger.debug(f"Дубль вызова {self.name} после {delay:.2f} с без ответа")
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            GIGA_HEDGES.labels(agent=self.name, winner=tasks[task]).inc()
+                            GIGA_HEDGE_LATENCY.labels(agent=self.name, winner=tasks[task]).observe(
+                                perf_counter() - started,
+                            )
+                        return task.result()
+            # Все вызовы завершились ошибкой: наружу уходит ошибка основного
+            return next(iter(tasks)).result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    task.add_done_callback(_consume)
+
+
+async def hedged(hedger: Hedger | None, fn: Callable[[], Awaitable[T]]) -> T:
+    """Вызов с дублированием или обычный вызов, если дублирование для него не включено"""
+    return await hedger.run(fn) if hedger is not None else await fn()
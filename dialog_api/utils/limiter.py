@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+from contextlib import asynccontextmanager, nullcontext
+from enum import IntEnum
+from time import monotonic
+from typing import AsyncContextManager, AsyncIterator
+
+import httpx
+from gigachat.exceptions import ResponseError
+
+from dialog_api.metrics import GIGA_LIMITER_IN_FLIGHT, GIGA_LIMITER_LIMIT, GIGA_LIMITER_QUEUE, GIGA_LIMITER_SHED
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_STATUSES = frozenset({429, 503})
+
+
+class CallPriority(IntEnum):
+    """Приоритет вызова гигачата: меньше - раньше из очереди"""
+    dialog = 0
+    quiz = 1
+    summary = 2
+    background = 3
+
+
+class LimiterOverloaded(Exception):
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(f"Гигачат перегружен: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def is_overload(error: BaseException) -> bool:
+    """Признак перегрузки гигачата: таймаут или ответ 429/503"""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return True
+    return isinstance(error, ResponseError) and len(error.args) > 1 and error.args[1] in OVERLOAD_STATUSES
+
+
+class AdaptiveLimiter:
+    def __init__(
+            self, initial_limit: int, min_limit: int, max_limit: int, queue_size: int, queue_deadline: float,
+            latency_tolerance: float = 2.0, backoff: float = 0.7,
+    ) -> None:
+        """
+        Адаптивное ограничение одновременных вызовов гигачата (AIMD): после успешного вызова
+        лимит растет на 1 / limit, при перегрузке - таймауте, 429/503 или росте задержки
+        выше latency_tolerance от долгосрочной средней - умножается на backoff.
+        Задержки сравниваются отдельно для каждого приоритета и для потоковых вызовов, у которых
+        учитывается время до первой части ответа, а не время чтения всего потока клиентом.
+        Вызовы сверх лимита ждут в очереди по приоритету; если ожидание не укладывается
+        в дедлайн вызова (по умолчанию queue_deadline), вызов сразу отклоняется с LimiterOverloaded
+
+        :param initial_limit: начальный лимит
+        :param min_limit: минимальный лимит
+        :param max_limit: максимальный лимит
+        :param queue_size: максимум ожидающих вызовов, при переполнении вытесняется менее приоритетный
+        :param queue_deadline: сколько секунд вызов может ждать в очереди, если вызывающий не задал свой дедлайн
+        :param latency_tolerance: во сколько раз короткая средняя задержка может превышать долгую
+        :param backoff: множитель лимита при перегрузке
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_size = queue_size
+        self.queue_deadline = queue_deadline
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._queue: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._short_latency: dict[tuple[CallPriority, bool], float] = {}
+        self._long_latency: dict[tuple[CallPriority, bool], float] = {}
+        # Среднее время занятия слота, по нему оценивается ожидание в очереди
+        self._hold_time: float | None = None
+        GIGA_LIMITER_LIMIT.set(self.limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(not future.done() for _, _, future in self._queue)
+
+    def _expected_wait(self, ahead: int) -> float:
+        """Оценка ожидания в очереди: ahead вызовов впереди проходят по limit за среднюю задержку"""
+        return math.ceil((ahead + 1) / self.limit) * (self._hold_time or 0.0)
+
+    def _shed(self, priority: CallPriority, reason: str) -> LimiterOverloaded:
+        GIGA_LIMITER_SHED.labels(priority=priority.name, reason=reason).inc()
+        retry_after = max(math.ceil(self._expected_wait(self.queue_depth)), 1)
+        logger.warning(f"Вызов гигачата с приоритетом {priority.name} отклонен: {reason}")
+        return LimiterOverloaded(reason=reason, retry_after=retry_after)
+
+    def _evict(self, priority: CallPriority) -> bool:
+        """Вытеснение последнего ожидающего вызова с приоритетом ниже priority"""
+        waiting = [entry for entry in self._queue if not entry[2].done()]
+        if not waiting:
+            return False
+        victim = max(waiting)
+        if victim[0] <= priority:
+            return False
+        victim[2].set_exception(self._shed(CallPriority(victim[0]), "evicted"))
+        return True
+
+    def _update_metrics(self) -> None:
+        GIGA_LIMITER_LIMIT.set(self.limit)
+        GIGA_LIMITER_IN_FLIGHT.set(self._in_flight)
+        GIGA_LIMITER_QUEUE.set(self.queue_depth)
+
+    async def _acquire(self, priority: CallPriority, deadline: float | None = None) -> None:
+        if self._in_flight < self.limit and not self.queue_depth:
+            self._in_flight += 1
+            self._update_metrics()
+            return
+
+        deadline = self.queue_deadline if deadline is None else deadline
+        ahead = sum(entry[0] <= priority and not entry[2].done() for entry in self._queue)
+        if self._expected_wait(ahead) > deadline:
+            raise self._shed(priority, "deadline")
+        if self.queue_depth >= self.queue_size and not self._evict(priority):
+            raise self._shed(priority, "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), future))
+        self._update_metrics()
+        try:
+            await asyncio.wait_for(future, timeout=deadline)
+        except asyncio.TimeoutError:
+            raise self._shed(priority, "deadline") from None
+        except BaseException:
+            # Слот мог быть выдан одновременно с отменой ожидающего
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()
+            raise
+        finally:
+            self._update_metrics()
+
+    def _dispatch(self) -> None:
+        while self._queue and self._in_flight < self.limit:
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+        self._update_metrics()
+
+    def _feedback(self, latency: float | None, priority: CallPriority = CallPriority.dialog, stream: bool = False) -> None:
+        """
+        Изменение лимита по результату вызова
+        :param latency: задержка вызова, None - перегрузка
+        :param priority: приоритет вызова, задержки сравниваются внутри одного приоритета
+        :param stream: потоковый вызов, задержка - время до первой части ответа
+        """
+        if latency is None:
+            self._limit = max(self._limit * self.backoff, self.min_limit)
+            logger.info(f"Лимит вызовов гигачата снижен до {self.limit}")
+            return
+        key = (priority, stream)
+        short, long = self._short_latency.get(key, latency), self._long_latency.get(key, latency)
+        self._short_latency[key] = short = 0.5 * short + 0.5 * latency
+        self._long_latency[key] = long = 0.95 * long + 0.05 * latency
+        if short > self.latency_tolerance * long:
+            self._limit = max(self._limit * self.backoff, self.min_limit)
+        else:
+            self._limit = min(self._limit + 1 / self._limit, self.max_limit)
+
+    def _hold(self, seconds: float) -> None:
+        self._hold_time = seconds if self._hold_time is None else 0.95 * self._hold_time + 0.05 * seconds
+
+    @asynccontextmanager
+    async def slot(
+            self, priority: CallPriority, deadline: float | None = None, stream: bool = False,
+    ) -> AsyncIterator["SlotTimer"]:
+        """
+        Слот для вызова гигачата
+        :param priority: приоритет вызова
+        :param deadline: сколько секунд вызов может ждать в очереди, по умолчанию queue_deadline
+        :param stream: потоковый вызов: задержкой считается время до SlotTimer.first_chunk()
+        :return: контекст, на время которого вызов учитывается в лимите
+        """
+        await self._acquire(priority, deadline)
+        timer = SlotTimer()
+        latency: float | None = None
+        failed = False
+        try:
+            yield timer
+            latency = timer.first_chunk_latency if stream else monotonic() - timer.started
+        except Exception as e:
+            failed = is_overload(e)
+            raise
+        finally:
+            if latency is not None or failed:
+                self._feedback(latency, priority, stream)
+            self._hold(monotonic() - timer.started)
+            self._release()
+
+
+class SlotTimer:
+    def __init__(self) -> None:
+        """Замер вызова в слоте лимитера: для потоковых вызовов отмечается время до первой части ответа"""
+        self.started = monotonic()
+        self.first_chunk_latency: float | None = None
+
+    def first_chunk(self) -> None:
+        if self.first_chunk_latency is None:
+            self.first_chunk_latency = monotonic() - self.started
+
+
+def limited(
+        limiter: AdaptiveLimiter | None, priority: CallPriority, deadline: float | None = None, stream: bool = False,
+) -> AsyncContextManager[SlotTimer]:
+    """Слот лимитера или пустой контекст, если лимитер выключен"""
+    if limiter is None:
+        return nullcontext(SlotTimer())
+    return limiter.slot(priority, deadline=deadline, stream=stream)
@@ -28,3 +28,73 @@ def parse_json(text: str):
     except orjson.JSONDecodeError as exc:
         logger.error("Invalid GigaChat response: invalid JSON string")
         raise JSONParserError from exc
+
+
+class AnswerStreamParser:
+    """
+    Инкрементальное извлечение строкового поля из JSON-ответа, приходящего частями.
+    feed() возвращает только новый раскодированный текст поля
+    """
+    ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self, field: str = "answer") -> None:
+        self._key_pattern = re.compile(rf'"{re.escape(field)}"\s*:\s*"')
+        self._buffer = ""
+        self._position: int | None = None
+        self.done = False
+        self.text = ""
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        if self.done:
+            return ""
+        if self._position is None:
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                return ""
+            self._position = match.end()
+
+        decoded = []
+        buffer, position = self._buffer, self._position
+        while position < len(buffer):
+            char = buffer[position]
+            if char == '"':
+                self.done = True
+                position += 1
+                break
+            if char != "\\":
+                decoded.append(char)
+                position += 1
+                continue
+            # Escape-последовательность может оказаться разрезанной между частями ответа
+            if position + 1 >= len(buffer):
+                break
+            escape = buffer[position + 1]
+            if escape != "u":
+                decoded.append(self.ESCAPES.get(escape, escape))
+                position += 2
+                continue
+            code_point = self._read_unicode(buffer, position)
+            if code_point is None:
+                break
+            char, position = code_point
+            decoded.append(char)
+
+        self._position = position
+        new_text = "".join(decoded)
+        self.text += new_text
+        return new_text
+
+    @staticmethod
+    def _read_unicode(buffer: str, position: int) -> tuple[str, int] | None:
+        if position + 6 > len(buffer):
+            return None
+        code = int(buffer[position + 2:position + 6], 16)
+        if 0xD800 <= code <= 0xDBFF:
+            if position + 12 > len(buffer):
+                return None
+            if buffer[position + 6:position + 8] == "\\u":
+                low = int(buffer[position + 8:position + 12], 16)
+                if 0xDC00 <= low <= 0xDFFF:
+                    return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), position + 12
+        return chr(code), position + 6
@@ -0,0 +1,46 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+import orjson
+import xxhash
+
+from dialog_api.metrics import COALESCED_CALLS
+
+T = TypeVar("T")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def history_digest(history: list[Any]) -> str:
+    return xxhash.xxh3_64_hexdigest(orjson.dumps(history, default=str))
+
+
+class SingleFlight:
+    def __init__(self, name: str) -> None:
+        """
+        Объединение одинаковых одновременных вызовов: пока вызов с ключом выполняется,
+        остальные вызовы с тем же ключом ждут его результат, а не делают свой
+
+        :param name: имя для метрик
+        """
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            COALESCED_CALLS.labels(agent=self.name).inc()
+        # Отмена одного из ожидающих не должна отменять общий вызов для остальных
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
@@ -1,11 +1,13 @@
 import asyncio
+import logging
 from time import time as current_time
 
 from aiohttp import ClientSession, hdrs
 
-from dialog_api.clients.giga import logger
 from dialog_api.utils.uuid import generate_uuid
 
+logger = logging.getLogger(__name__)
+
 
 class TokenVerification:
     def __init__(
@@ -57,6 +59,11 @@ class TokenVerification:
             return True
         return current_time() >= self._token_expires_at
 
+    def expires_in(self) -> float:
+        """Секунды до истечения токена, 0 если токена нет"""
+        if not self._token_expires_at:
+            return 0.0
+        return max(self._token_expires_at - current_time(), 0.0)
 
     async def _ensure_valid_token(self) -> str:
         if self._is_token_expired():
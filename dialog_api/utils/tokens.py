@@ -0,0 +1,42 @@
+import logging
+import math
+import os
+from typing import Any
+
+from tokenizers import Tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCounter:
+    def __init__(self, tokenizer_name: str) -> None:
+        """
+        Подсчет токенов токенизатором HuggingFace.
+        Токенизатор GigaChat не опубликован, поэтому мультиязычный BERT по умолчанию дает только
+        приближение, бюджеты токенов стоит задавать с запасом.
+        Если токенизатор недоступен, используется приблизительная оценка по длине текста
+
+        :param tokenizer_name: имя токенизатора в HuggingFace Hub или путь до tokenizer.json
+        """
+        self.tokenizer_name = tokenizer_name
+        try:
+            if os.path.isfile(tokenizer_name):
+                self._tokenizer = Tokenizer.from_file(tokenizer_name)
+            else:
+                self._tokenizer = Tokenizer.from_pretrained(tokenizer_name)
+            self._tokenizer.no_truncation()
+            logger.info(f"Загружен токенизатор: {tokenizer_name}")
+        except Exception as e:
+            self._tokenizer = None
+            logger.warning(f"Токенизатор {tokenizer_name} недоступен, используется оценка по длине текста: {e}")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is None:
+            return math.ceil(len(text) / 3)
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count_message(self, message: Any) -> int:
+        content = message.get("content", "") if isinstance(message, dict) else message
+        return self.count(str(content))
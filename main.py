@@ -5,10 +5,16 @@ if __name__ == "__main__":
     from granian.constants import Interfaces
     from granian.server import Server
 
+    if app_settings.workers > 1:
+        from dialog_api.prefork import prefork, setup_multiprocess_metrics
+
+        setup_multiprocess_metrics(app_settings)
+        prefork(app_settings)
+
     Server(
         "dialog_api.server:app",
         interface=Interfaces.ASGI,
-        workers=1,
+        workers=app_settings.workers,
         address=app_settings.host,
         port=app_settings.port,
         log_dictconfig=app_settings.logger.dictconfig,
@@ -7,7 +7,6 @@ from langchain_core.prompts import ChatPromptTemplate
 
 from dialog_api.agents.dialog_agent import DialogAgent
 from dialog_api.services.rag import RAGService
-from dialog_api.utils.token_verification import TokenVerification
 
 
 @pytest.fixture(scope="session")
@@ -37,18 +36,11 @@ def mock_llm_chain():
     return mock
 
 
-@pytest.fixture
-def mock_token_verification():
-    mock = Mock(spec=TokenVerification)
-    mock._is_token_expired.return_value = False
-    mock._ensure_valid_token = AsyncMock(return_value="new-token-123")
-    return mock
-
-
 @pytest.fixture
 def mock_rag_service():
     mock = Mock(spec=RAGService)
     mock.get_relevant_context.return_value = "Test context from RAG"
+    mock.aget_relevant_context = AsyncMock(return_value="Test context from RAG")
     return mock
 
 
@@ -59,13 +51,12 @@ def mock_chat_prompt_template():
 
 
 @pytest.fixture
-def dialog_agent(mock_giga_client, mock_token_verification, mock_rag_service, mock_llm_chain):
+def dialog_agent(mock_giga_client, mock_rag_service, mock_llm_chain):
     with pytest.MonkeyPatch().context() as m:
         m.setattr('dialog_api.agents.dialog_agent.LLMChain', Mock(return_value=mock_llm_chain))
 
         agent = DialogAgent(
             giga_client=mock_giga_client,
-            token_verification=mock_token_verification,
             rag_service=mock_rag_service,
             message_history_number=5
         )
@@ -84,25 +75,28 @@ def sample_dialog_data():
     }
 
 
+class InMemoryAioCache:
+    """Замена pyignite AioCache с хранением в словаре"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def put(self, key, value):
+        self.data[key] = value
+
+    async def get_all(self, keys):
+        return {key: self.data[key] for key in keys if key in self.data}
+
+    async def put_all(self, pairs):
+        self.data.update(pairs)
+
+    async def remove_key(self, key):
+        self.data.pop(key, None)
+
+
 @pytest.fixture
-def mock_giga_settings():
-    mock_settings = Mock()
-    mock_settings.url = "https://api.gigachat.test"
-    mock_settings.model = "GigaChat-Pro"
-    mock_settings.profanity_check = True
-    mock_settings.temperature = 0.7
-    mock_settings.max_tokens = 1000
-    mock_settings.timeout = 30
-    mock_settings.verify_ssl_certs = True
-    return mock_settings
-
-
-@pytest.fixture(autouse=True)
-def mock_app_settings(monkeypatch, mock_giga_settings):
-    try:
-        from dialog_api.agents.dialog_agent import app_settings
-        mock_settings = Mock()
-        mock_settings.giga = mock_giga_settings
-        monkeypatch.setattr("dialog_api.agents.dialog_agent.app_settings", mock_settings)
-    except ImportError:
-        pass
+def aio_cache():
+    return InMemoryAioCache()
@@ -0,0 +1,74 @@
+import orjson
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from dialog_api.services.codec import CodecError, SessionCodec
+
+ANSWER = (
+    "Декоратор в Python — это функция, которая принимает другую функцию и возвращает новую, "
+    "расширяя ее поведение без изменения исходного кода. Декораторы применяются для логирования, "
+    "кэширования, проверки прав доступа и измерения времени выполнения. "
+)
+
+
+def make_session(turns: int, seed: int = 0) -> dict:
+    history = []
+    for turn in range(turns):
+        history.append(HumanMessage(content=f"Вопрос {seed}-{turn}: что такое декоратор?").model_dump(mode="json"))
+        history.append(AIMessage(content=ANSWER * (turn % 3 + 1)).model_dump(mode="json"))
+    return {"history": history, "user_level": "beginner", "summary": ""}
+
+
+class TestSessionCodec:
+
+    def test_roundtrip_keeps_message_type_and_content(self):
+        """Тест: после кодирования и декодирования сообщения сохраняют тип и текст"""
+        codec = SessionCodec()
+        session = make_session(turns=2)
+
+        decoded = codec.decode(codec.encode(session))
+
+        assert decoded["user_level"] == "beginner"
+        assert [(message["type"], message["content"]) for message in decoded["history"]] == [
+            (message["type"], message["content"]) for message in session["history"]
+        ]
+
+    def test_zero_fields_are_kept(self):
+        """Тест: нулевые числовые поля сообщения не считаются пустыми и сохраняются"""
+        message = {**AIMessage(content="Ответ").model_dump(mode="json"), "tokens": 0, "score": 0.0, "draft": False}
+
+        compacted = SessionCodec.compact_message(message)
+
+        assert compacted[2] == {"tokens": 0, "score": 0.0}
+        assert SessionCodec.expand_message(compacted)["tokens"] == 0
+
+    def test_legacy_orjson_entries_are_readable(self):
+        """Тест: записи в старом формате orjson читаются новым кодеком"""
+        session = make_session(turns=1)
+
+        assert SessionCodec().decode(orjson.dumps(session)) == session
+
+    def test_dictionary_entries_require_dictionary(self):
+        """Тест: записи со словарем читаются кодеком с тем же словарем"""
+        dictionary = SessionCodec.train_dictionary([make_session(turns=3, seed=seed) for seed in range(200)])
+        codec = SessionCodec(dictionary=dictionary)
+        session = make_session(turns=1, seed=1000)
+
+        data = codec.encode(session)
+
+        assert codec.decode(data)["history"][0]["content"] == session["history"][0]["content"]
+        with pytest.raises(CodecError):
+            SessionCodec().decode(data)
+
+    def test_compression_ratio(self):
+        """Бенчмарк: размер сессии относительно исходного orjson"""
+        session = make_session(turns=10)
+        legacy_size = len(orjson.dumps(session))
+
+        ratios = {
+            "msgpack": len(SessionCodec(compression="none").encode(session)) / legacy_size,
+            "zstd": len(SessionCodec(compression="zstd").encode(session)) / legacy_size,
+        }
+
+        assert ratios["msgpack"] < 0.8
+        assert ratios["zstd"] < 0.5
@@ -0,0 +1,54 @@
+from unittest.mock import Mock
+
+import pytest
+
+from dialog_api.services.context_builder import ContextBuilder
+
+
+def make_builder(**kwargs) -> ContextBuilder:
+    token_counter = Mock()
+    token_counter.count = Mock(side_effect=lambda text: len(text.split()))
+    return ContextBuilder(token_counter=token_counter, **{"budget_tokens": 100, "max_sections": 3, **kwargs})
+
+
+def section(content: str, score: float) -> dict:
+    return {"id": content, "content": content, "metadata": {"level": "beginner"}, "score": score}
+
+
+class TestContextBuilder:
+
+    def test_drops_near_duplicates(self):
+        """Тест: почти одинаковая секция заменяется следующей по выдаче"""
+        builder = make_builder()
+        documents = [
+            section("список изменяемая коллекция элементов", 0.1),
+            section("список изменяемая коллекция элементов python", 0.15),
+            section("кортеж нельзя изменить после создания", 0.2),
+        ]
+
+        contents = [doc["content"] for doc in builder.build(documents)]
+
+        assert contents == [documents[0]["content"], documents[2]["content"]]
+
+    def test_cuts_at_distance_gap(self):
+        """Тест: секции после большого разрыва в расстояниях отбрасываются"""
+        builder = make_builder(distance_gap=0.25)
+        documents = [section("замыкание", 0.1), section("функция", 0.2), section("файл", 0.8)]
+
+        assert [doc["content"] for doc in builder.build(documents)] == ["замыкание", "функция"]
+
+    def test_fits_token_budget(self):
+        """Тест: секции сверх бюджета пропускаются, первая обрезается по бюджету"""
+        builder = make_builder(budget_tokens=5)
+        long_section = section(" ".join(["слово"] * 10), 0.1)
+
+        built = builder.build([long_section, section("один два три", 0.15), section("четыре", 0.2)])
+
+        assert [len(doc["content"].split()) for doc in built] == [5]
+
+    @pytest.mark.parametrize("score, expected", [(2.0, 0), (0.5, 1)])
+    def test_skips_context_for_chitchat(self, score, expected):
+        """Тест: если лучшая секция дальше порога болтовни, контекст не добавляется"""
+        builder = make_builder(chitchat_distance=1.5)
+
+        assert len(builder.build([section("привет", score)])) == expected
@@ -21,58 +21,79 @@ class TestDialogAgent:
             answer, updated_history = await dialog_agent.ainvoke(**sample_dialog_data)
 
         assert answer == "Python это классный язык программирования"
-        assert len(updated_history) == 3  # original 2 + 1 new
-        mock_rag_service.get_relevant_context.assert_called_once_with(
+        assert len(updated_history) == 4  # original 2 + human + ai
+        assert updated_history[-2]["type"] == "human"
+        assert updated_history[-1]["content"] == "Python это классный язык программирования"
+        mock_rag_service.aget_relevant_context.assert_awaited_once_with(
             query=sample_dialog_data["current_message"],
-            topic=sample_dialog_data["study_topic"]
+            topic=sample_dialog_data["study_topic"],
+            user_level=sample_dialog_data["user_level"],
         )
         dialog_agent._mock_llm_chain.ainvoke.assert_called_once()
         mock_parse_json.assert_called_once_with("{\"answer\": \"Python это классный язык программирования\"}")
 
-    @pytest.mark.asyncio
-    async def test_ainvoke_with_token_refresh(self, dialog_agent, mock_token_verification, sample_dialog_data, mock_giga_settings):
-        mock_token_verification._is_token_expired.return_value = True
-
-        mock_output = Mock()
-        mock_output.__getitem__ = Mock(
-            side_effect=lambda key: "{\"answer\": \"Test answer\"}" if key == "text" else None)
-        mock_output.text = "{\"answer\": \"Test answer\"}"
-
-        dialog_agent._mock_llm_chain.ainvoke = AsyncMock(return_value=mock_output)
-
-        with patch('dialog_api.agents.dialog_agent.create_gigachat_client') as mock_create_client, \
-                patch('dialog_api.agents.dialog_agent.parse_json') as mock_parse_json:
-            mock_parse_json.return_value = {"answer": "Test answer"}
-            mock_new_client = Mock()
-            mock_create_client.return_value = mock_new_client
-
-            answer, updated_history = await dialog_agent.ainvoke(**sample_dialog_data)
-
-        mock_token_verification._ensure_valid_token.assert_called_once()
-        mock_create_client.assert_called_once_with(
-            access_token="new-token-123",
-            settings=mock_giga_settings
-        )
-        assert dialog_agent._mock_llm_chain.llm == mock_new_client
-        assert answer == "Test answer"
-
 
 class TestDialogAgentInitialization:
-    def test_dialog_agent_init(self, mock_giga_client, mock_token_verification, mock_rag_service, mock_llm_chain):
+    def test_dialog_agent_init(self, mock_giga_client, mock_rag_service, mock_llm_chain):
         with patch("dialog_api.agents.dialog_agent.LLMChain", return_value=mock_llm_chain):
             agent = DialogAgent(
                 giga_client=mock_giga_client,
-                token_verification=mock_token_verification,
                 rag_service=mock_rag_service,
                 message_history_number=10
             )
 
             assert agent._giga_client == mock_giga_client
-            assert agent._token_verification == mock_token_verification
             assert agent._rag_service == mock_rag_service
             assert agent.message_history_number == 10
 
     def test_dialog_agent_prompt_templates(self, dialog_agent):
         assert dialog_agent.system_message is not None
         assert dialog_agent.human_message is not None
-        assert dialog_agent.chat_template is not None
\ No newline at end of file
+        assert dialog_agent.chat_template is not None
+
+class TestDialogAgentStream:
+
+    @pytest.mark.asyncio
+    async def test_astream_yields_answer_and_updates_history(self, dialog_agent, mock_giga_client, sample_dialog_data):
+        raw = ['{"ans', 'wer": "Декоратор ', '- это функция"', ', "next_topic": "Классы"}']
+
+        async def astream(prompt):
+            for part in raw:
+                yield Mock(content=part)
+
+        mock_giga_client.astream = astream
+        history = list(sample_dialog_data["history"])
+        data = {**sample_dialog_data, "history": history}
+
+        chunks = [chunk async for chunk in dialog_agent.astream(**data)]
+
+        assert "".join(chunks) == "Декоратор - это функция"
+        assert len(history) == 4  # original 2 + human + ai
+        assert history[-1]["content"] == "Декоратор - это функция"
+        assert history[-1]["type"] == "ai"
+
+
+class TestDialogAgentAnswerCache:
+
+    @pytest.mark.asyncio
+    async def test_first_turn_answer_served_from_cache(
+            self, mock_giga_client, mock_rag_service, mock_llm_chain,
+    ):
+        answer_cache = Mock()
+        answer_cache.aget = AsyncMock(return_value="Ответ из кэша")
+        with patch("dialog_api.agents.dialog_agent.LLMChain", return_value=mock_llm_chain):
+            agent = DialogAgent(
+                giga_client=mock_giga_client,
+                rag_service=mock_rag_service,
+                message_history_number=5,
+                answer_cache=answer_cache,
+            )
+
+        answer, history = await agent.ainvoke(
+            history=[], study_topic="python", current_message="Что такое декоратор?", user_level="beginner",
+        )
+
+        assert answer == "Ответ из кэша"
+        assert [message["type"] for message in history] == ["human", "ai"]
+        mock_llm_chain.ainvoke.assert_not_called()
+        mock_rag_service.aget_relevant_context.assert_not_called()
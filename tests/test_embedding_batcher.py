@@ -0,0 +1,39 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dialog_api.services.embedding_batcher import EmbeddingBatcher
+
+
+class TestEmbeddingBatcher:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_are_encoded_in_one_batch(self):
+        """Тест: одновременные запросы векторизуются одним вызовом модели"""
+        calls = []
+
+        def embed(texts):
+            calls.append(texts)
+            return [[float(len(text))] for text in texts]
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = EmbeddingBatcher(embed=embed, executor=executor, max_batch_size=32, max_wait=0.01)
+            results = await asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "a", "ccc"]))
+
+        assert calls == [["a", "bb", "ccc"]]
+        assert results == [[1.0], [2.0], [1.0], [3.0]]
+
+    @pytest.mark.asyncio
+    async def test_full_batch_is_dispatched_without_waiting(self):
+        """Тест: заполненная пачка отправляется сразу, ошибка модели доходит до каждого запроса"""
+        def embed(texts):
+            raise RuntimeError("модель недоступна")
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = EmbeddingBatcher(embed=embed, executor=executor, max_batch_size=2, max_wait=60)
+            results = await asyncio.wait_for(
+                asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True), timeout=1,
+            )
+
+        assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,99 @@
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from dialog_api.services.embedding_cache import EmbeddingCache
+from dialog_api.services.ignite import CachesContext, EmbeddingsCache
+from dialog_api.settings import Ignite
+
+
+def metric(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestEmbeddingCache:
+
+    def test_key_ignores_case_and_whitespace_but_not_model(self):
+        """Тест: ключ не зависит от регистра и пробелов, но зависит от модели"""
+        cache = EmbeddingCache(model_name="model-a", maxsize=10, ttl=60)
+
+        assert cache.key("Что такое  декоратор") == cache.key("что такое декоратор")
+        assert cache.key("декоратор") != EmbeddingCache(model_name="model-b", maxsize=10, ttl=60).key("декоратор")
+
+    def test_hit_and_miss_counters(self):
+        """Тест: попадания и промахи локального кэша учитываются в метриках"""
+        cache = EmbeddingCache(model_name="model", maxsize=10, ttl=60)
+        hits, misses = metric("embedding_cache_hits_total", tier="local"), metric("embedding_cache_misses_total")
+
+        assert cache.get("key") is None
+        cache.put("key", [1.0, 2.0])
+
+        assert cache.get("key") == [1.0, 2.0]
+        assert metric("embedding_cache_hits_total", tier="local") == hits + 1
+        assert metric("embedding_cache_misses_total") == misses + 1
+
+    def test_lru_eviction_by_size(self):
+        """Тест: при переполнении вытесняется давно не использованная запись"""
+        cache = EmbeddingCache(model_name="model", maxsize=2, ttl=60)
+        evictions = metric("embedding_cache_evictions_total", reason="size")
+        cache.put("first", [1.0])
+        cache.put("second", [2.0])
+        cache.get("first")
+
+        cache.put("third", [3.0])
+
+        assert cache.get("second") is None
+        assert cache.get("first") == [1.0]
+        assert metric("embedding_cache_evictions_total", reason="size") == evictions + 1
+
+    def test_ttl_expiry(self):
+        """Тест: записи старше ttl удаляются из локального кэша"""
+        cache = EmbeddingCache(model_name="model", maxsize=10, ttl=60)
+        evictions = metric("embedding_cache_evictions_total", reason="ttl")
+        cache.put("key", [1.0])
+
+        cache._local.expire(time.monotonic() + 61)
+
+        assert cache.get("key") is None
+        assert metric("embedding_cache_evictions_total", reason="ttl") == evictions + 1
+
+
+class TestEmbeddingCacheIgniteTier:
+
+    @pytest.mark.asyncio
+    async def test_embedding_is_shared_through_ignite(self, aio_cache):
+        """Тест: эмбеддинг, записанный одним процессом, читается другим из Ignite и оседает в локальном кэше"""
+        remote = EmbeddingsCache(cache=aio_cache)
+        writer = EmbeddingCache(model_name="model", maxsize=10, ttl=60, remote=remote)
+        reader = EmbeddingCache(model_name="model", maxsize=10, ttl=60, remote=remote)
+        key = writer.key("декоратор")
+        hits = metric("embedding_cache_hits_total", tier="ignite")
+
+        await writer.aput(key, [0.5, 0.25])
+
+        assert await reader.aget(key) == [0.5, 0.25]
+        assert reader.get(key) == [0.5, 0.25]
+        assert metric("embedding_cache_hits_total", tier="ignite") == hits + 1
+
+    @pytest.mark.asyncio
+    async def test_ignite_error_is_a_miss(self, aio_cache):
+        """Тест: ошибка Ignite не прерывает поиск, а считается промахом"""
+        remote = EmbeddingsCache(cache=aio_cache)
+        remote.get = AsyncMock(side_effect=ConnectionError("Ignite недоступен"))
+        cache = EmbeddingCache(model_name="model", maxsize=10, ttl=60, remote=remote)
+
+        assert await cache.aget(cache.key("декоратор")) is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("embeddings, created", [(False, ["HISTORY"]), (True, ["HISTORY", "EMBEDDINGS"])])
+    async def test_embeddings_cache_created_only_when_enabled(self, aio_cache, embeddings, created):
+        """Тест: кэш EMBEDDINGS создается в Ignite только при VECTOR_DB_EMBEDDING_CACHE_IGNITE"""
+        client = Mock(connect=AsyncMock(), get_cache=AsyncMock(return_value=aio_cache))
+        with patch("dialog_api.services.ignite.AioIgniteClient", return_value=client):
+            context = CachesContext()
+            await context.configure(settings=Ignite(), embeddings=embeddings)
+
+        assert [call.kwargs["name"] for call in client.get_cache.await_args_list] == created
+        assert (context.embeddings is not None) is embeddings
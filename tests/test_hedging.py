@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from dialog_api.utils.hedging import Hedger
+
+
+def make_hedger(**kwargs) -> Hedger:
+    hedger = Hedger(name="test", **{"min_samples": 5, "budget": 1.0, **kwargs})
+    hedger._latencies.extend([0.01] * 5)
+    return hedger
+
+
+class TestHedger:
+
+    @pytest.mark.asyncio
+    async def test_slow_call_is_hedged_and_loser_cancelled(self):
+        """Тест: если ответа нет дольше квантиля, уходит дубль; первый ответ побеждает, второй вызов отменяется"""
+        hedger = make_hedger()
+        calls = []
+
+        async def call():
+            index = len(calls)
+            calls.append(asyncio.current_task())
+            await asyncio.sleep(1.0 if index == 0 else 0.0)
+            return index
+
+        assert await hedger.run(call) == 1
+        await asyncio.sleep(0)
+        assert calls[0].cancelled()
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_without_samples(self):
+        """Тест: пока замеров задержки мало, вызовы не дублируются"""
+        hedger = Hedger(name="test", min_samples=5, budget=1.0)
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        assert await hedger.run(call) == "ok"
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_budget_caps_hedges(self):
+        """Тест: дублей не больше доли бюджета от числа вызовов"""
+        hedger = make_hedger(budget=0.25)
+        hedger.delay = lambda: 0.01
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.03)
+            return "ok"
+
+        for _ in range(8):
+            await hedger.run(call)
+
+        assert len(calls) == 8 + 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_loser_is_not_sampled(self):
+        """Тест: в окно задержек попадает только завершившийся вызов, время отмененного проигравшего не учитывается"""
+        hedger = make_hedger()
+        hedger.delay = lambda: 0.02
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(1.0 if len(calls) == 1 else 0.0)
+            return "ok"
+
+        assert await hedger.run(call) == "ok"
+        await asyncio.sleep(0)
+
+        assert len(calls) == 2
+        assert len(hedger._latencies) == 5 + 1
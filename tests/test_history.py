@@ -0,0 +1,181 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from dialog_api.services.history import HistoryCompactor, HistoryManager
+
+
+def make_history(count: int) -> list[dict[str, str]]:
+    return [
+        {"type": "human" if index % 2 == 0 else "ai", "content": f"сообщение {index} " + "слово " * 10}
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def token_counter():
+    counter = Mock()
+    counter.count = Mock(side_effect=lambda text: len(text.split()))
+    counter.count_message = Mock(side_effect=lambda message: len(message["content"].split()))
+    return counter
+
+
+class TestHistoryManager:
+
+    def test_window_respects_token_budget(self, token_counter):
+        """Тест: в окно попадают последние сообщения в пределах бюджета токенов"""
+        manager = HistoryManager(token_counter=token_counter, budget_tokens=30, max_messages=10)
+        history = make_history(6)
+
+        window = manager.window(history)
+
+        assert window == history[-2:]
+
+    def test_window_always_keeps_last_message(self, token_counter):
+        """Тест: последнее сообщение попадает в окно даже сверх бюджета"""
+        manager = HistoryManager(token_counter=token_counter, budget_tokens=1, max_messages=10)
+        history = make_history(3)
+
+        assert manager.window(history) == history[-1:]
+
+    @pytest.mark.asyncio
+    async def test_acompact_folds_overflow_into_summary(self, token_counter):
+        """Тест: вышедшие за бюджет сообщения сворачиваются в конспект"""
+        summary_agent = Mock()
+        summary_agent.ainvoke = AsyncMock(return_value="Новый конспект")
+        manager = HistoryManager(
+            token_counter=token_counter, budget_tokens=48, max_messages=10, summary_agent=summary_agent,
+        )
+        history = make_history(6)
+
+        compacted, summary = await manager.acompact(history, summary="Старый конспект")
+
+        assert compacted == history[-2:]
+        assert summary == "Новый конспект"
+        summary_agent.ainvoke.assert_awaited_once()
+        assert summary_agent.ainvoke.await_args.kwargs["summary"] == "Старый конспект"
+        assert "сообщение 0" in summary_agent.ainvoke.await_args.kwargs["messages"]
+
+    @pytest.mark.asyncio
+    async def test_acompact_keeps_history_on_summary_error(self, token_counter):
+        """Тест: при ошибке свертки история не теряется"""
+        summary_agent = Mock()
+        summary_agent.ainvoke = AsyncMock(side_effect=Exception("GigaChat недоступен"))
+        manager = HistoryManager(
+            token_counter=token_counter, budget_tokens=24, max_messages=10, summary_agent=summary_agent,
+        )
+        history = make_history(6)
+
+        compacted, summary = await manager.acompact(history, summary="")
+
+        assert compacted == history
+        assert summary == ""
+
+    def test_render_prepends_summary(self, token_counter):
+        """Тест: конспект добавляется перед окном последних сообщений"""
+        manager = HistoryManager(token_counter=token_counter, budget_tokens=100, max_messages=10)
+
+        rendered = manager.render([{"type": "human", "content": "Привет"}], summary="Обсуждали списки")
+
+        assert rendered == "Конспект предыдущего диалога: Обсуждали списки\nПользователь: Привет"
+
+    def test_summary_counts_against_budget(self, token_counter):
+        """Тест: конспект расходует бюджет токенов окна истории"""
+        manager = HistoryManager(token_counter=token_counter, budget_tokens=30, max_messages=10)
+        history = make_history(6)
+
+        rendered = manager.render(history, summary="конспект " * 10)
+
+        assert "сообщение 5" in rendered
+        assert "сообщение 4" not in rendered
+        assert manager.needs_compaction(history[-2:], summary="конспект " * 10)
+
+
+class InMemorySessions:
+    def __init__(self) -> None:
+        self.sessions: dict[tuple[str, str], dict] = {}
+
+    async def get_topic(self, client_id: str, study_topic: str, default):
+        return dict(self.sessions.get((client_id, study_topic), default))
+
+    async def put_topic(self, client_id: str, study_topic: str, value) -> None:
+        self.sessions[(client_id, study_topic)] = dict(value)
+
+
+def make_compactor(token_counter, summary_agent) -> tuple[HistoryCompactor, InMemorySessions]:
+    manager = HistoryManager(
+        token_counter=token_counter, budget_tokens=48, max_messages=10, summary_agent=summary_agent,
+    )
+    sessions = InMemorySessions()
+    return HistoryCompactor(history_manager=manager, cache=sessions), sessions
+
+
+class TestHistoryCompactor:
+    @pytest.mark.asyncio
+    async def test_compaction_is_written_back(self, token_counter):
+        """Тест: свертка выполняется в фоне и записывает конспект в сессию"""
+        summary_agent = Mock()
+        summary_agent.ainvoke = AsyncMock(return_value="Новый конспект")
+        compactor, sessions = make_compactor(token_counter, summary_agent)
+        history = make_history(6)
+        await sessions.put_topic("client", "python", {"history": history, "summary": "", "user_level": "beginner"})
+
+        compactor.schedule(client_id="client", study_topic="python", history=history, summary="")
+        await asyncio.gather(*compactor._tasks.values())
+
+        session = sessions.sessions[("client", "python")]
+        assert session["history"] == history[-2:]
+        assert session["summary"] == "Новый конспект"
+        assert session["user_level"] == "beginner"
+
+    @pytest.mark.asyncio
+    async def test_messages_added_during_compaction_are_kept(self, token_counter):
+        """Тест: сообщения, добавленные во время свертки, остаются после записи конспекта"""
+        async def slow_summary(summary: str, messages: str) -> str:
+            session = sessions.sessions[("client", "python")]
+            session["history"] = session["history"] + make_history(8)[6:]
+            return "Новый конспект"
+
+        summary_agent = Mock()
+        summary_agent.ainvoke = AsyncMock(side_effect=slow_summary)
+        compactor, sessions = make_compactor(token_counter, summary_agent)
+        history = make_history(6)
+        await sessions.put_topic("client", "python", {"history": history, "summary": ""})
+
+        compactor.schedule(client_id="client", study_topic="python", history=history, summary="")
+        await asyncio.gather(*compactor._tasks.values())
+
+        session = sessions.sessions[("client", "python")]
+        assert session["history"] == history[-2:] + make_history(8)[6:]
+        assert session["summary"] == "Новый конспект"
+
+    @pytest.mark.asyncio
+    async def test_one_compaction_per_session(self, token_counter):
+        """Тест: пока свертка сессии идет, повторная не запускается"""
+        summary_agent = Mock()
+        summary_agent.ainvoke = AsyncMock(return_value="Новый конспект")
+        compactor, sessions = make_compactor(token_counter, summary_agent)
+        history = make_history(6)
+        await sessions.put_topic("client", "python", {"history": history, "summary": ""})
+
+        compactor.schedule(client_id="client", study_topic="python", history=history, summary="")
+        compactor.schedule(client_id="client", study_topic="python", history=history, summary="")
+        await asyncio.gather(*compactor._tasks.values())
+
+        summary_agent.ainvoke.assert_awaited_once()
+        assert compactor._tasks == {}
+
+    @pytest.mark.asyncio
+    async def test_short_history_is_not_compacted(self, token_counter):
+        """Тест: история в пределах бюджета не сворачивается и не перезаписывается"""
+        summary_agent = Mock()
+        summary_agent.ainvoke = AsyncMock(return_value="Новый конспект")
+        compactor, sessions = make_compactor(token_counter, summary_agent)
+        sessions.put_topic = AsyncMock()
+
+        compactor.schedule(client_id="client", study_topic="python", history=make_history(2), summary="")
+        await asyncio.gather(*compactor._tasks.values())
+
+        summary_agent.ainvoke.assert_not_awaited()
+        sessions.put_topic.assert_not_awaited()
@@ -0,0 +1,182 @@
+from unittest.mock import AsyncMock, Mock
+
+import orjson
+import pytest
+from prometheus_client import REGISTRY
+
+from pyignite.exceptions import ReconnectError
+
+from dialog_api.services.ignite import AioIgniteClient, HistoryCache
+from dialog_api.services.near_cache import NearCache
+from dialog_api.services.write_behind import WriteBehindBuffer
+from dialog_api.settings import Ignite
+
+
+class TestHistoryCache:
+
+    @pytest.mark.asyncio
+    async def test_topics_are_stored_separately(self, aio_cache):
+        """Тест: каждая тема хранится отдельной записью и читается вместе через get_session"""
+        cache = HistoryCache(cache=aio_cache)
+
+        await cache.put_topic(client_id="client", study_topic="python", value={"history": ["a"]})
+        await cache.put_topic(client_id="client", study_topic="javascript", value={"history": ["b"]})
+
+        assert set(aio_cache.data) == {"client:python", "client:javascript"}
+        assert await cache.get_topic(client_id="client", study_topic="python", default={}) == {"history": ["a"]}
+        assert await cache.get_session(client_id="client") == {
+            "python": {"history": ["a"]},
+            "javascript": {"history": ["b"]},
+        }
+
+    @pytest.mark.asyncio
+    async def test_legacy_session_is_migrated(self, aio_cache):
+        """Тест: старая сессия под ключом client_id переносится в записи по темам"""
+        aio_cache.data["client"] = orjson.dumps(
+            {"python": {"history": ["old"]}, "javascript": {"history": ["old js"]}}
+        )
+        cache = HistoryCache(cache=aio_cache)
+        await cache.put_topic(client_id="client", study_topic="javascript", value={"history": ["new js"]})
+
+        topic_session = await cache.get_topic(client_id="client", study_topic="python", default={})
+
+        assert topic_session == {"history": ["old"]}
+        assert "client" not in aio_cache.data
+        assert orjson.loads(aio_cache.data["client:python"]) == {"history": ["old"]}
+        assert orjson.loads(aio_cache.data["client:javascript"]) == {"history": ["new js"]}
+
+    @pytest.mark.asyncio
+    async def test_write_behind_coalesces_and_flushes_on_close(self, aio_cache):
+        """Тест: отложенная запись оставляет последнее значение ключа и дописывает очередь при закрытии"""
+        aio_cache.put_all = AsyncMock(side_effect=aio_cache.put_all)
+        write_behind = WriteBehindBuffer(cache=aio_cache, max_batch=100, flush_interval=60)
+        cache = HistoryCache(cache=aio_cache, write_behind=write_behind)
+        write_behind.start()
+
+        for turn in range(3):
+            await cache.put_topic(client_id="client", study_topic="python", value={"history": [turn]})
+
+        assert aio_cache.data == {}
+        assert await cache.get_topic(client_id="client", study_topic="python", default={}) == {"history": [2]}
+
+        await cache.aclose()
+
+        aio_cache.put_all.assert_awaited_once()
+        assert orjson.loads(aio_cache.data["client:python"]) == {"history": [2]}
+
+    @pytest.mark.asyncio
+    async def test_write_behind_keeps_batch_on_error(self, aio_cache):
+        """Тест: при ошибке записи пачка остается в очереди"""
+        aio_cache.put_all = AsyncMock(side_effect=ConnectionError("Ignite недоступен"))
+        write_behind = WriteBehindBuffer(cache=aio_cache, max_batch=100, flush_interval=60)
+        write_behind.put("client:python", b"{}")
+
+        await write_behind.flush()
+
+        assert write_behind.get("client:python") == b"{}"
+
+    @pytest.mark.asyncio
+    async def test_write_behind_drops_oldest_when_full(self, aio_cache):
+        """Тест: переполненная очередь вытесняет самые старые сессии и считает их в метрике"""
+        aio_cache.put_all = AsyncMock(side_effect=ConnectionError("Ignite недоступен"))
+        write_behind = WriteBehindBuffer(cache=aio_cache, max_batch=100, flush_interval=60, max_pending=2)
+        dropped = REGISTRY.get_sample_value("history_write_behind_dropped_total") or 0.0
+        write_behind.put("first:python", b"1")
+        write_behind.put("second:python", b"2")
+
+        await write_behind.flush()
+        write_behind.put("third:python", b"3")
+
+        assert write_behind.get("first:python") is None
+        assert write_behind.get("second:python") == b"2"
+        assert write_behind.get("third:python") == b"3"
+        assert REGISTRY.get_sample_value("history_write_behind_dropped_total") == dropped + 1
+
+    @pytest.mark.asyncio
+    async def test_write_behind_backoff_on_failures(self, aio_cache):
+        """Тест: пауза между попытками растет после ошибок записи и сбрасывается после успешной"""
+        put_all = aio_cache.put_all
+        aio_cache.put_all = AsyncMock(side_effect=ConnectionError("Ignite недоступен"))
+        write_behind = WriteBehindBuffer(cache=aio_cache, max_batch=100, flush_interval=0.5, max_backoff=3.0)
+        write_behind.put("client:python", b"{}")
+
+        delays = []
+        for _ in range(4):
+            await write_behind.flush()
+            delays.append(write_behind.backoff())
+        aio_cache.put_all = AsyncMock(side_effect=put_all)
+        await write_behind.flush()
+
+        assert delays == [1.0, 2.0, 3.0, 3.0]
+        assert write_behind.backoff() == 0.5
+        assert aio_cache.data["client:python"] == b"{}"
+
+    @pytest.mark.asyncio
+    async def test_near_cache_revalidates_by_version(self, aio_cache):
+        """Тест: локальный кэш отдает сессию, пока версия в Ignite не изменилась другим процессом"""
+        worker = HistoryCache(cache=aio_cache, near_cache=NearCache(maxsize=10))
+        other_worker = HistoryCache(cache=aio_cache, near_cache=NearCache(maxsize=10))
+        aio_cache.get = AsyncMock(side_effect=aio_cache.get)
+
+        await worker.put_topic(client_id="client", study_topic="python", value={"history": ["a"]})
+        assert await worker.get_topic(client_id="client", study_topic="python", default={}) == {"history": ["a"]}
+        aio_cache.get.assert_awaited_once_with("client:python:version")
+
+        await other_worker.put_topic(client_id="client", study_topic="python", value={"history": ["a", "b"]})
+
+        topic_session = await worker.get_topic(client_id="client", study_topic="python", default={})
+        assert topic_session == {"history": ["a", "b"]}
+
+
+class TestAioIgniteClient:
+
+    def test_parse_addresses(self):
+        """Тест: адреса всех узлов кластера разбираются в пары host, port"""
+        assert AioIgniteClient.parse_addresses("ignite-1:10800, ignite-2:10801") == [
+            ("ignite-1", 10800), ("ignite-2", 10801),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_connect_retries_before_failing(self):
+        """Тест: подключение повторяется заданное число раз, затем ошибка пробрасывается"""
+        client = AioIgniteClient(Ignite(IGNITE_CONNECT_RETRIES=3, IGNITE_RETRY_BACKOFF=0.001))
+        created = []
+
+        def create_client():
+            aio_client = Mock(partition_aware=True)
+            aio_client.connect = AsyncMock(side_effect=ReconnectError("Ignite недоступен"))
+            aio_client.close = AsyncMock()
+            created.append(aio_client)
+            return aio_client
+
+        client.client = create_client()
+        client._create_client = create_client
+
+        with pytest.raises(ReconnectError):
+            await client.connect("ignite-1:10800")
+
+        assert len(created) == 3
+        assert all(aio_client.connect.await_count == 1 for aio_client in created)
+        created[-1].close.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_connect_succeeds_after_retry(self):
+        """Тест: после неудачной попытки подключение выполняется новым клиентом"""
+        client = AioIgniteClient(Ignite(IGNITE_CONNECT_RETRIES=3, IGNITE_RETRY_BACKOFF=0.001))
+        failing = Mock(connect=AsyncMock(side_effect=ReconnectError("Ignite недоступен")), close=AsyncMock())
+        working = Mock(connect=AsyncMock(), partition_aware=True)
+        client.client = failing
+        client._create_client = lambda: working
+
+        await client.connect("ignite-1:10800,ignite-2:10800")
+
+        assert client.client is working
+        working.connect.assert_awaited_once_with([("ignite-1", 10800), ("ignite-2", 10800)])
+
+    def test_dead_nodes(self):
+        """Тест: в список отключившихся попадают только узлы с alive=False"""
+        client = AioIgniteClient(Ignite())
+        alive, dead = Mock(alive=True), Mock(alive=False)
+        client.client = Mock(_nodes=[alive, dead])
+
+        assert client._dead_nodes() == [dead]
@@ -0,0 +1,130 @@
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from dialog_api.services.document_loader import DocumentLoader
+from dialog_api.services.ingestion import IngestionPipeline, IngestionReport, batched
+from dialog_api.services.rag import RAGService
+from dialog_api.settings import RetrievalSettings
+
+
+class FakeVectorDB:
+    def __init__(self, stored: dict[str, str] | None = None) -> None:
+        self.stored = dict(stored or {})
+        self.embedded: list[list[str]] = []
+        self.uploaded: list[list[str]] = []
+        self.deleted: list[str] = []
+        self.upload_threads: set[str] = set()
+
+    def embedding_function(self, texts: list[str]) -> list[list[float]]:
+        self.embedded.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    def upsert_embedded(self, batch, embeddings) -> None:
+        assert len(batch) == len(embeddings)
+        self.upload_threads.add(threading.current_thread().name)
+        self.uploaded.append([doc["id"] for doc in batch])
+        self.stored.update({doc["id"]: doc["metadata"]["content_hash"] for doc in batch})
+
+    def get_manifest(self) -> dict[str, str]:
+        return dict(self.stored)
+
+    def delete_documents(self, ids: list[str]) -> None:
+        self.deleted.extend(ids)
+        for doc_id in ids:
+            self.stored.pop(doc_id)
+
+    def persist(self) -> None:
+        pass
+
+
+def make_documents(count: int) -> list[dict]:
+    return [
+        {"id": f"doc_{i}", "content": f"секция {i}", "metadata": {"content_hash": str(i)}}
+        for i in range(count)
+    ]
+
+
+def make_rag(vector_db, tmp_path, documents_dir: str = "sources") -> RAGService:
+    return RAGService(
+        vector_db=vector_db, documents_number=4,
+        document_loader=DocumentLoader(documents_path=str(tmp_path / documents_dir)), embedding_batch_size=2,
+        retrieval_settings=RetrievalSettings(RETRIEVAL_LEXICAL_INDEX_PATH=str(tmp_path / "lexical.msgpack")),
+    )
+
+
+class TestIngestionPipeline:
+    def test_batches_are_embedded_and_uploaded(self):
+        """Тест: секции векторизуются и записываются пачками в исходном порядке"""
+        vector_db = FakeVectorDB()
+
+        IngestionPipeline(vector_db=vector_db, batch_size=2).run(make_documents(5))
+
+        assert vector_db.embedded == [["секция 0", "секция 1"], ["секция 2", "секция 3"], ["секция 4"]]
+        assert vector_db.uploaded == [["doc_0", "doc_1"], ["doc_2", "doc_3"], ["doc_4"]]
+        assert all(name.startswith("ingestion-upload") for name in vector_db.upload_threads)
+
+    def test_report(self):
+        """Тест: отчет считает секции и байты загруженного текста"""
+        report = IngestionPipeline(vector_db=FakeVectorDB(), batch_size=2).run(make_documents(3))
+
+        assert report.sections == 3
+        assert report.bytes == sum(len(f"секция {i}".encode("utf-8")) for i in range(3))
+        assert report.seconds > 0
+
+    def test_upload_error_is_raised(self):
+        """Тест: ошибка записи пачки пробрасывается из пайплайна"""
+        vector_db = FakeVectorDB()
+        vector_db.upsert_embedded = Mock(side_effect=RuntimeError("db down"))
+
+        with pytest.raises(RuntimeError):
+            IngestionPipeline(vector_db=vector_db, batch_size=2).run(make_documents(3))
+
+    def test_empty_report_rates(self):
+        """Тест: у пустого отчета скорости равны нулю, а не деление на ноль"""
+        report = IngestionReport()
+
+        assert report.sections_per_second == 0.0
+        assert report.megabytes_per_second == 0.0
+        assert "0 секций" in str(report)
+
+    def test_batched(self):
+        """Тест: разбиение на пачки с неполной последней пачкой"""
+        assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+class TestCorpusSync:
+    def test_removed_sections_deleted_when_corpus_is_empty(self, tmp_path):
+        """Тест: если из корпуса удалены все файлы, их секции удаляются из БД"""
+        (tmp_path / "sources" / "python").mkdir(parents=True)
+        (tmp_path / "sources" / "python" / "lists.txt").write_text("Список.\n\nКортеж.", encoding="utf-8")
+        vector_db = FakeVectorDB()
+        make_rag(vector_db, tmp_path).initialize_with_documents()
+        assert len(vector_db.stored) == 2
+
+        (tmp_path / "sources" / "python" / "lists.txt").unlink()
+        make_rag(vector_db, tmp_path).initialize_with_documents()
+
+        assert vector_db.stored == {}
+        assert len(vector_db.deleted) == 2
+
+    def test_missing_corpus_keeps_stored_sections(self, tmp_path):
+        """Тест: если папки с документами нет, сохраненные секции не удаляются"""
+        vector_db = FakeVectorDB(stored={"python_lists_1": "hash"})
+
+        make_rag(vector_db, tmp_path, documents_dir="missing").initialize_with_documents()
+
+        assert vector_db.deleted == []
+
+    def test_small_corpus_parsed_inline(self, tmp_path):
+        """Тест: корпус меньше порога разбирается без пула процессов"""
+        (tmp_path / "python").mkdir()
+        (tmp_path / "python" / "lists.txt").write_text("Список.", encoding="utf-8")
+        loader = DocumentLoader(documents_path=str(tmp_path), parse_workers=4, inline_bytes=1024)
+
+        with patch("dialog_api.services.document_loader.ProcessPoolExecutor") as pool:
+            documents = list(loader.iter_documents())
+
+        pool.assert_not_called()
+        assert [doc["content"] for doc in documents] == ["Список."]
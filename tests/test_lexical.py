@@ -0,0 +1,182 @@
+import zlib
+from unittest.mock import AsyncMock, Mock
+
+import numpy as np
+import pytest
+
+from dialog_api.databases.local_store import LocalStore
+from dialog_api.services.lexical import LexicalIndex, analyze, reciprocal_rank_fusion
+from dialog_api.services.rag import RAGService
+from dialog_api.settings import RetrievalSettings
+
+CORPUS = {
+    "closures": "Замыкание - функция, которая запоминает переменные из области видимости, где она была создана.",
+    "decorators": "Декоратор принимает функцию и возвращает новую функцию с дополнительным поведением.",
+    "generators": "Генератор возвращает значения по одному через yield и не хранит всю последовательность в памяти.",
+    "lists": "Список - изменяемая упорядоченная коллекция, элементы добавляются методом append.",
+    "tuples": "Кортеж похож на список, но его нельзя изменить после создания.",
+    "dicts": "Словарь хранит пары ключ-значение, значение по ключу получают через квадратные скобки или get.",
+    "sets": "Множество хранит только уникальные элементы и поддерживает объединение и пересечение.",
+    "exceptions": "Исключения обрабатываются конструкцией try except, finally выполняется всегда.",
+    "async": "Асинхронная функция объявляется через async def, а результат корутины ожидают через await.",
+    "classes": "Класс описывает атрибуты и методы объектов, наследование позволяет расширять классы.",
+    "files": "Файл открывают функцией open в контекстном менеджере with, чтобы он закрылся автоматически.",
+    "loops": "Цикл for перебирает элементы коллекции, а while повторяется, пока условие истинно.",
+}
+# Запросы-ключевые слова и перефразированные вопросы с эталонной секцией
+QUERIES = {
+    "замыкания": "closures",
+    "декораторы": "decorators",
+    "yield": "generators",
+    "кортежи": "tuples",
+    "async await": "async",
+    "как функция запоминает переменные снаружи": "closures",
+    "как не хранить всю последовательность в памяти": "generators",
+    "как получить значение из словаря по ключу": "dicts",
+    "что выполняется всегда после обработки ошибки": "exceptions",
+    "как перебрать элементы коллекции": "loops",
+    "неизменяемая последовательность": "tuples",
+    "обработка ошибок": "exceptions",
+    "уникальные значения": "sets",
+    "наследоваться от родителя": "classes",
+    "закрыть файл": "files",
+}
+
+
+def fake_embedding(text: str, dim: int = 256) -> list[float]:
+    """Эмбеддинг по хэшам символьных триграмм вместо модели, которая недоступна в тестах"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        word = f" {word} "
+        for start in range(len(word) - 2):
+            vector[zlib.crc32(word[start:start + 3].encode()) % dim] += 1
+    return vector.tolist()
+
+
+def documents():
+    return [
+        {"id": doc_id, "content": content, "metadata": {"topic": "python", "level": "beginner"}}
+        for doc_id, content in CORPUS.items()
+    ]
+
+
+@pytest.fixture
+def vector_db(tmp_path):
+    store = LocalStore(path=str(tmp_path))
+    store.upsert(
+        ids=list(CORPUS), embeddings=[fake_embedding(text) for text in CORPUS.values()],
+        documents=list(CORPUS.values()), metadatas=[doc["metadata"] for doc in documents()],
+    )
+    vector_db = Mock()
+    vector_db.asearch = AsyncMock(
+        side_effect=lambda query, where_filter, n_results: store.query(fake_embedding(query), where_filter, n_results),
+    )
+    return vector_db
+
+
+@pytest.fixture
+def lexical_index():
+    index = LexicalIndex()
+    for document in documents():
+        index.add(document)
+    return index
+
+
+def recall(results: list[dict], expected: str) -> float:
+    return float(expected in [result["id"] for result in results])
+
+
+class TestLexicalIndex:
+
+    def test_analyze_matches_word_forms(self):
+        """Тест: словоформы сводятся к одной основе, стоп-слова отбрасываются"""
+        assert analyze("Что такое замыкания?") == analyze("замыкание")
+        assert analyze("функции") == analyze("функция") == analyze("функцию")
+
+    def test_search_is_scoped_to_topic(self, lexical_index):
+        """Тест: поиск BM25 находит секцию по словоформе только внутри темы"""
+        results = lexical_index.search("замыканий", partition="python", n_results=3)
+
+        assert results[0]["id"] == "closures"
+        assert results[0]["matched"] == 1
+        assert lexical_index.search("замыканий", partition="javascript", n_results=3) == []
+
+    def test_save_and_load(self, lexical_index, tmp_path):
+        """Тест: индекс восстанавливается из файла"""
+        lexical_index.save(str(tmp_path / "lexical.msgpack"))
+
+        loaded = LexicalIndex.load(str(tmp_path / "lexical.msgpack"))
+
+        assert loaded.search("кортежи", "python", 1)[0]["id"] == "tuples"
+
+    def test_reciprocal_rank_fusion(self):
+        """Тест: секция, найденная обоими способами, поднимается выше"""
+        vector = [{"id": "a", "content": "a"}, {"id": "b", "content": "b"}]
+        lexical = [{"id": "b", "content": "b"}, {"id": "c", "content": "c"}]
+
+        assert [doc["id"] for doc in reciprocal_rank_fusion([vector, lexical])] == ["b", "a", "c"]
+
+
+class TestHybridRetrieval:
+
+    @pytest.mark.asyncio
+    async def test_keyword_query_skips_embedding(self, vector_db, lexical_index):
+        """Тест: решающее лексическое совпадение возвращается без векторного поиска"""
+        rag_service = RAGService(vector_db=vector_db, documents_number=2, document_loader=Mock())
+        rag_service.lexical_index = lexical_index
+
+        documents = await rag_service.aretrieve(query="замыкания", topic="python")
+
+        assert documents[0]["id"] == "closures"
+        vector_db.asearch.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_recall_on_fixture_corpus(self, vector_db, lexical_index):
+        """Тест: гибридный поиск находит не меньше эталонных секций, чем каждый путь отдельно"""
+        hybrid = RAGService(vector_db=vector_db, documents_number=2, document_loader=Mock())
+        hybrid.lexical_index = lexical_index
+        vector_only = RAGService(vector_db=vector_db, documents_number=2, document_loader=Mock())
+        recalls = {"lexical": [], "vector": [], "hybrid": []}
+
+        for query, expected in QUERIES.items():
+            recalls["lexical"].append(recall(lexical_index.search(query, "python", 2), expected))
+            recalls["vector"].append(recall(await vector_only.aretrieve(query=query, topic="python"), expected))
+            recalls["hybrid"].append(recall(await hybrid.aretrieve(query=query, topic="python"), expected))
+        recall_at_2 = {path: sum(values) / len(values) for path, values in recalls.items()}
+
+        assert recall_at_2["hybrid"] >= max(recall_at_2["lexical"], recall_at_2["vector"])
+        assert recall_at_2["hybrid"] >= 0.8
+
+    @pytest.mark.asyncio
+    async def test_fast_path_prefers_user_level(self, vector_db):
+        """Тест: в лексической выдаче секции уровня пользователя поднимаются с учетом lexical_level_discount"""
+        index = LexicalIndex()
+        index.add({
+            "id": "beginner", "content": "Декоратор. Декоратор оборачивает функцию.",
+            "metadata": {"topic": "python", "level": "beginner"},
+        })
+        index.add({
+            "id": "advanced", "content": "Декоратор с параметрами возвращает декоратор и сохраняет метаданные обертки.",
+            "metadata": {"topic": "python", "level": "advanced"},
+        })
+        plain = RAGService(
+            vector_db=vector_db, documents_number=2, document_loader=Mock(),
+            retrieval_settings=RetrievalSettings(RETRIEVAL_LEXICAL_LEVEL_DISCOUNT=0.0),
+        )
+        leveled = RAGService(
+            vector_db=vector_db, documents_number=2, document_loader=Mock(), level_mismatch_penalty=5.0,
+            retrieval_settings=RetrievalSettings(RETRIEVAL_LEXICAL_LEVEL_DISCOUNT=0.5),
+        )
+        plain.lexical_index = leveled.lexical_index = index
+
+        plain_ids = [doc["id"] for doc in await plain.aretrieve(query="декоратор", topic="python", user_level="advanced")]
+        leveled_ids = [doc["id"] for doc in await leveled.aretrieve(query="декоратор", topic="python", user_level="advanced")]
+
+        assert plain_ids == ["beginner", "advanced"]
+        assert leveled_ids == ["advanced", "beginner"]
+        vector_db.asearch.assert_not_awaited()
+
+    def test_lexical_level_discount_is_a_fraction(self):
+        """Тест: скидка BM25 за уровень - доля от 0 до 1, скидка 1 обнулила бы секции другого уровня"""
+        with pytest.raises(ValueError):
+            RetrievalSettings(RETRIEVAL_LEXICAL_LEVEL_DISCOUNT=1.0)
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from dialog_api.api.v1.handlers import overloaded_handler
+from dialog_api.utils.limiter import AdaptiveLimiter, CallPriority, LimiterOverloaded
+
+
+def make_limiter(**kwargs) -> AdaptiveLimiter:
+    return AdaptiveLimiter(**{
+        "initial_limit": 1, "min_limit": 1, "max_limit": 10, "queue_size": 10, "queue_deadline": 1.0, **kwargs,
+    })
+
+
+class TestAdaptiveLimiter:
+
+    @pytest.mark.asyncio
+    async def test_limit_grows_on_success_and_drops_on_overload(self):
+        """Тест: лимит растет после успешных вызовов и снижается при таймауте"""
+        limiter = make_limiter(initial_limit=4, backoff=0.5)
+        for _ in range(8):
+            limiter._feedback(latency=1.0)
+        grown = limiter.limit
+
+        with pytest.raises(asyncio.TimeoutError):
+            async with limiter.slot(CallPriority.dialog):
+                raise asyncio.TimeoutError
+
+        assert grown > 4
+        assert limiter.limit == int(grown * 0.5)
+
+    @pytest.mark.asyncio
+    async def test_dialog_is_served_before_quiz(self):
+        """Тест: освободившийся слот достается диалогу, даже если квиз ждет дольше"""
+        limiter = make_limiter()
+        order = []
+        release = asyncio.Event()
+
+        async def call(priority: CallPriority):
+            async with limiter.slot(priority):
+                order.append(priority.name)
+                await release.wait()
+
+        first = asyncio.create_task(call(CallPriority.dialog))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(call(CallPriority.quiz)), asyncio.create_task(call(CallPriority.dialog))]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+        assert order == ["dialog", "dialog", "quiz"]
+
+    @pytest.mark.asyncio
+    async def test_sheds_when_wait_exceeds_deadline(self):
+        """Тест: вызов, который не дождется слота до дедлайна, отклоняется сразу с Retry-After"""
+        limiter = make_limiter(queue_deadline=1.0)
+        limiter._hold_time = 5.0
+        await limiter._acquire(CallPriority.dialog)
+
+        with pytest.raises(LimiterOverloaded) as error:
+            await limiter._acquire(CallPriority.quiz)
+
+        response = await overloaded_handler(request=None, exc=error.value)
+        assert error.value.reason == "deadline"
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+
+    @pytest.mark.asyncio
+    async def test_full_queue_evicts_lower_priority(self):
+        """Тест: при полной очереди диалог вытесняет ожидающий фоновый вызов"""
+        limiter = make_limiter(queue_size=1)
+        await limiter._acquire(CallPriority.dialog)
+        background = asyncio.create_task(limiter._acquire(CallPriority.background))
+        await asyncio.sleep(0)
+        dialog = asyncio.create_task(limiter._acquire(CallPriority.dialog))
+        await asyncio.sleep(0)
+
+        with pytest.raises(LimiterOverloaded):
+            await background
+        limiter._release()
+        await dialog
+        assert limiter.queue_depth == 0
+
+    @pytest.mark.asyncio
+    async def test_latency_is_tracked_per_priority(self):
+        """Тест: медленные фоновые вызовы не снижают лимит как рост задержки диалога"""
+        limiter = make_limiter(initial_limit=4)
+        for _ in range(10):
+            limiter._feedback(latency=1.0, priority=CallPriority.dialog)
+        grown = limiter.limit
+
+        limiter._feedback(latency=10.0, priority=CallPriority.background)
+
+        assert limiter.limit >= grown
+        assert limiter._long_latency[(CallPriority.dialog, False)] == pytest.approx(1.0)
+
+    @pytest.mark.asyncio
+    async def test_stream_latency_is_time_to_first_chunk(self):
+        """Тест: для потокового вызова задержка - время до первой части, слот занят до конца потока"""
+        limiter = make_limiter()
+
+        async with limiter.slot(CallPriority.dialog, stream=True) as timer:
+            timer.first_chunk()
+            await asyncio.sleep(0.05)
+
+        assert limiter._long_latency[(CallPriority.dialog, True)] < 0.05
+        assert limiter._hold_time >= 0.05
+        assert (CallPriority.dialog, False) not in limiter._long_latency
+
+    @pytest.mark.asyncio
+    async def test_caller_deadline(self):
+        """Тест: дедлайн вызывающего строже общего: диалог отклоняется, фоновый вызов ждет в очереди"""
+        limiter = make_limiter(queue_deadline=10.0)
+        limiter._hold_time = 2.0
+        await limiter._acquire(CallPriority.dialog)
+
+        with pytest.raises(LimiterOverloaded):
+            await limiter._acquire(CallPriority.dialog, deadline=1.0)
+        background = asyncio.create_task(limiter._acquire(CallPriority.background))
+        await asyncio.sleep(0)
+
+        assert limiter.queue_depth == 1
+        limiter._release()
+        await background
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from dialog_api.databases.local_store import LocalStore
+
+
+def make_corpus(count: int, dim: int = 16, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(count, dim)).astype(np.float32)
+    ids = [f"doc-{index}" for index in range(count)]
+    documents = [f"документ {index}" for index in range(count)]
+    metadatas = [
+        {"topic": "python" if index % 2 == 0 else "javascript", "level": "beginner", "content_hash": str(index)}
+        for index in range(count)
+    ]
+    return ids, embeddings, documents, metadatas
+
+
+class TestLocalStore:
+
+    def test_query_filters_by_metadata(self, tmp_path):
+        """Тест: точный поиск возвращает ближайшие документы только подходящей темы"""
+        ids, embeddings, documents, metadatas = make_corpus(50)
+        store = LocalStore(path=str(tmp_path))
+        store.upsert(ids, embeddings.tolist(), documents, metadatas)
+
+        results = store.query(embeddings[4].tolist(), where={"topic": "python"}, n_results=3)
+
+        assert results[0]["content"] == "документ 4"
+        assert results[0]["score"] == pytest.approx(0.0, abs=1e-5)
+        assert all(result["metadata"]["topic"] == "python" for result in results)
+        assert store.query(embeddings[4].tolist(), where={"topic": "go"}, n_results=3) == []
+
+    def test_persist_and_load_through_mmap(self, tmp_path):
+        """Тест: сохраненное хранилище открывается через mmap с теми же документами"""
+        ids, embeddings, documents, metadatas = make_corpus(20)
+        store = LocalStore(path=str(tmp_path), dtype="float16")
+        store.upsert(ids, embeddings.tolist(), documents, metadatas)
+        store.delete(["doc-0"])
+        store.persist()
+
+        loaded = LocalStore(path=str(tmp_path), dtype="float16")
+
+        assert isinstance(loaded._matrix, np.memmap)
+        assert loaded.count() == 19
+        assert loaded.manifest() == {doc_id: str(index) for index, doc_id in enumerate(ids) if index != 0}
+        assert loaded.query(embeddings[5].tolist(), where=None, n_results=1)[0]["content"] == "документ 5"
+
+    def test_hnsw_matches_exact_search(self, tmp_path):
+        """Тест: поиск по индексу HNSW сверх порога совпадает с точным поиском"""
+        ids, embeddings, documents, metadatas = make_corpus(300)
+        exact = LocalStore(path=str(tmp_path / "exact"))
+        indexed = LocalStore(path=str(tmp_path / "indexed"), bruteforce_limit=10)
+        for store in (exact, indexed):
+            store.upsert(ids, embeddings.tolist(), documents, metadatas)
+
+        where = {"$and": [{"topic": {"$eq": "javascript"}}, {"level": {"$in": ["beginner"]}}]}
+        expected = exact.query(embeddings[7].tolist(), where=where, n_results=5)
+        found = indexed.query(embeddings[7].tolist(), where=where, n_results=5)
+
+        assert indexed._index is not None
+        assert [result["content"] for result in found] == [result["content"] for result in expected]
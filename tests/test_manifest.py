@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+from dialog_api.services.document_loader import DocumentLoader
+from dialog_api.services.manifest import CorpusManifest
+
+
+def write_corpus(root, files: dict[str, str]) -> DocumentLoader:
+    for name, text in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    return DocumentLoader(documents_path=str(root))
+
+
+def stored_of(documents) -> dict[str, str]:
+    return {doc["id"]: doc["metadata"]["content_hash"] for doc in documents}
+
+
+class TestSectionIds:
+    def test_ids_do_not_depend_on_position(self, tmp_path):
+        """Тест: вставка секции в начало файла не меняет id остальных секций"""
+        loader = write_corpus(tmp_path, {"python/lists.txt": "Список.\n\nКортеж."})
+        before = {doc["content"]: doc["id"] for doc in loader.iter_documents()}
+
+        write_corpus(tmp_path, {"python/lists.txt": "Новая секция.\n\nСписок.\n\nКортеж."})
+        after = {doc["content"]: doc["id"] for doc in loader.iter_documents()}
+
+        assert after["Список."] == before["Список."]
+        assert after["Кортеж."] == before["Кортеж."]
+
+    def test_repeated_sections_get_distinct_ids(self, tmp_path):
+        """Тест: одинаковые секции в одном файле получают разные id"""
+        loader = write_corpus(tmp_path, {"python/lists.txt": "Пример.\n\nСписок.\n\nПример."})
+
+        ids = [doc["id"] for doc in loader.iter_documents()]
+
+        assert len(set(ids)) == 3
+
+
+class TestCorpusManifest:
+    def test_only_changed_sections_pass(self, tmp_path):
+        """Тест: неизмененные секции пропускаются, новые и измененные отдаются на загрузку"""
+        loader = write_corpus(tmp_path, {"python/lists.txt": "Список.\n\nКортеж."})
+        manifest = CorpusManifest(stored=stored_of(loader.iter_documents()))
+
+        write_corpus(tmp_path, {"python/lists.txt": "Список.\n\nКортеж неизменяем."})
+        changed = [doc["content"] for doc in manifest.changed(loader.iter_documents())]
+
+        assert changed == ["Кортеж неизменяем."]
+        assert manifest.unchanged == 1
+
+    def test_removed_sections(self, tmp_path):
+        """Тест: секции, которых больше нет в корпусе, попадают в removed"""
+        loader = write_corpus(tmp_path, {"python/lists.txt": "Список.\n\nКортеж."})
+        ids = {doc["content"]: doc["id"] for doc in loader.iter_documents()}
+        manifest = CorpusManifest(stored=stored_of(loader.iter_documents()))
+
+        write_corpus(tmp_path, {"python/lists.txt": "Список."})
+        list(manifest.changed(loader.iter_documents()))
+
+        assert manifest.removed(loader.failed_sources) == [ids["Кортеж."]]
+
+    def test_failed_file_sections_are_not_removed(self, tmp_path):
+        """Тест: секции файла, который не удалось разобрать, не удаляются из БД"""
+        loader = write_corpus(tmp_path, {"python/lists.txt": "Список.", "python/dicts.txt": "Словарь."})
+        stored = stored_of(loader.iter_documents())
+        manifest = CorpusManifest(stored=stored)
+
+        real_open = open
+
+        def broken_open(path, *args, **kwargs):
+            if str(path).endswith("dicts.txt"):
+                raise UnicodeDecodeError("utf-8", b"", 0, 1, "битый файл")
+            return real_open(path, *args, **kwargs)
+
+        with patch("builtins.open", broken_open):
+            list(manifest.changed(loader.iter_documents()))
+
+        assert loader.failed_sources == {"python_dicts"}
+        assert manifest.removed(loader.failed_sources) == []
+        assert len(manifest.removed()) == 1
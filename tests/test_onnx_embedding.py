@@ -0,0 +1,85 @@
+from unittest.mock import Mock, patch
+
+import numpy as np
+import orjson
+import pytest
+
+from dialog_api.databases.onnx_embedding import (
+    OnnxArtifactError, OnnxEmbeddingModel, artifact_paths, mean_pooling, parity_report, verify_artifact,
+)
+from dialog_api.databases.vector import _load_embedding_model, prepare_onnx_model
+from dialog_api.settings import VectorDBSettings
+
+
+class TestOnnxEmbedding:
+
+    def test_mean_pooling_ignores_padding(self):
+        """Тест: паддинг не влияет на усреднение токенов"""
+        hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype=np.float32)
+        mask = np.array([[1, 1, 0]])
+
+        assert mean_pooling(hidden, mask, normalize=False).tolist() == [[2.0, 0.0]]
+        assert mean_pooling(hidden, mask, normalize=True).tolist() == [[1.0, 0.0]]
+
+    def test_parity_report_detects_divergence(self):
+        """Тест: проверка совпадения отличает близкие эмбеддинги от случайных"""
+        rng = np.random.default_rng(0)
+        reference = rng.normal(size=(16, 32))
+
+        close = parity_report(reference, reference + rng.normal(scale=0.01, size=reference.shape))
+        random = parity_report(reference, rng.normal(size=reference.shape))
+
+        assert close["cosine_min"] > 0.99 and close["overlap_at_k"] > 0.8
+        assert random["cosine_mean"] < 0.5 and random["overlap_at_k"] < 0.8
+
+    def test_missing_artifact_is_reported(self, tmp_path):
+        """Тест: без экспортированной модели ONNX бэкенд не создается"""
+        with pytest.raises(OnnxArtifactError):
+            OnnxEmbeddingModel(onnx_dir=str(tmp_path), model_name="all-MiniLM-L6-v2", quantize=True)
+
+    @staticmethod
+    def write_report(tmp_path, **report) -> None:
+        paths = artifact_paths(str(tmp_path), "all-MiniLM-L6-v2", quantize=True)
+        paths["root"].mkdir(parents=True)
+        paths["model"].write_bytes(b"")
+        paths["parity"].write_bytes(orjson.dumps(report))
+
+    def test_parity_rechecked_against_current_thresholds(self, tmp_path):
+        """Тест: метрики отчета сверяются с текущими порогами, а не с сохраненным признаком passed"""
+        self.write_report(
+            tmp_path, cosine_min=0.97, overlap_at_k=0.9, min_cosine=0.95, min_overlap=0.8, passed=True,
+        )
+        args = dict(onnx_dir=str(tmp_path), model_name="all-MiniLM-L6-v2", quantize=True)
+
+        assert verify_artifact(**args)["cosine_min"] == 0.97
+        with pytest.raises(OnnxArtifactError):
+            verify_artifact(**args, min_cosine=0.98, min_overlap=0.8)
+
+    def test_report_without_thresholds_is_rejected(self, tmp_path):
+        """Тест: отчет без сохраненных порогов требует повторного экспорта"""
+        self.write_report(tmp_path, cosine_min=0.99, overlap_at_k=1.0, passed=True)
+
+        with pytest.raises(OnnxArtifactError):
+            verify_artifact(onnx_dir=str(tmp_path), model_name="all-MiniLM-L6-v2", quantize=True)
+
+    def test_serving_path_does_not_export(self, tmp_path):
+        """Тест: без готовой ONNX модели загружается torch, экспорт при обслуживании не запускается"""
+        settings = VectorDBSettings(VECTOR_DB_EMBEDDING_BACKEND="onnx", VECTOR_DB_ONNX_DIR=str(tmp_path))
+        torch_model = Mock()
+
+        with patch("dialog_api.databases.vector.export_onnx") as export, \
+                patch("sentence_transformers.SentenceTransformer", return_value=torch_model):
+            model = _load_embedding_model(settings)
+
+        export.assert_not_called()
+        assert model is torch_model
+
+    def test_prepare_exports_missing_model(self, tmp_path):
+        """Тест: подготовка модели перед запуском воркеров экспортирует ее с порогами из настроек"""
+        settings = VectorDBSettings(VECTOR_DB_EMBEDDING_BACKEND="onnx", VECTOR_DB_ONNX_DIR=str(tmp_path))
+
+        with patch("dialog_api.databases.vector.export_onnx") as export:
+            prepare_onnx_model(settings)
+
+        assert export.call_args.kwargs["min_cosine"] == settings.onnx_min_cosine
+        assert export.call_args.kwargs["min_overlap"] == settings.onnx_min_overlap
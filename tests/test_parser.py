@@ -0,0 +1,34 @@
+import pytest
+
+from dialog_api.utils.parser import AnswerStreamParser, parse_json
+
+
+class TestAnswerStreamParser:
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1000])
+    def test_extracts_answer_incrementally(self, chunk_size):
+        """Тест извлечения поля answer при любой нарезке ответа на части"""
+        raw = '```json\n{"answer": "Декоратор \\u2014 это \\"обертка\\"\\nнад функцией \\ud83d\\ude00", "next_topic": "x"}\n```'
+        parser = AnswerStreamParser()
+
+        parts = [parser.feed(raw[i:i + chunk_size]) for i in range(0, len(raw), chunk_size)]
+
+        assert "".join(parts) == parse_json(raw)["answer"]
+        assert parser.text == parse_json(raw)["answer"]
+        assert parser.done
+
+    def test_ignores_text_before_answer_field(self):
+        """Тест: до появления поля answer ничего не отдается"""
+        parser = AnswerStreamParser()
+
+        assert parser.feed('{"next_topic": "Классы", ') == ""
+        assert parser.feed('"answer": "Ответ"') == "Ответ"
+        assert parser.feed(', "difficulty_level": "beginner"}') == ""
+
+    def test_no_answer_field(self):
+        """Тест ответа без поля answer"""
+        parser = AnswerStreamParser()
+
+        assert parser.feed("Просто текст без JSON") == ""
+        assert parser.text == ""
+        assert not parser.done
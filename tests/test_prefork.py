@@ -0,0 +1,106 @@
+import os
+import sys
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from starlette.datastructures import State
+
+from dialog_api import prefork as prefork_module
+from dialog_api import server
+from dialog_api.prefork import CORPUS_READY_ENV, initialize_corpus, prefork, setup_multiprocess_metrics
+from dialog_api.services.warmup import Warmup
+from dialog_api.settings import Settings
+
+
+def corpus_process(exitcode: int) -> Mock:
+    """Контекст multiprocessing, процесс которого сразу завершается с заданным кодом"""
+    process = Mock(exitcode=exitcode)
+    context = Mock()
+    context.Process = Mock(return_value=process)
+    return context
+
+
+@pytest.fixture
+def stub_master():
+    """Мастер-процесс без загрузки модели и заморозки сборщика мусора, окружение восстанавливается после теста"""
+    with patch.dict(os.environ), patch("dialog_api.databases.vector.load_embedding_model") as load_model, \
+            patch.object(prefork_module.gc, "freeze"):
+        os.environ.pop(CORPUS_READY_ENV, None)
+        yield load_model
+
+
+class TestPrefork:
+    def test_corpus_ready_is_handed_to_workers(self, stub_master):
+        """Тест: после успешной синхронизации корпуса воркеры получают признак через окружение"""
+        context = corpus_process(exitcode=0)
+
+        with patch.object(prefork_module.multiprocessing, "get_context", return_value=context):
+            prefork(Settings())
+
+        assert context.Process.call_args.kwargs["target"] is initialize_corpus
+        assert os.environ[CORPUS_READY_ENV] == "1"
+        stub_master.assert_called_once()
+
+    def test_failed_corpus_sync_is_left_to_workers(self, stub_master):
+        """Тест: при ошибке синхронизации корпуса признак не выставляется, корпус синхронизируют воркеры"""
+        with patch.object(prefork_module.multiprocessing, "get_context", return_value=corpus_process(exitcode=1)):
+            prefork(Settings())
+
+        assert CORPUS_READY_ENV not in os.environ
+
+    def test_initialize_corpus(self):
+        """Тест: процесс синхронизации прогоняет корпус через RAG service и закрывает векторную БД"""
+        vector_db = Mock(aclose=AsyncMock())
+
+        with patch("dialog_api.databases.vector.VectorDB", return_value=vector_db), \
+                patch("dialog_api.services.rag.RAGService") as rag_service:
+            initialize_corpus()
+
+        rag_service.return_value.initialize_with_documents.assert_called_once()
+        vector_db.aclose.assert_awaited_once()
+
+
+class TestMultiprocessMetrics:
+    def test_metrics_dir_is_prepared(self, tmp_path):
+        """Тест: каталог метрик создается, файлы прошлого запуска удаляются, prometheus_client получает каталог"""
+        metrics_dir = tmp_path / "metrics"
+        metrics_dir.mkdir()
+        (metrics_dir / "counter_123.db").write_bytes(b"")
+        (metrics_dir / "notes.txt").write_text("не метрики")
+
+        with patch.dict(os.environ), patch.dict(sys.modules):
+            sys.modules.pop("prometheus_client")
+            setup_multiprocess_metrics(Settings(PROMETHEUS_MULTIPROC_DIR=str(metrics_dir)))
+            assert os.environ["PROMETHEUS_MULTIPROC_DIR"] == str(metrics_dir)
+
+        assert [path.name for path in metrics_dir.iterdir()] == ["notes.txt"]
+
+    def test_imported_prometheus_client_is_rejected(self, tmp_path):
+        """Тест: если prometheus_client уже импортирован, метрики воркеров не настроить, запуск прерывается"""
+        with patch.dict(os.environ), pytest.raises(RuntimeError):
+            setup_multiprocess_metrics(Settings(PROMETHEUS_MULTIPROC_DIR=str(tmp_path)))
+
+
+class TestWorkerCorpusSync:
+    @pytest.mark.asyncio
+    async def test_worker_skips_corpus_synced_by_master(self, monkeypatch):
+        """Тест: воркер не синхронизирует корпус, если это сделал мастер-процесс"""
+        monkeypatch.setenv(CORPUS_READY_ENV, "1")
+        warmup = Warmup(required=[], optional=["corpus"])
+
+        with patch.object(server, "_initialize_corpus") as initialize:
+            await server._sync_corpus(State(), warmup)
+
+        initialize.assert_not_called()
+        assert warmup.report()["corpus"]["state"] == "ready"
+
+    @pytest.mark.asyncio
+    async def test_worker_syncs_corpus_without_master(self, monkeypatch):
+        """Тест: без мастер-процесса корпус синхронизирует воркер"""
+        monkeypatch.delenv(CORPUS_READY_ENV, raising=False)
+        warmup = Warmup(required=[], optional=["corpus"])
+
+        with patch.object(server, "_initialize_corpus") as initialize:
+            await server._sync_corpus(State(), warmup)
+
+        initialize.assert_called_once()
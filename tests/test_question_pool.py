@@ -0,0 +1,122 @@
+import itertools
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from dialog_api.services.question_pool import QuestionPool
+
+
+class StopLoop(Exception):
+    pass
+
+
+class FakeQuizAgent:
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.calls = 0
+        self._numbers = itertools.count(1)
+
+    async def agenerate_question(self, study_topic: str, user_level: str) -> dict[str, str]:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("гигачат недоступен")
+        return {"question": f"{study_topic} {user_level} вопрос {next(self._numbers)}"}
+
+
+def make_pool(agent: FakeQuizAgent, watermark: int = 2, seen_ttl: int = 60) -> QuestionPool:
+    return QuestionPool(
+        quiz_agent=agent, watermark=watermark, refill_interval=5.0, refill_concurrency=2,
+        seen_ttl=seen_ttl, max_backoff=30.0,
+    )
+
+
+async def run_rounds(pool: QuestionPool, rounds: int) -> list[float]:
+    """Несколько итераций цикла пополнения, возвращает запрошенные паузы"""
+    sleeps = []
+
+    async def fake_sleep(delay: float) -> None:
+        sleeps.append(delay)
+        if len(sleeps) >= rounds:
+            raise StopLoop
+
+    with patch("dialog_api.services.question_pool.asyncio.sleep", fake_sleep), pytest.raises(StopLoop):
+        await pool.run()
+    return sleeps
+
+
+class TestQuestionPool:
+    @pytest.mark.asyncio
+    async def test_refill_up_to_watermark(self):
+        """Тест: пул пополняется до watermark для каждой пары тема-уровень и не выше"""
+        agent = FakeQuizAgent()
+        pool = make_pool(agent, watermark=2)
+
+        await run_rounds(pool, rounds=2)
+
+        assert agent.calls == 2 * 2 * 3
+        assert all(len(questions) == 2 for questions in pool._pools.values())
+
+    @pytest.mark.asyncio
+    async def test_pop_skips_seen_questions(self):
+        """Тест: клиент не получает из пула один и тот же вопрос дважды"""
+        pool = make_pool(FakeQuizAgent(), watermark=2)
+        await run_rounds(pool, rounds=1)
+
+        first = pool.pop(client_id="client", study_topic="python", user_level="beginner")
+        pool._pools[("python", "beginner")].append(first)
+        second = pool.pop(client_id="client", study_topic="python", user_level="beginner")
+
+        assert first != second
+        assert pool.pop(client_id="client", study_topic="python", user_level="beginner") is None
+        assert pool.pop(client_id="other", study_topic="python", user_level="beginner") == first
+
+    @pytest.mark.asyncio
+    async def test_seen_questions_expire(self):
+        """Тест: после seen_ttl клиент снова может получить выданный вопрос"""
+        pool = make_pool(FakeQuizAgent(), watermark=1, seen_ttl=60)
+        await run_rounds(pool, rounds=1)
+        question = pool.pop(client_id="client", study_topic="python", user_level="beginner")
+        pool._pools[("python", "beginner")].append(question)
+
+        pool._seen.expire(time.monotonic() + 61)
+
+        assert pool.pop(client_id="client", study_topic="python", user_level="beginner") == question
+
+    def test_pop_from_empty_pool(self):
+        """Тест: пустой пул возвращает None, вопрос генерируется обычным путем"""
+        pool = make_pool(FakeQuizAgent())
+
+        assert pool.pop(client_id="client", study_topic="python", user_level="beginner") is None
+
+    @pytest.mark.asyncio
+    async def test_backoff_on_failures(self):
+        """Тест: пауза растет после неудачных пополнений и ограничена max_backoff"""
+        pool = make_pool(FakeQuizAgent(fail=True))
+
+        sleeps = await run_rounds(pool, rounds=4)
+
+        assert sleeps == [10.0, 20.0, 30.0, 30.0]
+
+    @pytest.mark.asyncio
+    async def test_backoff_resets_after_success(self):
+        """Тест: после успешного пополнения пауза возвращается к refill_interval"""
+        agent = FakeQuizAgent(fail=True)
+        pool = make_pool(agent)
+        await run_rounds(pool, rounds=2)
+
+        agent.fail = False
+        sleeps = await run_rounds(pool, rounds=1)
+
+        assert sleeps == [5.0]
+
+    @pytest.mark.asyncio
+    async def test_invalid_question_is_not_pooled(self):
+        """Тест: ответ без текста вопроса не попадает в пул"""
+        agent = FakeQuizAgent()
+        agent.agenerate_question = AsyncMock(return_value={"question": ""})
+        pool = make_pool(agent, watermark=1)
+
+        await run_rounds(pool, rounds=1)
+
+        assert pool.pop(client_id="client", study_topic="python", user_level="beginner") is None
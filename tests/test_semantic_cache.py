@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from dialog_api.services.semantic_cache import SemanticAnswerCache
+
+EMBEDDINGS = {
+    "что такое список": [1.0, 0.0, 0.0],
+    "что такое списки": [0.99, 0.14, 0.0],
+    "что такое кортеж": [0.6, 0.8, 0.0],
+    "что такое словарь": [0.0, 0.0, 1.0],
+}
+
+
+async def fake_embed(query: str) -> list[float]:
+    return EMBEDDINGS[query]
+
+
+def make_cache(threshold: float = 0.95, maxsize: int = 10, ttl: int = 60) -> SemanticAnswerCache:
+    return SemanticAnswerCache(embed=fake_embed, threshold=threshold, maxsize=maxsize, ttl=ttl)
+
+
+def hits() -> float:
+    return REGISTRY.get_sample_value("semantic_cache_requests_total", {"result": "hit"}) or 0.0
+
+
+class TestSemanticAnswerCache:
+    @pytest.mark.asyncio
+    async def test_similar_question_hits(self):
+        """Тест: близкий по смыслу вопрос получает сохраненный ответ"""
+        cache = make_cache()
+        await cache.aput("python", "beginner", "что такое список", "Список - коллекция")
+        before = hits()
+
+        answer = await cache.aget("python", "beginner", "что такое списки")
+
+        assert answer == "Список - коллекция"
+        assert hits() == before + 1
+
+    @pytest.mark.asyncio
+    async def test_below_threshold_misses(self):
+        """Тест: вопрос со сходством ниже порога не получает ответ"""
+        cache = make_cache(threshold=0.95)
+        await cache.aput("python", "beginner", "что такое список", "Список - коллекция")
+
+        assert await cache.aget("python", "beginner", "что такое кортеж") is None
+
+    @pytest.mark.asyncio
+    async def test_scoped_by_topic_and_level(self):
+        """Тест: ответ выдается только в той же теме и на том же уровне"""
+        cache = make_cache()
+        await cache.aput("python", "beginner", "что такое список", "Список - коллекция")
+
+        assert await cache.aget("javascript", "beginner", "что такое список") is None
+        assert await cache.aget("python", "advanced", "что такое список") is None
+
+    @pytest.mark.asyncio
+    async def test_expired_answer_misses(self):
+        """Тест: ответ старше TTL не выдается"""
+        cache = make_cache(ttl=60)
+        with patch("dialog_api.services.semantic_cache.monotonic", return_value=1000.0):
+            await cache.aput("python", "beginner", "что такое список", "Список - коллекция")
+        with patch("dialog_api.services.semantic_cache.monotonic", return_value=1061.0):
+            assert await cache.aget("python", "beginner", "что такое список") is None
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        """Тест: при переполнении вытесняется давно не использованный ответ"""
+        cache = make_cache(maxsize=2)
+        await cache.aput("python", "beginner", "что такое список", "список")
+        await cache.aput("python", "beginner", "что такое кортеж", "кортеж")
+        await cache.aget("python", "beginner", "что такое список")
+
+        await cache.aput("python", "beginner", "что такое словарь", "словарь")
+
+        assert await cache.aget("python", "beginner", "что такое кортеж") is None
+        assert await cache.aget("python", "beginner", "что такое список") == "список"
+        assert await cache.aget("python", "beginner", "что такое словарь") == "словарь"
+
+    @pytest.mark.asyncio
+    async def test_embedding_error_is_a_miss(self):
+        """Тест: ошибка эмбеддинга не ломает запрос, кэш просто не используется"""
+        async def broken_embed(query: str) -> list[float]:
+            raise RuntimeError("model is not loaded")
+
+        cache = SemanticAnswerCache(embed=broken_embed, threshold=0.9, maxsize=10, ttl=60)
+        await cache.aput("python", "beginner", "что такое список", "список")
+
+        assert await cache.aget("python", "beginner", "что такое список") is None
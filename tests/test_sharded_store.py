@@ -0,0 +1,88 @@
+from unittest.mock import AsyncMock, Mock
+
+import numpy as np
+import pytest
+
+from dialog_api.databases.local_store import LocalShards
+from dialog_api.databases.sharded_store import ShardedStore, route_filter
+from dialog_api.services.rag import RAGService
+from dialog_api.settings import VectorDBSettings
+
+
+def make_sections(levels: dict[str, str], dim: int = 8):
+    rng = np.random.default_rng(1)
+    ids = list(levels)
+    embeddings = rng.normal(size=(len(ids), dim)).astype(np.float32).tolist()
+    metadatas = [{"topic": doc_id.split("_")[0], "level": level, "content_hash": doc_id} for doc_id, level in levels.items()]
+    return ids, embeddings, [f"текст {doc_id}" for doc_id in ids], metadatas
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return VectorDBSettings(VECTOR_DB_LOCAL_PATH=str(tmp_path), VECTOR_DB_BACKEND="local")
+
+
+class TestShardedStore:
+
+    def test_route_filter_extracts_shard_conditions(self):
+        """Тест: условия на поля шардирования уходят в маршрутизацию, остальные - в шард"""
+        where = {"$and": [{"topic": "python"}, {"level": {"$ne": "beginner"}}, {"source": "lists.txt"}]}
+
+        routed, rest = route_filter(where, ("topic", "level"))
+
+        assert routed == [(0, "$eq", "python"), (1, "$ne", "beginner")]
+        assert rest == {"source": "lists.txt"}
+
+    def test_query_hits_only_routed_shards(self, settings):
+        """Тест: запрос по теме и уровню попадает только в свой шард"""
+        store = ShardedStore(factory=LocalShards(settings), shard_keys=("topic", "level"))
+        ids, embeddings, documents, metadatas = make_sections({
+            "python_1": "beginner", "python_2": "advanced", "javascript_1": "beginner",
+        })
+        store.upsert(ids, embeddings, documents, metadatas)
+        javascript_shard = store._shards[("javascript", "beginner")]
+        javascript_shard.query = Mock(side_effect=AssertionError("запрос ушел в чужой шард"))
+
+        results = store.query(embeddings[0], where={"topic": "python", "level": {"$ne": "advanced"}}, n_results=5)
+
+        assert [result["content"] for result in results] == ["текст python_1"]
+
+    def test_section_moves_between_shards_and_reloads(self, settings):
+        """Тест: секция со сменившимся уровнем переезжает в другой шард, шарды находятся после перезапуска"""
+        store = ShardedStore(factory=LocalShards(settings), shard_keys=("topic", "level"))
+        ids, embeddings, documents, metadatas = make_sections({"python_1": "beginner"})
+        store.upsert(ids, embeddings, documents, metadatas)
+        metadatas[0]["level"] = "professional"
+        store.upsert(ids, embeddings, documents, metadatas)
+        store.persist()
+
+        reloaded = ShardedStore(factory=LocalShards(settings), shard_keys=("topic", "level"))
+
+        assert store._shards[("python", "beginner")].count() == 0
+        assert reloaded.manifest() == {"python_1": "python_1"}
+        assert reloaded.count() == 1
+
+
+class TestRAGServiceLevelPreference:
+
+    @pytest.mark.asyncio
+    async def test_prefers_user_level_within_penalty(self):
+        """Тест: секции уровня пользователя идут выше чуть более близких секций другого уровня"""
+        async def asearch(query, where_filter, n_results):
+            if where_filter["$and"][1]["level"] == "beginner":
+                return [{"content": "своя", "metadata": {"level": "beginner"}, "score": 0.55}]
+            return [
+                {"content": "чужая близкая", "metadata": {"level": "advanced"}, "score": 0.5},
+                {"content": "чужая далекая", "metadata": {"level": "advanced"}, "score": 0.9},
+            ]
+
+        vector_db = Mock()
+        vector_db.asearch = AsyncMock(side_effect=asearch)
+        rag_service = RAGService(
+            vector_db=vector_db, documents_number=2, document_loader=Mock(), level_mismatch_penalty=0.1,
+        )
+
+        context = await rag_service.aget_relevant_context(query="списки", topic="python", user_level="beginner")
+
+        assert context == "1. [beginner] своя\n2. [advanced] чужая близкая"
+        assert vector_db.asearch.await_count == 2
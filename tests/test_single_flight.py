@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from dialog_api.agents.quiz_agent import QuizAgent
+from dialog_api.utils.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+
+    @pytest.mark.asyncio
+    async def test_identical_calls_share_one_execution(self):
+        """Тест: одновременные вызовы с одним ключом выполняются один раз"""
+        single_flight = SingleFlight(name="test")
+        calls = 0
+
+        async def generate():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"question": "Что такое замыкание?"}
+
+        results = await asyncio.gather(*(single_flight.do(key="python", fn=generate) for _ in range(10)))
+
+        assert calls == 1
+        assert all(result == {"question": "Что такое замыкание?"} for result in results)
+
+    @pytest.mark.asyncio
+    async def test_different_keys_and_sequential_calls_are_not_coalesced(self):
+        """Тест: разные ключи и последовательные вызовы выполняются независимо"""
+        single_flight = SingleFlight(name="test")
+        calls = []
+
+        async def generate(key):
+            calls.append(key)
+            await asyncio.sleep(0)
+            return key
+
+        assert await asyncio.gather(
+            single_flight.do(key="python", fn=lambda: generate("python")),
+            single_flight.do(key="javascript", fn=lambda: generate("javascript")),
+        ) == ["python", "javascript"]
+        assert await single_flight.do(key="python", fn=lambda: generate("python")) == "python"
+        assert calls == ["python", "javascript", "python"]
+
+    @pytest.mark.asyncio
+    async def test_error_is_shared_and_cancelled_waiter_does_not_cancel_call(self):
+        """Тест: ошибку получают все ожидающие, отмена одного ожидающего не отменяет вызов"""
+        single_flight = SingleFlight(name="test")
+        started = asyncio.Event()
+
+        async def failing():
+            started.set()
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream error")
+
+        first = asyncio.ensure_future(single_flight.do(key="k", fn=failing))
+        second = asyncio.ensure_future(single_flight.do(key="k", fn=failing))
+        await started.wait()
+        first.cancel()
+
+        with pytest.raises(ValueError):
+            await second
+
+
+class TestQuizFlightKey:
+    def test_question_generation_is_keyed_by_history(self):
+        """Тест: генерация вопроса объединяется только для клиентов с одинаковой историей"""
+        key = dict(
+            action="generate_question", current_message="", study_topic="python", user_level="beginner", summary="",
+        )
+
+        assert QuizAgent._flight_key(history=[], **key) == QuizAgent._flight_key(history=[], **key)
+        assert QuizAgent._flight_key(history=["Что такое список?"], **key) != QuizAgent._flight_key(history=[], **key)
@@ -0,0 +1,55 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from langchain_community.chat_models import GigaChat
+
+from dialog_api.services.token_refresher import TokenRefresher
+from dialog_api.utils.token_verification import TokenVerification
+
+
+@pytest.fixture
+def giga_client():
+    return GigaChat(access_token="old-token", base_url="https://api.gigachat.test", verify_ssl_certs=False)
+
+
+@pytest.fixture
+def token_verification():
+    mock = Mock(spec=TokenVerification)
+    mock.refresh_token = AsyncMock(return_value="new-token")
+    mock.expires_in.return_value = 0.0
+    return mock
+
+
+class TestTokenRefresher:
+
+    @pytest.mark.asyncio
+    async def test_refresh_swaps_token_in_shared_client(self, giga_client, token_verification):
+        """Тест: новый токен подменяется в том же клиенте, пул соединений не пересоздается"""
+        http_client = giga_client._client._aclient
+        refresher = TokenRefresher(
+            token_verification=token_verification, giga_client=giga_client, refresh_margin=300, retry_interval=1,
+        )
+
+        await refresher.refresh()
+
+        assert giga_client._client.token == "new-token"
+        assert giga_client._client._aclient is http_client
+
+    @pytest.mark.asyncio
+    async def test_run_retries_after_error(self, giga_client, token_verification):
+        """Тест: ошибка выпуска токена не останавливает фоновое обновление"""
+        refreshed = asyncio.Event()
+        token_verification.refresh_token = AsyncMock(side_effect=[RuntimeError("oauth"), "new-token"])
+        token_verification.expires_in.side_effect = [0.0, 0.0, 1200.0]
+        refresher = TokenRefresher(
+            token_verification=token_verification, giga_client=giga_client, refresh_margin=300, retry_interval=0,
+        )
+        refresher.warm_up = AsyncMock(side_effect=lambda: refreshed.set())
+
+        task = asyncio.create_task(refresher.run())
+        await asyncio.wait_for(refreshed.wait(), timeout=1)
+        task.cancel()
+
+        assert token_verification.refresh_token.await_count == 2
+        assert giga_client._client.token == "new-token"
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from unittest.mock import AsyncMock, Mock, patch
+
+import numpy as np
+import pytest
+
+from dialog_api.databases.vector import VectorDB
+from dialog_api.services.rag import RAGService
+from dialog_api.settings import VectorDBSettings
+
+
+class FakeModel:
+    """Модель эмбеддингов с записью вызовов и потоков, в которых они выполнялись"""
+
+    def __init__(self):
+        self.calls = []
+        self.threads = []
+
+    def encode(self, texts, convert_to_tensor=False):
+        self.calls.append(list(texts))
+        self.threads.append(threading.current_thread().name)
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+
+@pytest.fixture
+def model():
+    return FakeModel()
+
+
+@pytest.fixture
+def store():
+    store = Mock()
+    store.aclose = AsyncMock()
+    store.aquery = AsyncMock(return_value=[
+        {"id": "1", "content": "Декоратор оборачивает функцию", "metadata": {"level": "beginner"}, "score": 0.1},
+    ])
+    return store
+
+
+def make_vector_db(model, store, **settings) -> VectorDB:
+    with patch("dialog_api.databases.vector.load_embedding_model", return_value=model), \
+            patch("dialog_api.databases.vector.create_store", return_value=store):
+        return VectorDB(vector_db_settings=VectorDBSettings(**settings))
+
+
+class TestVectorDBAsync:
+
+    @pytest.mark.asyncio
+    async def test_asearch_embeds_in_executor(self, model, store):
+        """Тест: эмбеддинг запроса считается в пуле потоков, поиск уходит в хранилище с фильтром"""
+        vector_db = make_vector_db(model, store, VECTOR_DB_QUERY_BATCH_SIZE=1)
+
+        documents = await vector_db.asearch(query="декоратор", where_filter={"topic": "python"}, n_results=3)
+
+        assert documents[0]["id"] == "1"
+        assert model.threads[0].startswith("embedding")
+        store.aquery.assert_awaited_once_with([9.0, 1.0], where={"topic": "python"}, n_results=3)
+        await vector_db.aclose()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_searches_share_one_batch(self, model, store):
+        """Тест: одновременные поиски векторизуются одним вызовом модели"""
+        vector_db = make_vector_db(model, store, VECTOR_DB_QUERY_BATCH_SIZE=8, VECTOR_DB_QUERY_BATCH_WAIT_MS=20)
+
+        await asyncio.gather(*(
+            vector_db.asearch(query=query, where_filter={"topic": "python"}) for query in ["а", "бб", "ввв"]
+        ))
+
+        assert model.calls == [["а", "бб", "ввв"]]
+        await vector_db.aclose()
+
+    @pytest.mark.asyncio
+    async def test_asearch_returns_empty_on_store_error(self, model, store):
+        """Тест: ошибка хранилища не доходит до агента, поиск возвращает пустой список"""
+        store.aquery = AsyncMock(side_effect=ConnectionError("хранилище недоступно"))
+        vector_db = make_vector_db(model, store, VECTOR_DB_QUERY_BATCH_SIZE=1)
+
+        assert await vector_db.asearch(query="декоратор", where_filter={"topic": "python"}) == []
+        await vector_db.aclose()
+
+    @pytest.mark.asyncio
+    async def test_aget_relevant_context_uses_async_search(self, model, store):
+        """Тест: контекст RAG собирается через асинхронный поиск"""
+        vector_db = make_vector_db(model, store, VECTOR_DB_QUERY_BATCH_SIZE=1)
+        rag_service = RAGService(vector_db=vector_db, documents_number=2, document_loader=Mock())
+
+        context = await rag_service.aget_relevant_context(query="декоратор", topic="python")
+
+        assert context == "1. [beginner] Декоратор оборачивает функцию"
+        store.query.assert_not_called()
+        await vector_db.aclose()
@@ -0,0 +1,138 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from starlette.datastructures import State
+
+from dialog_api import server
+from dialog_api.api.health import live
+from dialog_api.services.warmup import Warmup
+
+
+class TestWarmup:
+
+    @pytest.mark.asyncio
+    async def test_ready_after_required_stages(self):
+        """Тест: готовность не ждет необязательные стадии"""
+        warmup = Warmup(required=["model", "ignite"], optional=["corpus"])
+
+        async with warmup.stage("model"):
+            pass
+        assert not warmup.ready
+
+        async with warmup.stage("ignite"):
+            pass
+        assert warmup.ready
+        assert warmup.report()["corpus"]["state"] == "pending"
+        assert warmup.report()["model"]["seconds"] is not None
+
+    @pytest.mark.asyncio
+    async def test_failed_stage_is_reported(self):
+        """Тест: ошибка стадии сохраняется в отчете и пробрасывается"""
+        warmup = Warmup(required=["token"])
+
+        with pytest.raises(ConnectionError):
+            async with warmup.stage("token"):
+                raise ConnectionError("GigaChat недоступен")
+
+        assert warmup.failed and not warmup.ready
+        assert warmup.report()["token"] == {
+            "required": True, "state": "failed", "seconds": warmup.report()["token"]["seconds"],
+            "error": "GigaChat недоступен",
+        }
+
+    @pytest.mark.asyncio
+    async def test_retry_until_success(self):
+        """Тест: стадия повторяется после ошибки и не считается проваленной между попытками"""
+        warmup = Warmup(required=["token"])
+        states = []
+        fetch = AsyncMock(side_effect=[ConnectionError("GigaChat недоступен"), None])
+
+        async def sleep(delay: float) -> None:
+            states.append(warmup.report()["token"]["state"])
+
+        with patch("dialog_api.services.warmup.asyncio.sleep", sleep):
+            await warmup.retry("token", fetch, retries=3, backoff=0.1, backoff_max=1.0)
+
+        assert states == ["retrying"]
+        assert warmup.ready
+        assert fetch.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_retry_fails_after_last_attempt(self):
+        """Тест: после исчерпания попыток стадия проваливается, пауза растет до максимума"""
+        warmup = Warmup(required=["ignite"])
+        delays = []
+
+        async def sleep(delay: float) -> None:
+            delays.append(delay)
+
+        with patch("dialog_api.services.warmup.asyncio.sleep", sleep), pytest.raises(ConnectionError):
+            await warmup.retry(
+                "ignite", AsyncMock(side_effect=ConnectionError("Ignite недоступен")),
+                retries=3, backoff=1.0, backoff_max=3.0,
+            )
+
+        assert delays == [1.0, 2.0, 3.0]
+        assert warmup.failed
+
+    def test_require_optional_stage(self):
+        """Тест: необязательная стадия, переведенная в обязательные, задерживает готовность"""
+        warmup = Warmup(required=[], optional=["corpus"])
+        assert warmup.ready
+
+        warmup.require("corpus")
+
+        assert not warmup.ready
+
+
+class TestWarmupApp:
+    @staticmethod
+    def stub_stages(monkeypatch, order: list[str], store_count: int) -> State:
+        state = State()
+        for stage in ("_fetch_token", "_connect_ignite", "_load_model", "_first_encode", "_create_agents"):
+            monkeypatch.setattr(server, stage, AsyncMock(side_effect=lambda *args, name=stage: order.append(name)))
+
+        async def open_vector_db(state: State, warmup: Warmup) -> None:
+            state.vector_db = Mock()
+            state.vector_db.store.count = Mock(return_value=store_count)
+
+        async def sync_corpus(state: State, warmup: Warmup) -> None:
+            async with warmup.stage("corpus"):
+                order.append("_sync_corpus")
+
+        monkeypatch.setattr(server, "_open_vector_db", open_vector_db)
+        monkeypatch.setattr(server, "_sync_corpus", sync_corpus)
+        return state
+
+    @pytest.mark.asyncio
+    async def test_empty_store_requires_corpus(self, monkeypatch):
+        """Тест: при пустой векторной БД корпус загружается до готовности приложения"""
+        order = []
+        state = self.stub_stages(monkeypatch, order, store_count=0)
+        warmup = Warmup(required=[], optional=["corpus"])
+
+        await server.warmup_app(state, warmup)
+
+        assert order.index("_sync_corpus") < order.index("_create_agents")
+        assert warmup.stages["corpus"].required
+
+    @pytest.mark.asyncio
+    async def test_filled_store_syncs_corpus_after_ready(self, monkeypatch):
+        """Тест: при заполненной векторной БД корпус синхронизируется после готовности"""
+        order = []
+        state = self.stub_stages(monkeypatch, order, store_count=10)
+        warmup = Warmup(required=[], optional=["corpus"])
+
+        await server.warmup_app(state, warmup)
+
+        assert order[-2:] == ["_create_agents", "_sync_corpus"]
+        assert not warmup.stages["corpus"].required
+
+
+class TestLiveness:
+    @pytest.mark.asyncio
+    async def test_live_ignores_failed_stages(self):
+        """Тест: liveness не зависит от ошибок прогрева"""
+        response = await live()
+
+        assert response.status_code == 200